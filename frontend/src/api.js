@@ -33,6 +33,18 @@ const API = {
     }
     return resp.json().catch(()=>null)
   },
+  // List endpoints are cursor paginated: follow `next` links and return the combined results
+  getAll: async function(path) {
+    let page = await this.get(path)
+    if(!page || !Array.isArray(page.results)) return page
+    let results = page.results
+    while(page && page.next){
+      const next = new URL(page.next, window.location.origin)
+      page = await this.get(next.pathname.replace(/^\/api/, '') + next.search)
+      if(page && Array.isArray(page.results)) results = results.concat(page.results)
+    }
+    return results
+  },
   post: async (path, body) => {
     const headers = {'Content-Type':'application/json'}
     if(getToken()) headers['Authorization'] = `Bearer ${getToken()}`
@@ -15,7 +15,7 @@ export default function AdminInventory(){
       setLoading(true)
       setError(null)
       try{
-        const data = await API.get('/inventory/')
+        const data = await API.getAll('/inventory/')
         // API.get returns parsed JSON or null; handle unauthorized/empty cases
         if(mounted){
           if(!data){
@@ -43,7 +43,7 @@ export default function AdminInventory(){
     if(res.status === 200){
       setMsg({type:'success', text:'Inventory adjusted'})
       // refresh
-      try{ const r = await fetch('/api/inventory/'); if(r.status===200){ const d = await r.json(); setInventory(Array.isArray(d)?d:[]) } }
+      try{ const d = await API.getAll('/inventory/'); setInventory(Array.isArray(d)?d:[]) }
       catch(e){ /* ignore */ }
     } else if(res.status === 401 || res.status === 403){
       setMsg({type:'danger', text: 'Unauthorized: you need admin privileges'})
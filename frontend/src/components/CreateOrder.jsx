@@ -7,7 +7,8 @@ export default function CreateOrder(){
   const [dealer, setDealer] = useState(null)
   const [items, setItems] = useState([])
   const [errors, setErrors] = useState(null)
-  useEffect(()=>{API.get('/products/').then(setProducts); API.get('/dealers/').then(setDealers)}, [])
+  const [stockCheck, setStockCheck] = useState(null)
+  useEffect(()=>{API.getAll('/products/').then(setProducts); API.getAll('/dealers/').then(setDealers)}, [])
 
   const addLine = ()=> setItems([...items, {product: products[0]?.id || null, quantity:1}])
   const updateLine = (idx, field, value) => {
@@ -26,6 +27,14 @@ export default function CreateOrder(){
     return errs
   }
 
+  // one availability call for the whole cart instead of a product lookup per line
+  const checkStock = async ()=>{
+    const errs = validate().filter(e=>e.startsWith('Line'))
+    if(errs.length){ setErrors(errs); return }
+    const res = await API.post('/inventory/availability/', items.map(i=>({product: i.product, quantity: Number(i.quantity)})))
+    setStockCheck(res.body)
+  }
+
   const submit = async ()=>{
     const errs = validate()
     if(errs.length){ setErrors(errs); return }
@@ -38,6 +47,9 @@ export default function CreateOrder(){
     <div className="card p-3">
       <h2>Create Order</h2>
       {errors && <div className="alert alert-danger"><ul>{errors.map((e,i)=><li key={i}>{e}</li>)}</ul></div>}
+      {stockCheck && (stockCheck.confirmable
+        ? <div className="alert alert-success">{stockCheck.detail}</div>
+        : <div className="alert alert-warning"><ul>{(stockCheck.insufficient || []).map((e,i)=><li key={i}>{e.message}</li>)}</ul></div>)}
       <div className="mb-2">
         <label>Dealer: </label>
         <select className="form-select" onChange={e=>setDealer(Number(e.target.value))} value={dealer||''}>
@@ -59,6 +71,7 @@ export default function CreateOrder(){
         ))}
       </div>
       <div className="mt-3">
+        <button className="btn btn-secondary me-2" onClick={checkStock}>Check Stock</button>
         <button className="btn btn-primary" onClick={submit}>Create Draft Order</button>
       </div>
     </div>
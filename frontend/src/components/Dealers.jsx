@@ -6,7 +6,7 @@ export default function Dealers(){
   const [name, setName] = useState('')
   const [code, setCode] = useState('')
   const [err, setErr] = useState(null)
-  useEffect(()=>{API.get('/dealers/').then(setDealers)}, [])
+  useEffect(()=>{API.getAll('/dealers/').then(setDealers)}, [])
   const create = async ()=>{
     setErr(null)
     if(!name || !code) { setErr('Name and Code are required'); return }
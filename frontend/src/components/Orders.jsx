@@ -5,7 +5,7 @@ export default function Orders(){
   const [orders, setOrders] = useState([])
   const [refresh, setRefresh] = useState(0)
   const [msg, setMsg] = useState(null)
-  useEffect(()=>{API.get('/orders/').then(setOrders)}, [refresh])
+  useEffect(()=>{API.getAll('/orders/').then(setOrders)}, [refresh])
 
   const confirm = async (id) => {
     const res = await API.post(`/orders/${id}/confirm/`, {})
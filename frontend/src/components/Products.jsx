@@ -3,7 +3,7 @@ import API from '../api'
 
 export default function Products(){
   const [products, setProducts] = useState([])
-  useEffect(()=>{API.get('/products/').then(setProducts)}, [])
+  useEffect(()=>{API.getAll('/products/').then(setProducts)}, [])
   return (
     <div className="card p-3">
       <h2>Products</h2>
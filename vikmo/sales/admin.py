@@ -1,5 +1,5 @@
 from django.contrib import admin
-from . import models
+from . import models, search
 
 
 @admin.register(models.Product)
@@ -7,10 +7,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'sku', 'price', 'active')
     search_fields = ('name', 'sku')
 
+    def get_search_results(self, request, queryset, search_term):
+        # use the full-text index instead of icontains over every row, with no result cap
+        return search.filter_matches(queryset, search_term), False
+
 
 @admin.register(models.Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('product', 'quantity')
+    list_display = ('product', 'quantity', 'reserved')
+    readonly_fields = ('reserved',)
     search_fields = ('product__sku', 'product__name')
 
 
@@ -33,7 +38,46 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
 
 
+@admin.register(models.OrderNumberSequence)
+class OrderNumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('day', 'last_value')
+
+
 @admin.register(models.InventoryAdjustment)
 class InventoryAdjustmentAdmin(admin.ModelAdmin):
     list_display = ('product', 'change', 'changed_by', 'created_at')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+
+@admin.register(models.StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('product', 'kind', 'available_change', 'reserved_change', 'reference', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('product__sku', 'reference')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(models.DealerDailySales)
+class DealerDailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'dealer', 'order_count', 'quantity', 'revenue', 'delivered_count', 'cancelled_count')
+    list_filter = ('day',)
+
+
+@admin.register(models.ProductDailySales)
+class ProductDailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product', 'order_count', 'quantity', 'revenue', 'delivered_count')
+    list_filter = ('day',)
+
+
+@admin.register(models.Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('created_at', 'updated_at', 'finished_at', 'locked_by', 'locked_at')
+
+
+@admin.register(models.OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'kind', 'key', 'created_at')
+    list_filter = ('topic', 'kind')
+    readonly_fields = ('topic', 'kind', 'key', 'payload', 'created_at')
@@ -0,0 +1,321 @@
+"""
+Async (ASGI) versions of the hot read endpoints. They query with the async
+ORM and reuse the DRF serializers for the response shape, but run as plain
+Django async views so no worker thread is held while a query is in flight.
+Under WSGI Django still serves them, just without the concurrency benefit.
+The outbox change feed lives here for the same reason: a consumer waiting
+on a long-poll or an event stream holds no thread while it waits.
+"""
+import asyncio
+import base64
+import functools
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import exceptions
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from . import models, outbox, pagination, serializers
+
+# seconds between outbox polls while a long-poll or stream waits for events
+FEED_POLL_INTERVAL = 0.5
+MAX_WAIT = 30
+STREAM_DURATION = 55
+MAX_STREAM_DURATION = 300
+HEARTBEAT_INTERVAL = 15
+
+
+def _json(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _not_found(model):
+    return _json({'detail': f'No {model.__name__} matches the given query.'}, status=404)
+
+
+def _permission_denied(request):
+    # DRF authentication and IsAdminUser, answered the way an APIView would
+    view = APIView()
+    view.permission_classes = [IsAdminUser]
+    drf_request = view.initialize_request(request)
+    try:
+        view.check_permissions(drf_request)
+    except exceptions.APIException as exc:
+        response = _json({'detail': exc.detail}, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            header = view.get_authenticate_header(drf_request)
+            if header:
+                response['WWW-Authenticate'] = header
+            else:
+                response.status_code = 403
+        return response
+    return None
+
+
+def admin_only(view_func):
+    """
+    Restricts an async view to staff users, like IsAdminUser on a viewset.
+    """
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        denied = await sync_to_async(_permission_denied)(request)
+        if denied is not None:
+            return denied
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _context(request):
+    # the serializers read `?fields=` through a DRF request
+    return {'request': Request(request)}
+
+
+def _encode_cursor(name, sku, reverse=False):
+    key = [name, sku, True] if reverse else [name, sku]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(value):
+    # [name, sku] pages forward from the key, [name, sku, true] backward
+    name, sku, *reverse = json.loads(base64.urlsafe_b64decode(value.encode()))
+    if len(reverse) > 1:
+        raise ValueError
+    return str(name), str(sku), bool(reverse and reverse[0])
+
+
+def _page_link(request, cursor):
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('page_size', pagination.ProductCursorPagination.page_size))
+    except ValueError:
+        size = pagination.ProductCursorPagination.page_size
+    return max(1, min(size, pagination.ProductCursorPagination.max_page_size))
+
+
+@require_safe
+async def product_list(request):
+    """
+    Products ordered by (name, sku), keyset paginated: `next` carries the
+    last row's sort key and `previous` the first row's, so every page is
+    one index range scan in either direction. Accepts `?active=`,
+    `?fields=` and `?page_size=` like /api/products/.
+    """
+    qs = models.Product.objects.select_related('inventory').order_by('name', 'sku')
+    active = request.GET.get('active')
+    if active is not None:
+        qs = qs.filter(active=active.lower() in ('1', 'true', 'yes'))
+    cursor = request.GET.get('cursor')
+    reverse = False
+    if cursor:
+        try:
+            name, sku, reverse = _decode_cursor(cursor)
+        except (ValueError, TypeError):
+            return _json({'detail': 'Invalid cursor'}, status=400)
+        if reverse:
+            qs = qs.filter(Q(name__lt=name) | Q(name=name, sku__lt=sku)).reverse()
+        else:
+            qs = qs.filter(Q(name__gt=name) | Q(name=name, sku__gt=sku))
+    size = _page_size(request)
+    products = [product async for product in qs[:size + 1]]
+    more = len(products) > size
+    products = products[:size]
+    if reverse:
+        products.reverse()
+    next_link = previous_link = None
+    if products and (reverse or more):
+        next_link = _page_link(request, _encode_cursor(products[-1].name, products[-1].sku))
+    if products and (more if reverse else cursor):
+        previous_link = _page_link(request, _encode_cursor(products[0].name, products[0].sku, reverse=True))
+    data = serializers.ProductSerializer(products, many=True, context=_context(request)).data
+    return _json({'next': next_link, 'previous': previous_link, 'results': data})
+
+
+@require_safe
+async def product_detail(request, pk):
+    try:
+        product = await models.Product.objects.select_related('inventory').aget(pk=pk)
+    except models.Product.DoesNotExist:
+        return _not_found(models.Product)
+    return _json(serializers.ProductSerializer(product, context=_context(request)).data)
+
+
+@require_safe
+async def order_detail(request, pk):
+    try:
+        order = await models.Order.objects.prefetch_related('items').aget(pk=pk)
+    except models.Order.DoesNotExist:
+        return _not_found(models.Order)
+    return _json(serializers.OrderSerializer(order, context=_context(request)).data)
+
+
+@require_safe
+@admin_only
+async def stock_lookup(request):
+    """
+    Stock snapshot for `?sku=` and/or `?product=` (comma separated) read
+    straight from the materialized Inventory rows in one query.
+    """
+    skus = [value for value in request.GET.get('sku', '').split(',') if value]
+    product_ids = [value for value in request.GET.get('product', '').split(',') if value]
+    if not skus and not product_ids:
+        return _json({'detail': 'Provide sku or product'}, status=400)
+    if not all(value.isdigit() for value in product_ids):
+        return _json({'detail': 'product must be a comma separated list of ids'}, status=400)
+    rows = (
+        models.Inventory.objects.filter(Q(product__sku__in=skus) | Q(product_id__in=product_ids))
+        .order_by('product_id')
+        .values('product_id', 'product__sku', 'quantity', 'reserved')
+    )
+    results = [
+        {
+            'product_id': row['product_id'],
+            'sku': row['product__sku'],
+            'available': row['quantity'],
+            'reserved': row['reserved'],
+            'on_hand': row['quantity'] + row['reserved'],
+        }
+        async for row in rows
+    ]
+    return _json({'results': results})
+
+
+def _seconds(value, default, maximum):
+    try:
+        return max(0.0, min(float(value), maximum)) if value not in (None, '') else default
+    except ValueError:
+        raise ValueError('wait and timeout must be numbers of seconds')
+
+
+async def _feed_params(request):
+    # cursor from ?since= or, for reconnecting EventSource clients, Last-Event-ID
+    since = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    since = await sync_to_async(outbox.parse_cursor)(since)
+    topics = outbox.parse_topics(request.GET.get('topic'))
+    try:
+        limit = int(request.GET.get('limit', outbox.FEED_LIMIT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return since, topics, max(1, min(limit, outbox.MAX_FEED_LIMIT))
+
+
+async def _fetch(since, topics, limit):
+    return [event async for event in outbox.events_after(since, topics, limit)]
+
+
+@require_safe
+@admin_only
+async def events_feed(request):
+    """
+    Change feed: order and stock events after `?since=` (an event id or
+    `latest`), oldest first, at most `?limit=`. `?topic=order,stock`
+    filters, `?wait=` (up to 30 s) long-polls until an event arrives.
+    Pass the returned `next` as the following `since`.
+    """
+    try:
+        since, topics, limit = await _feed_params(request)
+        wait = _seconds(request.GET.get('wait'), 0, MAX_WAIT)
+    except ValueError as exc:
+        return _json({'detail': str(exc)}, status=400)
+    deadline = time.monotonic() + wait
+    events = await _fetch(since, topics, limit)
+    while not events and time.monotonic() < deadline:
+        await asyncio.sleep(min(FEED_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        events = await _fetch(since, topics, limit)
+    return _json({'next': events[-1]['id'] if events else since, 'events': events})
+
+
+def _sse(event):
+    data = json.dumps(event, cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n"
+
+
+class _EventStream:
+    """
+    The state of one event stream, shared by its async and WSGI generators:
+    step() takes the events of a poll and returns the chunks to send and
+    the seconds to wait before the next poll, or None to close.
+    """
+
+    def __init__(self, since, limit, duration):
+        self.cursor = since
+        self.limit = limit
+        self.deadline = time.monotonic() + duration
+        self.last_sent = time.monotonic()
+
+    def step(self, events):
+        chunks = [_sse(event) for event in events]
+        now = time.monotonic()
+        if events:
+            self.cursor = events[-1]['id']
+            self.last_sent = now
+        if now >= self.deadline:
+            return chunks, None
+        if len(events) == self.limit:
+            return chunks, 0
+        if now - self.last_sent >= HEARTBEAT_INTERVAL:
+            chunks.append(': keep-alive\n\n')
+            self.last_sent = now
+        return chunks, FEED_POLL_INTERVAL
+
+
+# ask EventSource to reconnect after 2 s when the stream ends
+STREAM_RETRY = 'retry: 2000\n\n'
+
+
+@require_safe
+@admin_only
+async def events_stream(request):
+    """
+    The same feed as Server-Sent Events: each event is sent with its id,
+    so a reconnecting EventSource resumes from Last-Event-ID. The stream
+    closes after `?timeout=` seconds (default 55, at most 300) to suit
+    proxies; clients simply reconnect. Under WSGI (runserver, gunicorn
+    sync workers) Django would buffer an async generator until it ends,
+    so there the stream is a plain generator holding the worker thread.
+    """
+    try:
+        since, topics, limit = await _feed_params(request)
+        duration = _seconds(request.GET.get('timeout'), STREAM_DURATION, MAX_STREAM_DURATION)
+    except ValueError as exc:
+        return _json({'detail': str(exc)}, status=400)
+    state = _EventStream(since, limit, duration)
+
+    async def stream():
+        yield STREAM_RETRY
+        while True:
+            chunks, wait = state.step(await _fetch(state.cursor, topics, limit))
+            for chunk in chunks:
+                yield chunk
+            if wait is None:
+                break
+            await asyncio.sleep(wait)
+
+    def sync_stream():
+        yield STREAM_RETRY
+        while True:
+            chunks, wait = state.step(list(outbox.events_after(state.cursor, topics, limit)))
+            yield from chunks
+            if wait is None:
+                break
+            time.sleep(wait)
+
+    content = stream() if isinstance(request, ASGIRequest) else sync_stream()
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,493 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .models import Dealer, Inventory, Order, OrderItem, Product, StockMovement
+from . import fast_serializers, renderers, search, serializers
+
+SEED_BATCH_SIZE = 5000
+
+
+def seed_catalog(products=10000, dealers=5000, orders=0, min_lines=1, max_lines=500, stock=1000000, seed=0):
+    """
+    Fills the database with a synthetic catalog: `products` products with
+    inventory, `dealers` dealers and `orders` draft orders of min_lines to
+    max_lines lines each. Everything is written with bulk_create, so a
+    million products take seconds rather than hours.
+    """
+    rng = random.Random(seed)
+    offset = Product.objects.count()
+    Product.objects.bulk_create(
+        (
+            Product(name=f'Part {offset + i:07d}', sku=f'BENCH-{offset + i:07d}', price=Decimal(rng.randint(100, 99999)) / 100)
+            for i in range(products)
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    # bulk_create skips the save signals that keep the SKU index current
+    search.invalidate_sku_index()
+    new_products = list(Product.objects.filter(inventory__isnull=True).values_list('id', 'sku', 'name', 'price'))
+    Inventory.objects.bulk_create(
+        (Inventory(product_id=pk, quantity=stock) for pk, _sku, _name, _price in new_products),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    StockMovement.objects.bulk_create(
+        (StockMovement(product_id=pk, kind=StockMovement.KIND_RECEIPT, available_change=stock, reference='Benchmark seed')
+         for pk, _sku, _name, _price in new_products),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    dealer_offset = Dealer.objects.count()
+    Dealer.objects.bulk_create(
+        (Dealer(name=f'Dealer {dealer_offset + i:05d}', code=f'BENCH-D{dealer_offset + i:05d}') for i in range(dealers)),
+        batch_size=SEED_BATCH_SIZE,
+    )
+    if orders:
+        catalog = list(Product.objects.values_list('id', 'sku', 'name', 'price'))
+        dealer_ids = list(Dealer.objects.values_list('id', flat=True))
+        for _ in range(orders):
+            seed_order(rng.choice(dealer_ids), rng.sample(catalog, min(len(catalog), rng.randint(min_lines, max_lines))))
+
+
+def seed_order(dealer_id, lines, quantity=1):
+    """
+    Writes one draft order for `dealer_id` with one line per
+    (id, sku, name, price) product tuple in `lines`.
+    """
+    order = Order(dealer_id=dealer_id, total_amount=sum(price * quantity for *_rest, price in lines), item_count=len(lines))
+    order.save()
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, product_id=pk, product_sku=sku, product_name=name,
+                      quantity=quantity, unit_price=price, line_total=price * quantity)
+            for pk, sku, name, price in lines
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    return order
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(call, prepare=None, iterations=20):
+    """
+    Runs `call(state)` `iterations` times (after an untimed `prepare()` for
+    each run) and returns latency percentiles in ms plus the query counts.
+    """
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        state = prepare() if prepare else None
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = call(state)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'benchmark request failed with {response.status_code}: {getattr(response, "data", "")}')
+        timings.append(elapsed * 1000)
+        queries.append(len(ctx))
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': max(queries),
+        'iterations': iterations,
+    }
+
+
+def _admin_client():
+    User = get_user_model()
+    admin = User.objects.filter(username='bench-admin').first()
+    if admin is None:
+        admin = User.objects.create_superuser('bench-admin', 'bench@example.com', None)
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    return client
+
+
+def run_benchmarks(lines=(1, 50, 500), iterations=20):
+    """
+    Benchmarks the hot sales endpoints against whatever data is already
+    seeded. Order-shaped endpoints are measured at each size in `lines`.
+    Returns {endpoint: {size: stats}}.
+    """
+    client = _admin_client()
+    catalog = list(Product.objects.values_list('id', 'sku', 'name', 'price')[:max(lines)])
+    dealer = Dealer.objects.order_by('id').first()
+    busiest = Dealer.objects.filter(orders__isnull=False).order_by('-id').first() or dealer
+    results = {}
+
+    def product_list(_state):
+        # measure the database path, not the catalog cache
+        django_cache.clear()
+        return client.get('/api/products/')
+
+    results['product_list'] = {'page': measure(product_list, iterations=iterations)}
+    sku = catalog[0][1] if catalog else ''
+    results['product_search'] = {
+        'sku_prefix': measure(lambda _s: client.get('/api/products/search/', {'q': sku[:-2]}), iterations=iterations),
+        'text': measure(lambda _s: client.get('/api/products/search/', {'q': 'part'}), iterations=iterations),
+    }
+    results['dealer_retrieve'] = {'page': measure(lambda _s: client.get(f'/api/dealers/{busiest.id}/'), iterations=iterations)}
+    inventory = Inventory.objects.order_by('id').first()
+    results['inventory_adjust'] = {'single': measure(
+        lambda _s: client.put(f'/api/inventory/{inventory.id}/adjust/', {'change': 1, 'note': 'bench'}, format='json'),
+        iterations=iterations,
+    )}
+
+    for key in ('order_create', 'order_confirm', 'order_deliver'):
+        results[key] = {}
+    for size in lines:
+        sample = catalog[:size]
+        payload = {'dealer': dealer.id, 'items': [{'product': pk, 'quantity': 1} for pk, *_rest in sample]}
+        results['order_create'][str(size)] = measure(
+            lambda _s: client.post('/api/orders/', payload, format='json'), iterations=iterations,
+        )
+        results['order_confirm'][str(size)] = measure(
+            lambda order: client.post(f'/api/orders/{order.id}/confirm/'),
+            prepare=lambda: seed_order(dealer.id, sample),
+            iterations=iterations,
+        )
+
+        def confirmed_order():
+            order = seed_order(dealer.id, sample)
+            client.post(f'/api/orders/{order.id}/confirm/')
+            return order
+
+        results['order_deliver'][str(size)] = measure(
+            lambda order: client.post(f'/api/orders/{order.id}/deliver/'),
+            prepare=confirmed_order,
+            iterations=iterations,
+        )
+    return results
+
+
+def query_growth(results):
+    """
+    Returns the endpoints whose query count differs between input sizes,
+    i.e. the ones that have regressed into per-row queries.
+    """
+    grown = {}
+    for endpoint, sizes in results.items():
+        counts = {size: stats['queries'] for size, stats in sizes.items()}
+        if len(set(counts.values())) > 1:
+            grown[endpoint] = counts
+    return grown
+
+
+def compare_to_baseline(results, baseline):
+    """
+    Lists every endpoint/size whose query count went up against `baseline`.
+    """
+    regressions = []
+    for endpoint, sizes in results.items():
+        for size, stats in sizes.items():
+            before = baseline.get(endpoint, {}).get(size)
+            if before and stats['queries'] > before['queries']:
+                regressions.append(f"{endpoint}[{size}]: {before['queries']} -> {stats['queries']} queries")
+    return regressions
+
+
+def stress_confirm(threads=8, orders_per_thread=10, quantity=1, stock=None):
+    """
+    Confirms draft orders for one hot SKU from `threads` concurrent
+    clients. Stock defaults to half the total demand, so roughly half the
+    confirms must be rejected. Returns the outcome counts, the final stock
+    and confirms per second.
+    """
+    total = threads * orders_per_thread
+    stock = total * quantity // 2 if stock is None else stock
+    product = Product.objects.create(name='Hot SKU', sku=f'HOT-{time.time_ns()}', price=Decimal('10.00'))
+    Inventory.objects.create(product=product, quantity=stock)
+    dealer = Dealer.objects.create(name='Stress Dealer', code=f'STRESS-{time.time_ns()}')
+    line = [(product.id, product.sku, product.name, product.price)]
+    order_ids = [seed_order(dealer.id, line, quantity=quantity).id for _ in range(total)]
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(ids):
+        client = APIClient()
+        barrier.wait()
+        try:
+            for order_id in ids:
+                try:
+                    status_code = client.post(f'/api/orders/{order_id}/confirm/').status_code
+                except Exception:
+                    status_code = 'error'
+                with outcomes_lock:
+                    outcomes[status_code] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(order_ids[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    confirmed = outcomes.get(200, 0)
+    return {
+        'threads': threads,
+        'orders': total,
+        'initial_stock': stock,
+        'confirmed': confirmed,
+        'rejected': outcomes.get(400, 0),
+        'errors': sum(count for code, count in outcomes.items() if code not in (200, 400)),
+        'final_stock': Inventory.objects.get(product=product).quantity,
+        'confirms_per_second': round(confirmed / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _load_stats(timings, errors, elapsed):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+def load_wsgi(path, concurrency, requests):
+    """
+    Sends `requests` GETs for `path` through the WSGI handler from
+    `concurrency` threads, like a threaded WSGI server would.
+    """
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker(count):
+        client = Client()
+        barrier.wait()
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                status_code = client.get(path).status_code
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+                    errors[0] += status_code >= 400
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(len(range(i, requests, concurrency)),)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return _load_stats(timings, errors[0], time.perf_counter() - started)
+
+
+def load_asgi(path, concurrency, requests):
+    """
+    Sends `requests` GETs for `path` through the ASGI handler from
+    `concurrency` asyncio tasks on one event loop.
+    """
+    timings = []
+    errors = 0
+
+    async def worker(count):
+        nonlocal errors
+        client = AsyncClient()
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    async def main():
+        await asyncio.gather(*(worker(len(range(i, requests, concurrency))) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return _load_stats(timings, errors, time.perf_counter() - started)
+
+
+def compare_async(concurrency=16, requests=400):
+    """
+    Load tests each hot read endpoint on the WSGI path (DRF views) and the
+    ASGI path (sales.async_views) with the same concurrency. The catalog
+    cache is disabled so both sides measure the database path. Returns
+    {endpoint: {'wsgi': stats, 'asgi': stats}}.
+    """
+    product = Product.objects.order_by('id').first()
+    order = Order.objects.order_by('id').first()
+    pairs = {
+        'product_list': ('/api/products/?page_size=50', '/api/async/products/?page_size=50'),
+        'product_detail': (f'/api/products/{product.id}/', f'/api/async/products/{product.id}/'),
+        'stock_lookup': (f'/api/products/{product.id}/?fields=id,sku,stock', f'/api/async/stock/?product={product.id}'),
+    }
+    if order is not None:
+        pairs['order_detail'] = (f'/api/orders/{order.id}/', f'/api/async/orders/{order.id}/')
+    results = {}
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+        for endpoint, (sync_path, async_path) in pairs.items():
+            results[endpoint] = {
+                'wsgi': load_wsgi(sync_path, concurrency, requests),
+                'asgi': load_asgi(async_path, concurrency, requests),
+            }
+    return results
+
+
+def database_profile():
+    """
+    The connection settings in effect for the default database, read back
+    from SQLite's pragmas where possible, to label load test results.
+    """
+    settings_dict = connection.settings_dict
+    profile = {
+        'vendor': connection.vendor,
+        'conn_max_age': settings_dict['CONN_MAX_AGE'],
+        'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                # in-memory databases report nothing for some file pragmas
+                row = cursor.fetchone()
+                profile[pragma] = row[0] if row else None
+        profile['transaction_mode'] = settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED')
+    elif connection.vendor == 'postgresql':
+        profile['pool'] = bool(settings_dict['OPTIONS'].get('pool'))
+        profile['server_side_cursors'] = not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
+    return profile
+
+
+def load_orders(concurrency=8, orders=200, lines=5, seed=0):
+    """
+    Creates and confirms `orders` orders of `lines` random catalog lines
+    from `concurrency` threads, the write mix that contends for the
+    database. Each timing covers one create plus its confirm. Returns the
+    load stats (rps is orders per second) and the database profile.
+    """
+    rng = random.Random(seed)
+    catalog = list(Product.objects.order_by('id').values_list('id', flat=True)[:max(lines * 20, 100)])
+    dealer_ids = list(Dealer.objects.order_by('id').values_list('id', flat=True)[:100])
+    payloads = [
+        {'dealer': rng.choice(dealer_ids), 'items': [{'product': pk, 'quantity': 1} for pk in rng.sample(catalog, lines)]}
+        for _ in range(orders)
+    ]
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker(batch):
+        client = APIClient()
+        barrier.wait()
+        try:
+            for payload in batch:
+                started = time.perf_counter()
+                try:
+                    response = client.post('/api/orders/', payload, format='json')
+                    failed = response.status_code != 201
+                    if not failed:
+                        failed = client.post(f"/api/orders/{response.data['id']}/confirm/").status_code != 200
+                except Exception:
+                    failed = True
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+                    errors[0] += failed
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(payloads[i::concurrency],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats = _load_stats(timings, errors[0], time.perf_counter() - started)
+    return {'concurrency': concurrency, 'lines': lines, 'profile': database_profile(), **stats}
+
+
+def _order_ids_for_lines(lines):
+    # the oldest orders that together hold about `lines` order lines
+    ids, total = [], 0
+    for pk, count in Order.objects.order_by('id').values_list('id', 'item_count').iterator():
+        if total >= lines:
+            break
+        ids.append(pk)
+        total += count
+    return ids
+
+
+def compare_serialization(rows=10000, iterations=5):
+    """
+    Times one `rows`-row page of products and one of orders with about
+    `rows` order lines three ways: DRF serializers with the stdlib JSON
+    renderer, compiled rows (sales.fast_serializers) with the stdlib
+    renderer, and compiled rows with FastJSONRenderer. Each timing covers
+    fetch, serialization and rendering (`render` times the two renderers
+    alone); `identical` checks the three outputs are the same bytes.
+    Returns {page: {variant: stats}}.
+    """
+    product_qs = Product.objects.select_related('inventory').order_by('id')[:rows]
+    order_qs = Order.objects.filter(pk__in=_order_ids_for_lines(rows)).order_by('id')
+    pages = {
+        'products': (serializers.ProductSerializer, product_qs, product_qs),
+        'orders': (serializers.OrderSerializer, order_qs.prefetch_related('items'), order_qs),
+    }
+    stdlib, fast = JSONRenderer(), renderers.FastJSONRenderer()
+    results = {}
+    for page, (serializer_class, instances_qs, rows_qs) in pages.items():
+        compiled = fast_serializers.compile_serializer(serializer_class())
+        variants = {
+            'drf': lambda: stdlib.render(serializer_class(list(instances_qs.all()), many=True).data),
+            'compiled': lambda: stdlib.render(compiled.to_dicts(list(rows_qs.values(*compiled.lookups, 'pk')))),
+            'compiled_orjson': lambda: fast.render(compiled.to_dicts(list(rows_qs.values(*compiled.lookups, 'pk')))),
+        }
+        outputs = {}
+        stats = {}
+        for variant, build in variants.items():
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                outputs[variant] = build()
+                timings.append((time.perf_counter() - started) * 1000)
+            best = min(timings)
+            stats[variant] = {'p50_ms': round(percentile(timings, 50), 3), 'best_ms': round(best, 3)}
+        data = json.loads(outputs['drf'])
+        # order pages are sized by their lines
+        count = sum(len(order['items']) for order in data) if page == 'orders' else len(data)
+        data = compiled.to_dicts(list(rows_qs.values(*compiled.lookups, 'pk')))
+        render = {}
+        for name, renderer in (('stdlib', stdlib), ('orjson', fast)):
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                renderer.render(data)
+                timings.append((time.perf_counter() - started) * 1000)
+            render[f'{name}_ms'] = round(min(timings), 3)
+        for variant in variants:
+            best = stats[variant]['best_ms']
+            stats[variant]['rows_per_s'] = round(count / best * 1000) if best else None
+            stats[variant]['speedup'] = round(stats['drf']['best_ms'] / best, 2) if best else None
+        results[page] = {
+            'rows': count, 'bytes': len(outputs['drf']), 'orjson': renderers.orjson is not None,
+            'identical': len(set(outputs.values())) == 1, 'render': render, **stats,
+        }
+    return results
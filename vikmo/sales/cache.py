@@ -0,0 +1,69 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .renderers import FastJSONRenderer
+
+CATALOG_VERSION_KEY = 'sales:catalog:version'
+CATALOG_TIMEOUT = 300
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # start from the clock so a lost version key never revives old entries
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_catalog():
+    """
+    Makes every cached catalog response unreachable. The version is bumped
+    right away and again on commit, so a response cached by a concurrent
+    reader while the writing transaction was still open is discarded too.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def _catalog_key(scope, request):
+    query = hashlib.md5(request.META.get('QUERY_STRING', '').encode()).hexdigest()
+    return f'sales:catalog:{catalog_version()}:{scope}:{query}'
+
+
+def cached_catalog_response(request, scope, build):
+    """
+    Serves `build()` from pre-rendered JSON held in the cache, keyed by the
+    catalog version, `scope` and the query string. Answers 304 when the
+    client's If-None-Match matches. Non-JSON renderers (e.g. the browsable
+    API) and non-200 responses bypass the cache.
+    """
+    if getattr(request, 'accepted_renderer', None) is None or request.accepted_renderer.format != 'json':
+        return build()
+    key = _catalog_key(scope, request)
+    entry = cache.get(key)
+    if entry is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        content = FastJSONRenderer().render(response.data)
+        entry = (content, '"%s"' % hashlib.md5(content).hexdigest())
+        cache.set(key, entry, CATALOG_TIMEOUT)
+    content, etag = entry
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,117 @@
+import csv
+import datetime
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = (
+    ('id', 'id'),
+    ('order_number', 'order_number'),
+    ('dealer_id', 'dealer_id'),
+    ('dealer_code', 'dealer__code'),
+    ('status', 'status'),
+    ('total_amount', 'total_amount'),
+    ('created_at', 'created_at'),
+    ('confirmed_at', 'confirmed_at'),
+    ('delivered_at', 'delivered_at'),
+    ('canceled_at', 'canceled_at'),
+)
+
+LINE_COLUMNS = (
+    ('id', 'id'),
+    ('order_id', 'order_id'),
+    ('order_number', 'order__order_number'),
+    ('product_id', 'product_id'),
+    ('product_sku', 'product_sku'),
+    ('product_name', 'product_name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('line_total', 'line_total'),
+)
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def _parse_bound(value, end=False):
+    # a bare date means the whole day: [date 00:00, date + 1 day 00:00)
+    day = parse_date(value)
+    if day is not None:
+        if end:
+            day += datetime.timedelta(days=1)
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid date: {value}')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def filter_kwargs(params, prefix=''):
+    """
+    Translates export filters (created_from, created_to, status, dealer)
+    into ORM lookups so they run in SQL. `prefix` is prepended to every
+    lookup, e.g. 'order__' when exporting lines. Raises ValueError on bad
+    input.
+    """
+    lookups = {}
+    if params.get('created_from'):
+        lookups[f'{prefix}created_at__gte'] = _parse_bound(params['created_from'])
+    if params.get('created_to'):
+        lookups[f'{prefix}created_at__lt'] = _parse_bound(params['created_to'], end=True)
+    if params.get('status'):
+        lookups[f'{prefix}status__in'] = params['status'].upper().split(',')
+    if params.get('dealer'):
+        lookups[f'{prefix}dealer_id'] = int(params['dealer'])
+    return lookups
+
+
+def export_rows(params, lines=False):
+    """
+    Returns (header, rows) for an order or order line export. Rows are
+    value tuples streamed from the database in chunks.
+    """
+    if lines:
+        columns = LINE_COLUMNS
+        qs = OrderItem.objects.filter(**filter_kwargs(params, prefix='order__')).order_by('order_id', 'id')
+    else:
+        columns = ORDER_COLUMNS
+        qs = Order.objects.filter(**filter_kwargs(params)).order_by('id')
+    header = [name for name, _lookup in columns]
+    rows = qs.values_list(*[lookup for _name, lookup in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return header, rows
+
+
+def _plain(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def iter_ndjson(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, map(_plain, row)))) + '\n'
+
+
+def iter_export(header, rows, export_format):
+    if export_format == 'ndjson':
+        return iter_ndjson(header, rows)
+    return iter_csv(header, rows)
@@ -0,0 +1,159 @@
+"""
+Read-only fast path for list endpoints. A serializer's readable fields are
+compiled once into a plan of (output name, `.values()` lookup, converter),
+and rows fetched with `.values()` are turned into exactly the dicts the
+serializer would have produced, without building model instances or
+calling to_representation field by field. Serializers using a field this
+module cannot reproduce compile to None and keep the regular path.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from . import perf
+
+_PLANS = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or not settings.USE_TZ:
+        raise Unsupported
+    field_timezone = getattr(field, 'timezone', None)
+
+    def build(tz):
+        tz = field_timezone or tz
+
+        def convert(value):
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+    return build
+
+
+def _decimal(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.decimal_places is None or field.localize or field.normalize_output:
+        raise Unsupported
+    # same digits as quantize() + '{:f}' for values the column can hold
+    spec = f'.{field.decimal_places}f'
+    return lambda _tz: lambda value: format(value, spec)
+
+
+def _choice(field):
+    choices = field.choice_strings_to_values
+    return lambda _tz: lambda value: value if value == '' else choices.get(str(value), value)
+
+
+def _converter(field):
+    """
+    Returns a factory building the value converter for the current
+    timezone, or None when the `.values()` value is already what the field
+    would output. Raises Unsupported for anything else.
+    """
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, serializers.DecimalField):
+        return _decimal(field)
+    if isinstance(field, serializers.ChoiceField):
+        return _choice(field)
+    if isinstance(field, serializers.BooleanField):
+        return lambda _tz: bool
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if type(field) in (serializers.IntegerField, serializers.CharField, serializers.EmailField):
+        return None
+    raise Unsupported
+
+
+class RowSerializer:
+    """
+    The compiled form of a serializer: `lookups` are the `.values()`
+    arguments to fetch and `nested` maps a nested list field (a field
+    entry without lookup) to its own RowSerializer and the reverse
+    relation it follows.
+    """
+
+    def __init__(self, model, fields, nested):
+        self.model = model
+        self.fields = fields
+        self.nested = nested
+        self.lookups = [lookup for _name, lookup, _factory in fields if lookup is not None]
+
+    def to_dicts(self, rows):
+        """
+        Converts `.values()` rows, fetching the nested lists in one query per
+        nested field for the whole batch.
+        """
+        with perf.serializing():
+            tz = timezone.get_current_timezone()
+            plan = [(name, lookup, factory(tz) if factory else None) for name, lookup, factory in self.fields]
+            children = {name: self._children(name, rows) for name in self.nested}
+            data = []
+            for row in rows:
+                item = {}
+                for name, lookup, convert in plan:
+                    if lookup is None:
+                        item[name] = children[name].get(row['pk'], [])
+                        continue
+                    value = row[lookup]
+                    item[name] = value if value is None or convert is None else convert(value)
+                data.append(item)
+            return data
+
+    def _children(self, name, rows):
+        child, relation = self.nested[name]
+        related = child.model._default_manager.filter(**{f'{relation}__in': [row['pk'] for row in rows]})
+        # the instances path prefetches the relation, which has no ordering of its own
+        related = related.order_by(*(child.model._meta.ordering or ['pk']))
+        by_parent = {}
+        child_rows = list(related.values(*child.lookups, 'pk', _parent=F(relation)))
+        for row, item in zip(child_rows, child.to_dicts(child_rows)):
+            by_parent.setdefault(row['_parent'], []).append(item)
+        return by_parent
+
+
+def _compile(serializer):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        raise Unsupported
+    fields = []
+    nested = {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            raise Unsupported
+        if isinstance(field, serializers.ListSerializer):
+            relation = model._meta.get_field(field.source)
+            if not relation.one_to_many:
+                raise Unsupported
+            nested[name] = (_compile(field.child), relation.field.name)
+            # keeps the field's position; filled from the nested rows
+            fields.append((name, None, None))
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+            raise Unsupported
+        fields.append((name, '__'.join(field.source_attrs), _converter(field)))
+    return RowSerializer(model, fields, nested)
+
+
+def compile_serializer(serializer):
+    """
+    Returns the RowSerializer of a serializer instance (its fields after any
+    sparse fieldset trimming), cached per class and field list, or None
+    when it has fields the fast path cannot reproduce.
+    """
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _PLANS:
+        try:
+            _PLANS[key] = _compile(serializer)
+        except Unsupported:
+            _PLANS[key] = None
+    return _PLANS[key]
@@ -0,0 +1,183 @@
+import csv
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Dealer, Order, OrderItem, OrderNumberSequence, Product
+
+DEFAULT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ('csv', 'ndjson')
+ERROR_COLUMNS = ('row', 'order_ref', 'error')
+
+
+def read_rows(stream, import_format):
+    """
+    Yields (row_number, row, error) from a text stream of CSV (with a header
+    row) or NDJSON. Rows are read lazily so the file is never held in memory.
+    """
+    if import_format == 'ndjson':
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, None, f'Invalid JSON: {exc}'
+                continue
+            if not isinstance(row, dict):
+                yield number, None, 'Expected a JSON object'
+                continue
+            yield number, row, None
+    else:
+        # row 1 is the header
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row, None
+
+
+class OrderImporter:
+    """
+    Bulk imports draft orders from flat line rows:
+    {order_ref, dealer_code | dealer_id, sku | product_id, quantity}.
+
+    Consecutive rows sharing an order_ref form one order. Dealers and
+    products are resolved against lookup maps built once up front, and
+    orders and their lines are written with bulk_create, one transaction
+    per `batch_size` lines. An order with any invalid line is skipped as a
+    whole and every problem is reported in `errors`.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.dealers_by_code = dict(Dealer.objects.values_list('code', 'id'))
+        self.dealer_ids = set(self.dealers_by_code.values())
+        self.products_by_sku = {}
+        self.products_by_id = {}
+        for pk, sku, name, price in Product.objects.values_list('id', 'sku', 'name', 'price').iterator(chunk_size=5000):
+            self.products_by_sku[sku] = self.products_by_id[pk] = (pk, sku, name, price)
+        self.errors = []
+        self.orders_created = 0
+        self.lines_created = 0
+        self.rows_read = 0
+        self._seen_refs = set()
+        self._pending = []
+        self._pending_lines = 0
+
+    def run(self, rows):
+        current_ref = None
+        current = None
+        for number, row, error in rows:
+            self.rows_read += 1
+            if error:
+                self.errors.append({'row': number, 'order_ref': '', 'error': error})
+                continue
+            ref = str(row.get('order_ref') or '').strip()
+            if current is None or ref != current_ref:
+                self._finish(current)
+                current_ref = ref
+                current = {'ref': ref, 'dealer_id': None, 'lines': [], 'failed': False}
+                self._start(current, number, row)
+            self._add_line(current, number, row)
+        self._finish(current)
+        self._flush()
+        return self.summary()
+
+    def summary(self):
+        return {
+            'rows': self.rows_read,
+            'orders': self.orders_created,
+            'lines': self.lines_created,
+            'errors': self.errors,
+        }
+
+    def _fail(self, order, number, message):
+        order['failed'] = True
+        self.errors.append({'row': number, 'order_ref': order['ref'], 'error': message})
+
+    def _start(self, order, number, row):
+        if not order['ref']:
+            self._fail(order, number, 'order_ref is required')
+        elif order['ref'] in self._seen_refs:
+            self._fail(order, number, 'order_ref rows must be contiguous')
+        self._seen_refs.add(order['ref'])
+        code = str(row.get('dealer_code') or '').strip()
+        dealer_id = row.get('dealer_id')
+        if code:
+            order['dealer_id'] = self.dealers_by_code.get(code)
+        elif dealer_id not in (None, ''):
+            try:
+                dealer_id = int(dealer_id)
+            except (TypeError, ValueError):
+                dealer_id = None
+            if dealer_id in self.dealer_ids:
+                order['dealer_id'] = dealer_id
+        if order['dealer_id'] is None:
+            self._fail(order, number, f'Unknown dealer "{code or dealer_id}"')
+
+    def _add_line(self, order, number, row):
+        sku = str(row.get('sku') or '').strip()
+        product = self.products_by_sku.get(sku) if sku else None
+        if not sku:
+            try:
+                product = self.products_by_id.get(int(row.get('product_id')))
+            except (TypeError, ValueError):
+                product = None
+        if product is None:
+            self._fail(order, number, f"Unknown product \"{sku or row.get('product_id')}\"")
+            return
+        try:
+            quantity = int(row.get('quantity'))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            self._fail(order, number, 'quantity must be a positive integer')
+            return
+        order['lines'].append((product, quantity))
+
+    def _finish(self, order):
+        if order is None or order['failed'] or not order['lines']:
+            return
+        self._pending.append(order)
+        self._pending_lines += len(order['lines'])
+        if self._pending_lines >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        day = timezone.localdate()
+        orders = []
+        items = []
+        with transaction.atomic():
+            first = OrderNumberSequence.allocate(count=len(self._pending), day=day)
+            for offset, pending in enumerate(self._pending):
+                order = Order(dealer_id=pending['dealer_id'], order_number=Order.format_number(day, first + offset))
+                total = Decimal('0.00')
+                for (product_id, sku, name, price), quantity in pending['lines']:
+                    line_total = price * quantity
+                    items.append(OrderItem(
+                        order=order, product_id=product_id, product_sku=sku, product_name=name,
+                        quantity=quantity, unit_price=price, line_total=line_total,
+                    ))
+                    total += line_total
+                order.total_amount = total
+                order.item_count = len(pending['lines'])
+                orders.append(order)
+            # the backend returns the new primary keys, which the items pick up
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        self.orders_created += len(orders)
+        self.lines_created += len(items)
+        self._pending = []
+        self._pending_lines = 0
+        if self.progress:
+            self.progress(self.summary())
+
+
+def write_errors(errors, stream):
+    writer = csv.DictWriter(stream, fieldnames=ERROR_COLUMNS)
+    writer.writeheader()
+    writer.writerows(errors)
@@ -0,0 +1,230 @@
+"""
+A small job queue kept in the sales_job table, so heavy operations can run
+outside the request without a separate broker. Views enqueue a job and
+answer 202 with its id; `manage.py run_workers` claims and runs due jobs.
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database has it
+(PostgreSQL, MySQL 8) and a guarded UPDATE elsewhere (SQLite).
+"""
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from . import reports, stock, transitions
+from .models import Job, Order
+
+HANDLERS = {}
+
+# seconds before a failed attempt is retried: RETRY_BASE_DELAY * 2 ** (attempt - 1)
+RETRY_BASE_DELAY = 5
+# RUNNING jobs not finished after this many seconds are assumed lost with their worker
+# (run_workers has the same default)
+STALE_AFTER = 15 * 60
+# seconds between refreshes of a running job's locked_at, so a long job is never taken for stale
+HEARTBEAT_INTERVAL = 60
+
+
+class JobFailed(Exception):
+    """
+    Raised by a handler for a failure that retrying will not fix, e.g. a
+    shortfall of stock. The job is marked failed at once with `result`.
+    """
+
+    def __init__(self, detail, **result):
+        super().__init__(detail)
+        self.result = {'detail': detail, **result}
+
+
+def handler(kind):
+    """
+    Registers the decorated function as the handler of `kind` jobs. It is
+    called with the job's payload and returns a JSON-serializable result.
+    """
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=3):
+    if kind not in HANDLERS:
+        raise ValueError(f'No handler for job kind {kind!r}')
+    return Job.objects.create(kind=kind, payload=payload or {}, max_attempts=max_attempts,
+                              created_by=user if user is not None and user.is_authenticated else None)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _due():
+    return Job.objects.filter(status=Job.STATUS_QUEUED, run_after__lte=timezone.now()).order_by('run_after', 'id')
+
+
+def claim(worker=None):
+    """
+    Marks the next due job RUNNING for `worker` and returns it, or None
+    when nothing is due. Concurrent workers never claim the same job.
+    """
+    worker = worker or worker_name()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _due().select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            return _mark_running(job, worker)
+    # no row locks: take a candidate and keep it only if our guarded UPDATE won
+    for job in _due()[:10]:
+        if _mark_running(job, worker, guarded=True):
+            return job
+    return None
+
+
+def _mark_running(job, worker, guarded=False):
+    now = timezone.now()
+    qs = Job.objects.filter(pk=job.pk)
+    if guarded:
+        qs = qs.filter(status=Job.STATUS_QUEUED)
+    changes = {'status': Job.STATUS_RUNNING, 'locked_by': worker, 'locked_at': now, 'updated_at': now}
+    if not qs.update(attempts=job.attempts + 1, **changes):
+        return None
+    job.attempts += 1
+    for name, value in changes.items():
+        setattr(job, name, value)
+    return job
+
+
+def _finish(job, status, result=None, error='', run_after=None):
+    now = timezone.now()
+    changes = {'status': status, 'result': result, 'error': error, 'locked_by': '', 'locked_at': None, 'updated_at': now}
+    if run_after is not None:
+        changes['run_after'] = run_after
+    else:
+        changes['finished_at'] = now
+    # guarded by locked_by so a worker whose job was requeued as stale cannot overwrite it
+    Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by).update(**changes)
+    for name, value in changes.items():
+        setattr(job, name, value)
+
+
+def _heartbeat(job, stop, interval):
+    # runs in its own thread, so on its own database connection
+    try:
+        while not stop.wait(interval):
+            try:
+                Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by).update(
+                    locked_at=timezone.now(),
+                )
+            except DatabaseError:
+                # e.g. SQLite busy while the handler writes; the next beat tries again
+                pass
+    finally:
+        connection.close()
+
+
+def run(job, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Runs a claimed job and records the outcome: SUCCEEDED with the
+    handler's result, FAILED on JobFailed or once max_attempts is used
+    up, otherwise QUEUED again with an exponential, jittered delay.
+    While the handler runs, a heartbeat thread refreshes locked_at every
+    `heartbeat_interval` seconds.
+    """
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job, stop, heartbeat_interval), daemon=True)
+    beat.start()
+    try:
+        result = HANDLERS[job.kind](job.payload)
+    except JobFailed as exc:
+        _finish(job, Job.STATUS_FAILED, result=exc.result, error=str(exc))
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts or job.kind not in HANDLERS:
+            _finish(job, Job.STATUS_FAILED, error=error)
+        else:
+            delay = RETRY_BASE_DELAY * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5)
+            _finish(job, Job.STATUS_QUEUED, error=error, run_after=timezone.now() + timedelta(seconds=delay))
+    else:
+        _finish(job, Job.STATUS_SUCCEEDED, result=result)
+    finally:
+        stop.set()
+        beat.join()
+    return job
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """
+    Puts RUNNING jobs whose worker went away (no heartbeat for
+    `stale_after` seconds) back in the queue. Returns how many.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff).update(
+        status=Job.STATUS_QUEUED, locked_by='', locked_at=None, updated_at=timezone.now(),
+    )
+
+
+def work(worker=None, poll_interval=1.0, stop=None, once=False, stale_after=STALE_AFTER):
+    """
+    The worker loop: claims and runs due jobs until `stop()` returns True,
+    sleeping `poll_interval` seconds whenever the queue is empty. With
+    once=True it returns as soon as nothing is due. Returns the number of
+    jobs run.
+    """
+    worker = worker or worker_name()
+    done = 0
+    last_sweep = 0
+    while not (stop and stop()):
+        if time.monotonic() - last_sweep > 60:
+            stock.run_with_retries(lambda: requeue_stale(stale_after))
+            last_sweep = time.monotonic()
+        job = stock.run_with_retries(lambda: claim(worker))
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run(job, heartbeat_interval=min(HEARTBEAT_INTERVAL, stale_after / 3))
+        done += 1
+    return done
+
+
+@handler('confirm_order')
+def confirm_order(payload):
+    def confirm():
+        order = Order.objects.filter(pk=payload['order_id']).first()
+        if order is None:
+            raise JobFailed('Not found.')
+        if order.status != Order.STATUS_DRAFT:
+            raise JobFailed('Only Draft orders can be confirmed')
+        try:
+            confirmed = stock.confirm_order(order)
+        except stock.InsufficientStock as exc:
+            raise JobFailed(exc.detail, items=exc.items)
+        if not confirmed:
+            raise JobFailed('Only Draft orders can be confirmed')
+        return {'detail': 'Order confirmed', 'order_id': order.pk}
+    return stock.run_with_retries(confirm)
+
+
+def _bulk(transition):
+    def run_transition(payload):
+        results = stock.run_with_retries(lambda: transition(payload['ids'], payload.get('mode', transitions.MODE_PARTIAL)))
+        succeeded = sum(result['ok'] for result in results)
+        return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
+    return run_transition
+
+
+handler('bulk_confirm')(_bulk(transitions.confirm_orders))
+handler('bulk_deliver')(_bulk(transitions.deliver_orders))
+handler('bulk_cancel')(_bulk(transitions.cancel_orders))
+
+
+@handler('backfill_reports')
+def backfill_reports(payload):
+    return {'orders': reports.backfill(batch_size=payload.get('batch_size', 2000))}
@@ -0,0 +1,130 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+TOTALS_BATCH_SIZE = 1000
+
+
+class OrderNotEditable(Exception):
+    """
+    Raised when a line edit targets an order that is missing or no longer
+    a draft. Nothing is written in that case.
+    """
+
+
+class LineConflict(Exception):
+    """
+    Raised when the line was changed or removed by a concurrent request
+    between reading it and writing it. Missing lines raise
+    OrderItem.DoesNotExist instead.
+    """
+
+
+def _apply(order_id, amount, count):
+    # guarded delta UPDATE of the denormalized totals; doubles as the draft check
+    now = timezone.now()
+    updated = Order.objects.filter(pk=order_id, status=Order.STATUS_DRAFT).update(
+        total_amount=F('total_amount') + Value(amount),
+        item_count=F('item_count') + count,
+        updated_at=now,
+    )
+    if not updated:
+        raise OrderNotEditable
+
+
+def order_totals(order_id):
+    return Order.objects.filter(pk=order_id).values('total_amount', 'item_count').get()
+
+
+def add_line(order_id, product, quantity):
+    """
+    Appends a line for `product` to a draft order, snapshotting sku, name
+    and price, and adds it to the order totals. Returns the new line.
+    """
+    line_total = product.price * quantity
+    with transaction.atomic():
+        _apply(order_id, line_total, 1)
+        item = OrderItem(order_id=order_id, product=product, product_sku=product.sku, product_name=product.name,
+                         quantity=quantity, unit_price=product.price, line_total=line_total)
+        # bulk_create skips OrderItem.save, which would re-read the product
+        OrderItem.objects.bulk_create([item])
+    return item
+
+
+def change_line(order_id, item_id, quantity):
+    """
+    Sets the quantity of one line at its snapshotted price. Only that line
+    and the order row are written: the total moves by the line's delta.
+    Returns the updated line.
+    """
+    with transaction.atomic():
+        item = OrderItem.objects.get(pk=item_id, order_id=order_id)
+        line_total = item.unit_price * quantity
+        # the old quantity guards against a concurrent edit of the same line
+        updated = OrderItem.objects.filter(pk=item_id, quantity=item.quantity).update(
+            quantity=quantity, line_total=line_total, updated_at=timezone.now(),
+        )
+        if not updated:
+            raise LineConflict
+        _apply(order_id, line_total - item.line_total, 0)
+    item.quantity = quantity
+    item.line_total = line_total
+    return item
+
+
+def remove_line(order_id, item_id):
+    """
+    Deletes one line and subtracts it from the order totals.
+    """
+    with transaction.atomic():
+        item = OrderItem.objects.filter(pk=item_id, order_id=order_id).values('quantity', 'line_total').get()
+        deleted, _ = OrderItem.objects.filter(pk=item_id, quantity=item['quantity']).delete()
+        if not deleted:
+            raise LineConflict
+        _apply(order_id, -item['line_total'], -1)
+
+
+def audit_totals(batch_size=TOTALS_BATCH_SIZE, fix=False):
+    """
+    Compares every order's total_amount and item_count with SUM(line_total)
+    and COUNT(*) of its lines, `batch_size` orders at a time (keyset over
+    id, one aggregate query per batch). Returns the mismatches; with
+    fix=True each mismatching batch is rewritten from its lines.
+    """
+    mismatches = []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            qs = Order.objects.filter(pk__gt=last_id).order_by('pk')
+            if fix:
+                qs = qs.select_for_update()
+            batch = list(qs.only('id', 'total_amount', 'item_count')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            sums = {
+                row['order_id']: (row['total'], row['count'])
+                for row in OrderItem.objects.filter(order_id__in=[order.pk for order in batch])
+                .values('order_id').annotate(total=Sum('line_total'), count=Count('id'))
+            }
+            changed = []
+            for order in batch:
+                total, count = sums.get(order.pk, (Decimal('0.00'), 0))
+                total = Decimal(total).quantize(Decimal('0.01'))
+                if order.total_amount != total or order.item_count != count:
+                    mismatches.append({
+                        'order_id': order.pk,
+                        'total_amount': order.total_amount,
+                        'item_count': order.item_count,
+                        'lines_total': total,
+                        'lines_count': count,
+                    })
+                    order.total_amount, order.item_count = total, count
+                    changed.append(order)
+            if fix and changed:
+                Order.objects.bulk_update(changed, ['total_amount', 'item_count'], batch_size=TOTALS_BATCH_SIZE)
+    return mismatches
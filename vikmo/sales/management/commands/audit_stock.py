@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import stock
+
+
+class Command(BaseCommand):
+    help = 'Check (or with --fix rebuild) the inventory snapshot against the stock movement ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite drifted rows from the ledger')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products per batch')
+
+    def handle(self, *args, **options):
+        drift = stock.audit(batch_size=options['batch_size'], fix=options['fix'])
+        for row in drift:
+            self.stdout.write(
+                f"product {row['product_id']}: snapshot {row['quantity']}/{row['reserved']}, "
+                f"ledger {row['ledger_quantity']}/{row['ledger_reserved']}"
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Inventory matches the ledger'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(drift)} inventory rows from the ledger'))
+        else:
+            raise CommandError(f'{len(drift)} inventory rows differ from the ledger; run with --fix to rebuild them')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sales import reports
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily dealer and product sales rollups from the order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Orders read per batch')
+
+    def handle(self, *args, **options):
+        def progress(processed):
+            self.stderr.write(f'{processed} orders read')
+
+        processed = reports.backfill(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups from {processed} orders'))
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from sales import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with a synthetic catalog and record '
+        'p50/p99 latency and query counts for the hot sales endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--dealers', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=200, help='Background draft orders to seed')
+        parser.add_argument('--max-lines', type=int, default=500, help='Largest order size seeded and benchmarked')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', '-o', default='bench_baseline.json', help='JSON file for the results')
+        parser.add_argument('--stress-threads', type=int, default=0,
+                            help='Also run a concurrent confirm stress test on one hot SKU with this many threads')
+        parser.add_argument('--async-concurrency', type=int, default=0,
+                            help='Also load test the WSGI and ASGI read endpoints with this many concurrent clients')
+        parser.add_argument('--async-requests', type=int, default=400, help='Requests per endpoint for --async-concurrency')
+        parser.add_argument('--order-load', type=int, default=0,
+                            help='Also load test concurrent order create + confirm with this many threads')
+        parser.add_argument('--order-load-orders', type=int, default=200, help='Orders to create for --order-load')
+        parser.add_argument('--serialization-rows', type=int, default=0,
+                            help='Also compare DRF and fast list serialization on pages of this many rows')
+        parser.add_argument('--baseline', help='Fail if query counts grew compared to this JSON file')
+
+    def handle(self, *args, **options):
+        max_lines = options['max_lines']
+        sizes = sorted({1, min(50, max_lines), max_lines})
+        setup_test_environment()
+        tmpdir = None
+        if options['order_load'] and connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # an in-memory test database has no journal, so WAL and the
+            # other file pragmas would not be measured
+            tmpdir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'bench_sales.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write('Seeding catalog...')
+            benchmarks.seed_catalog(
+                products=max(options['products'], max_lines), dealers=options['dealers'],
+                orders=options['orders'], max_lines=max_lines,
+            )
+            self.stdout.write('Running benchmarks...')
+            results = benchmarks.run_benchmarks(lines=sizes, iterations=options['iterations'])
+            stress = None
+            if options['stress_threads']:
+                self.stdout.write('Running concurrent confirm stress test...')
+                stress = benchmarks.stress_confirm(threads=options['stress_threads'])
+            async_load = None
+            if options['async_concurrency']:
+                self.stdout.write('Comparing WSGI and ASGI read endpoints...')
+                async_load = benchmarks.compare_async(
+                    concurrency=options['async_concurrency'], requests=options['async_requests'],
+                )
+            order_load = None
+            if options['order_load']:
+                self.stdout.write('Load testing concurrent order create + confirm...')
+                order_load = benchmarks.load_orders(
+                    concurrency=options['order_load'], orders=options['order_load_orders'],
+                )
+            serialization = None
+            if options['serialization_rows']:
+                self.stdout.write('Comparing list serialization paths...')
+                serialization = benchmarks.compare_serialization(rows=options['serialization_rows'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if tmpdir:
+                connection.settings_dict['TEST']['NAME'] = None
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        report = {
+            'config': {key: options[key] for key in ('products', 'dealers', 'orders', 'max_lines', 'iterations')},
+            'vendor': connection.vendor,
+            'results': results,
+        }
+        if stress:
+            report['stress_confirm'] = stress
+        if async_load:
+            report['async_load'] = async_load
+        if order_load:
+            report['order_load'] = order_load
+        if serialization:
+            report['serialization'] = serialization
+        with open(options['output'], 'w') as out:
+            json.dump(report, out, indent=2)
+        for endpoint, by_size in results.items():
+            for size, stats in by_size.items():
+                self.stdout.write(
+                    f"{endpoint:<18} {size:>6}  p50 {stats['p50_ms']:>9.2f} ms  p99 {stats['p99_ms']:>9.2f} ms  {stats['queries']:>4} queries"
+                )
+        if stress:
+            self.stdout.write(
+                f"stress_confirm     {stress['threads']} threads: {stress['confirmed']} confirmed, "
+                f"{stress['rejected']} rejected, {stress['errors']} errors, final stock {stress['final_stock']}, "
+                f"{stress['confirms_per_second']} confirms/s"
+            )
+        for endpoint, paths in (async_load or {}).items():
+            for path, stats in paths.items():
+                self.stdout.write(
+                    f"{endpoint:<18} {path:>6}  {stats['rps']:>8.1f} req/s  p50 {stats['p50_ms']:>9.2f} ms  "
+                    f"p99 {stats['p99_ms']:>9.2f} ms  {stats['errors']} errors"
+                )
+        if order_load:
+            self.stdout.write(
+                f"order_load         {order_load['concurrency']} threads: {order_load['rps']:.1f} orders/s  "
+                f"p50 {order_load['p50_ms']:.2f} ms  p99 {order_load['p99_ms']:.2f} ms  {order_load['errors']} errors  "
+                f"{order_load['profile']}"
+            )
+        for page, stats in (serialization or {}).items():
+            for variant in ('drf', 'compiled', 'compiled_orjson'):
+                self.stdout.write(
+                    f"serialize_{page:<8} {variant:>15}  {stats['rows']} rows  best {stats[variant]['best_ms']:>9.2f} ms  "
+                    f"{stats[variant]['rows_per_s']:>8} rows/s  x{stats[variant]['speedup']}"
+                )
+            self.stdout.write(
+                f"render_{page:<11} stdlib {stats['render']['stdlib_ms']:.2f} ms  orjson {stats['render']['orjson_ms']:.2f} ms"
+            )
+        self.stdout.write(f"Results written to {options['output']}")
+
+        problems = [
+            f'{endpoint}: query count grows with input size {counts}'
+            for endpoint, counts in benchmarks.query_growth(results).items()
+        ]
+        if stress and (stress['errors'] or stress['final_stock'] < 0):
+            problems.append(f'stress_confirm: {stress}')
+        problems += [
+            f'{endpoint} ({path}): {stats["errors"]} failed requests'
+            for endpoint, paths in (async_load or {}).items() for path, stats in paths.items() if stats['errors']
+        ]
+        problems += [
+            f'serialize_{page}: fast path output differs from the serializers'
+            for page, stats in (serialization or {}).items() if not stats['identical']
+        ]
+        if order_load and order_load['errors']:
+            problems.append(f"order_load: {order_load['errors']} failed orders")
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                problems += benchmarks.compare_to_baseline(results, json.load(fh)['results'])
+        if problems:
+            raise CommandError('Query count regressions:\n' + '\n'.join(problems))
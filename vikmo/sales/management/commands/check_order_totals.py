@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import lines
+
+
+class Command(BaseCommand):
+    help = 'Verify (or with --fix repair) order total_amount and item_count against their lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite mismatching orders from their lines')
+        parser.add_argument('--batch-size', type=int, default=lines.TOTALS_BATCH_SIZE, help='Orders per batch')
+
+    def handle(self, *args, **options):
+        mismatches = lines.audit_totals(batch_size=options['batch_size'], fix=options['fix'])
+        for row in mismatches:
+            self.stdout.write(
+                f"order {row['order_id']}: stored {row['total_amount']} / {row['item_count']} lines, "
+                f"computed {row['lines_total']} / {row['lines_count']} lines"
+            )
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All order totals match their lines'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(mismatches)} orders'))
+        else:
+            raise CommandError(f'{len(mismatches)} orders do not match their lines; run with --fix to repair them')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream orders or order lines as CSV or NDJSON with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', action='store_true', help='Export order lines instead of orders')
+        parser.add_argument('--output-format', choices=exports.EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--created-from', help='Start date or datetime (inclusive)')
+        parser.add_argument('--created-to', help='End date (inclusive) or datetime (exclusive)')
+        parser.add_argument('--status', help='Comma separated statuses')
+        parser.add_argument('--dealer', help='Dealer id')
+
+    def handle(self, *args, **options):
+        params = {
+            'created_from': options['created_from'],
+            'created_to': options['created_to'],
+            'status': options['status'],
+            'dealer': options['dealer'],
+        }
+        try:
+            header, rows = exports.export_rows(params, lines=options['lines'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        chunks = exports.iter_export(header, rows, options['output_format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            out.writelines(chunks)
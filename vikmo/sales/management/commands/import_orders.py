@@ -0,0 +1,48 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import imports
+
+
+class Command(BaseCommand):
+    help = 'Import draft orders from a CSV or NDJSON file of order lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header) or NDJSON file')
+        parser.add_argument('--input-format', choices=imports.IMPORT_FORMATS,
+                            help='Defaults to the file extension, else csv')
+        parser.add_argument('--batch-size', type=int, default=imports.DEFAULT_BATCH_SIZE,
+                            help='Order lines written per transaction')
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['input_format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        started = time.monotonic()
+
+        def progress(summary):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{summary['rows']} rows read, {summary['orders']} orders / {summary['lines']} lines written, "
+                f"{len(summary['errors'])} errors ({elapsed:.1f}s)"
+            )
+
+        importer = imports.OrderImporter(batch_size=options['batch_size'], progress=progress)
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                summary = importer.run(imports.read_rows(stream, import_format))
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f'{path} is not a UTF-8 encoded CSV or NDJSON file: {exc}')
+
+        if options['errors'] and summary['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as out:
+                imports.write_errors(summary['errors'], out)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['orders']} orders ({summary['lines']} lines) in {elapsed:.1f}s; "
+            f"{len(summary['errors'])} rows rejected"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import outbox
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed events older than the retention period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Keep events from the last N days')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        deleted = outbox.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} events older than {options["days"]} days'))
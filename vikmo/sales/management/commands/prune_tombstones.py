@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete delta sync tombstones older than the retention period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=sync.TOMBSTONE_DAYS, help='Keep tombstones from the last N days')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        deleted = sync.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones older than {options["days"]} days'))
@@ -0,0 +1,64 @@
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# sales.jobs is imported lazily: with the 'spawn' start method (Windows,
+# macOS) worker processes import this module before Django is set up
+STALE_AFTER = 15 * 60
+
+
+def _serve(index, options, stopping):
+    # runs in each worker process; connections inherited from the parent are unusable
+    django.setup()
+    from sales import jobs
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_args: stopping.set())
+    try:
+        jobs.work(
+            worker=f'{jobs.worker_name()}#{index}', poll_interval=options['poll_interval'],
+            stop=stopping.is_set, stale_after=options['stale_after'],
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers that claim and execute queued sales jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes to start')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=STALE_AFTER,
+                            help='Seconds after which a RUNNING job is assumed lost and queued again')
+        parser.add_argument('--once', action='store_true', help='Run every due job in this process, then exit')
+
+    def handle(self, *args, **options):
+        from sales import jobs
+        if options['once']:
+            done = jobs.work(once=True, stale_after=options['stale_after'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs'))
+            return
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        stopping = multiprocessing.Event()
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_serve, args=(index, options, stopping), daemon=True)
+            for index in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *_args: stopping.set())
+        self.stdout.write(f"Started {len(processes)} workers; Ctrl+C stops them after their current job")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stopping.set()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:41
+
+import datetime
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    # continue numbering after the pk-derived numbers already handed out
+    Order = apps.get_model('sales', 'Order')
+    OrderNumberSequence = apps.get_model('sales', 'OrderNumberSequence')
+    last_values = {}
+    for number in Order.objects.exclude(order_number=None).values_list('order_number', flat=True).iterator():
+        try:
+            _, day, value = number.split('-')
+            day = datetime.datetime.strptime(day, '%Y%m%d').date()
+            value = int(value)
+        except ValueError:
+            continue
+        last_values[day] = max(value, last_values.get(day, 0))
+    OrderNumberSequence.objects.bulk_create(
+        [OrderNumberSequence(day=day, last_value=value) for day, value in last_values.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_alter_order_order_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['dealer', '-created_at', '-id'], name='sales_ord_dealer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_ledger(apps, schema_editor):
+    # stock of confirmed orders was already deducted, so it becomes reserved
+    Inventory = apps.get_model('sales', 'Inventory')
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    StockMovement = apps.get_model('sales', 'StockMovement')
+    reserved = dict(
+        OrderItem.objects.filter(order__status='CONFIRMED', product__isnull=False)
+        .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    inventories = []
+    movements = []
+    for inv in Inventory.objects.iterator(chunk_size=2000):
+        inv.reserved = reserved.get(inv.product_id, 0)
+        inventories.append(inv)
+        movements.append(StockMovement(product_id=inv.product_id, kind='RECEIPT', available_change=inv.quantity,
+                                       reserved_change=inv.reserved, reference='Opening balance'))
+    Inventory.objects.bulk_update(inventories, ['reserved'], batch_size=500)
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_order_dealer_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='reserved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RECEIPT', 'Receipt'), ('RESERVATION', 'Reservation'), ('RELEASE', 'Release'), ('SHIPMENT', 'Shipment'), ('ADJUSTMENT', 'Adjustment')], max_length=16)),
+                ('available_change', models.IntegerField(default=0)),
+                ('reserved_change', models.IntegerField(default=0)),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='sales.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-created_at', '-id'], name='sales_move_product_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:28
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_items(apps, schema_editor):
+    # one set-based UPDATE rather than a save per order
+    Order = apps.get_model('sales', 'Order')
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    counts = (
+        OrderItem.objects.filter(order_id=OuterRef('pk'))
+        .values('order_id').annotate(count=Count('id')).values('count')
+    )
+    Order.objects.update(item_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_order_item_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DealerDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('lead_time_seconds', models.BigIntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('dealer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='sales.dealer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='sales_dealer_daily_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dealer', 'day'), name='sales_dealer_daily_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('lead_time_seconds', models.BigIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='sales.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='sales_product_daily_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='sales_product_daily_unique')],
+            },
+        ),
+    ]
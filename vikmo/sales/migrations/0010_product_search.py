@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:10
+
+from django.db import migrations
+
+from sales import search
+
+
+def install(apps, schema_editor):
+    search.install_index(schema_editor.connection)
+
+
+def drop(apps, schema_editor):
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_daily_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, drop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(choices=[('order', 'Order'), ('stock', 'Stock')], max_length=16)),
+                ('kind', models.CharField(max_length=32)),
+                ('key', models.BigIntegerField()),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['topic', 'id'], name='sales_outbox_topic_idx'), models.Index(fields=['created_at'], name='sales_outbox_created_idx')],
+            },
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from decimal import Decimal
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import F
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
@@ -25,18 +25,67 @@ class Product(TimeStampedModel):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'sku'], name='sales_prod_name_sku_idx'),
+            # the dealer-facing catalog only ever lists active products
+            models.Index(fields=['name', 'sku'], name='sales_prod_active_name_idx', condition=models.Q(active=True)),
+            # delta sync scans rows changed since the client's watermark
+            models.Index(fields=['updated_at', 'id'], name='sales_prod_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets the SKU search index tell when a save changed the SKU
+        instance._loaded_sku = instance.__dict__.get('sku')
+        return instance
+
 
 class Inventory(TimeStampedModel):
+    """
+    Materialized stock snapshot of one product, kept in step with the
+    StockMovement ledger. `quantity` is the stock available to new orders
+    and `reserved` the stock committed to confirmed, undelivered orders.
+    """
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='inventory')
     quantity = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='sales_inv_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.sku} - {self.quantity}"
 
+    @property
+    def available(self):
+        return self.quantity
+
+    @property
+    def on_hand(self):
+        return self.quantity + self.reserved
+
+    def save(self, *args, **kwargs):
+        # direct edits set the available quantity; record them in the ledger
+        from . import outbox
+        with transaction.atomic():
+            # the post_save signal publishes the new stock
+            outbox.lock_writers()
+            before = 0
+            if not self._state.adding:
+                current = Inventory.objects.select_for_update().filter(pk=self.pk).values_list('quantity', 'reserved').first()
+                if current is not None:
+                    before, self.reserved = current
+            kind = StockMovement.KIND_RECEIPT if self._state.adding else StockMovement.KIND_ADJUSTMENT
+            super().save(*args, **kwargs)
+            if self.quantity != before:
+                StockMovement.objects.create(product_id=self.product_id, kind=kind, available_change=self.quantity - before)
+
 
 class Dealer(TimeStampedModel):
     name = models.CharField(max_length=255)
@@ -46,10 +95,48 @@ class Dealer(TimeStampedModel):
     phone = models.CharField(max_length=32, blank=True)
     address = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='sales_dealer_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.code})"
 
 
+class OrderNumberSequence(models.Model):
+    """
+    Per-day counter used to hand out gap-free order numbers before the
+    order row is inserted.
+    """
+    day = models.DateField(unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day:%Y%m%d} - {self.last_value}"
+
+    @classmethod
+    def allocate(cls, count=1, day=None):
+        """
+        Reserves `count` consecutive numbers for `day` and returns the first.
+        The counter row stays locked until the surrounding transaction ends,
+        so a rolled back order gives its number back.
+        """
+        day = day or timezone.localdate()
+        with transaction.atomic():
+            updated = cls.objects.filter(day=day).update(last_value=F('last_value') + count)
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(day=day, last_value=count)
+                    return 1
+                except IntegrityError:
+                    # another writer created today's counter first
+                    cls.objects.filter(day=day).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(day=day).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+
+
 class Order(TimeStampedModel):
     STATUS_DRAFT = 'DRAFT'
     STATUS_CONFIRMED = 'CONFIRMED'
@@ -67,16 +154,48 @@ class Order(TimeStampedModel):
     order_number = models.CharField(max_length=32, unique=True, blank=True, null=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_DRAFT)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # number of lines, maintained alongside total_amount
+    item_count = models.PositiveIntegerField(default=0)
     confirmed_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
     canceled_at = models.DateTimeField(null=True, blank=True)
 
+    OPEN_STATUSES = (STATUS_DRAFT, STATUS_CONFIRMED)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='sales_ord_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='sales_ord_status_created_idx'),
+            models.Index(fields=['dealer', '-created_at', '-id'], name='sales_ord_dealer_created_idx'),
+            models.Index(fields=['dealer', 'status', '-created_at', '-id'], name='sales_ord_dealer_status_idx'),
+            # open orders are a small, hot slice of the table
+            models.Index(
+                fields=['-created_at', '-id'], name='sales_ord_open_created_idx',
+                condition=models.Q(status__in=['DRAFT', 'CONFIRMED']),
+            ),
+            models.Index(
+                fields=['dealer', '-created_at', '-id'], name='sales_ord_open_dealer_idx',
+                condition=models.Q(status__in=['DRAFT', 'CONFIRMED']),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.order_number} - {self.dealer.name} - {self.status}"
 
+    @staticmethod
+    def format_number(day, value):
+        return f"ORD-{day:%Y%m%d}-{value:04d}"
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.order_number:
+            # number the order in the same transaction as its INSERT
+            with transaction.atomic():
+                day = timezone.localdate()
+                self.order_number = self.format_number(day, OrderNumberSequence.allocate(day=day))
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
 
 class OrderItem(TimeStampedModel):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -108,5 +227,200 @@ class InventoryAdjustment(TimeStampedModel):
     change = models.IntegerField()  # positive or negative
     note = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='sales_adj_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Adj {self.product.sku} {self.change} by {self.changed_by}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Every change to an Inventory snapshot is
+    written here in the same transaction, so summing a product's movements
+    always gives its available and reserved stock.
+    """
+    KIND_RECEIPT = 'RECEIPT'
+    KIND_RESERVATION = 'RESERVATION'
+    KIND_RELEASE = 'RELEASE'
+    KIND_SHIPMENT = 'SHIPMENT'
+    KIND_ADJUSTMENT = 'ADJUSTMENT'
+
+    KIND_CHOICES = [
+        (KIND_RECEIPT, 'Receipt'),
+        (KIND_RESERVATION, 'Reservation'),
+        (KIND_RELEASE, 'Release'),
+        (KIND_SHIPMENT, 'Shipment'),
+        (KIND_ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    available_change = models.IntegerField(default=0)
+    reserved_change = models.IntegerField(default=0)
+    # order number or note; kept as text so the entry outlives the order
+    reference = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='sales_move_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.product_id} {self.available_change:+d}/{self.reserved_change:+d}"
+
+
+class DealerDailySales(models.Model):
+    """
+    Reporting rollup per dealer and local day, maintained as orders are
+    confirmed, delivered and cancelled (see sales.reports). Confirmations
+    count on the day they were confirmed, deliveries and their lead time
+    (confirmed_at to delivered_at) on the day they were delivered.
+    """
+    day = models.DateField()
+    dealer = models.ForeignKey(Dealer, on_delete=models.CASCADE, related_name='daily_sales')
+    order_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    delivered_count = models.IntegerField(default=0)
+    lead_time_seconds = models.BigIntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dealer', 'day'], name='sales_dealer_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='sales_dealer_daily_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.dealer_id} {self.revenue}"
+
+
+class ProductDailySales(models.Model):
+    """
+    Reporting rollup per product and local day; same rules as
+    DealerDailySales, counting the orders that contain the product.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    order_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    delivered_count = models.IntegerField(default=0)
+    lead_time_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='sales_product_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='sales_product_daily_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.revenue}"
+
+
+class Job(TimeStampedModel):
+    """
+    Queued background work (see sales.jobs), run by `manage.py run_workers`.
+    `kind` names the handler and `payload` holds its JSON arguments.
+    """
+    STATUS_QUEUED = 'QUEUED'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_SUCCEEDED = 'SUCCEEDED'
+    STATUS_FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the claim query: next due job among the queued ones
+            models.Index(fields=['status', 'run_after', 'id'], name='sales_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.kind} {self.status}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Order and stock change events, written in the same transaction as the
+    change itself (see sales.outbox). The auto-increment id is the cursor
+    of the /api/events/ feed.
+    """
+    TOPIC_ORDER = 'order'
+    TOPIC_STOCK = 'stock'
+
+    TOPIC_CHOICES = [
+        (TOPIC_ORDER, 'Order'),
+        (TOPIC_STOCK, 'Stock'),
+    ]
+
+    topic = models.CharField(max_length=16, choices=TOPIC_CHOICES)
+    kind = models.CharField(max_length=32)
+    # order id or product id, depending on the topic
+    key = models.BigIntegerField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic', 'id'], name='sales_outbox_topic_idx'),
+            models.Index(fields=['created_at'], name='sales_outbox_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.pk} {self.kind} {self.key}"
+
+
+class Tombstone(models.Model):
+    """
+    Records the deletion of a product, dealer or inventory row so delta
+    sync clients (see sales.sync) learn to drop it. Pruned after the
+    retention period, past which clients must resynchronise in full.
+    """
+    MODEL_PRODUCT = 'product'
+    MODEL_DEALER = 'dealer'
+    MODEL_INVENTORY = 'inventory'
+
+    MODEL_CHOICES = [
+        (MODEL_PRODUCT, 'Product'),
+        (MODEL_DEALER, 'Dealer'),
+        (MODEL_INVENTORY, 'Inventory'),
+    ]
+
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at'], name='sales_tombstone_idx'),
+        ]
+
     def __str__(self):
-        return f"Adj {self.product.sku} {self.change} by {self.changed_by}"
\ No newline at end of file
+        return f"{self.model} {self.object_id}"
@@ -0,0 +1,130 @@
+"""
+Transactional outbox: order status changes and stock snapshot changes are
+written to sales_outboxevent inside the transaction that makes them, so an
+event exists exactly when its change committed. Consumers read the table
+through /api/events/ (long-poll) or /api/events/stream/ (Server-Sent
+Events) with the last id they saw as cursor.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Inventory, OutboxEvent
+
+FEED_LIMIT = 500
+MAX_FEED_LIMIT = 1000
+EVENT_BATCH_SIZE = 500
+# arbitrary key of the PostgreSQL advisory lock that orders event commits
+OUTBOX_LOCK_KEY = 4_711_023
+
+
+def lock_writers():
+    """
+    Takes the outbox writer lock: call it as the first statement of every
+    transaction that may publish. PostgreSQL hands out ids before commit,
+    so without it a transaction holding id 10 could commit after one
+    holding id 11 and a reader at since=11 would never see it; the lock is
+    held until commit, making event writers commit in id order. Taken
+    first, it is never awaited while holding a row lock, so it cannot
+    close a deadlock cycle with inventory or rollup rows. The cost is that
+    stock and status writes commit one at a time on PostgreSQL whatever
+    the stock mode. Re-taking it in the same transaction does not wait.
+    SQLite already has a single writer, so it is a no-op there.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [OUTBOX_LOCK_KEY])
+
+
+def publish(events):
+    """
+    Stores unsaved OutboxEvent rows. Call inside the transaction of the
+    change they describe, which must have started with lock_writers().
+    """
+    if not events:
+        return
+    with transaction.atomic():
+        lock_writers()
+        OutboxEvent.objects.bulk_create(events, batch_size=EVENT_BATCH_SIZE)
+
+
+def order_changed(kind, orders):
+    """
+    One `kind` event (order.confirmed, order.delivered, order.cancelled,
+    order.deleted) per order, carrying its state after the change.
+    """
+    publish([
+        OutboxEvent(topic=OutboxEvent.TOPIC_ORDER, kind=kind, key=order.pk, payload={
+            'id': order.pk,
+            'order_number': order.order_number,
+            'dealer': order.dealer_id,
+            'status': order.status,
+            'total_amount': f'{order.total_amount:.2f}',
+        })
+        for order in orders
+    ])
+
+
+def stock_changed(product_ids):
+    """
+    A stock.changed event per product with its snapshot as it now stands
+    in this transaction, read in batches of EVENT_BATCH_SIZE.
+    """
+    product_ids = sorted(set(product_ids))
+    events = []
+    for start in range(0, len(product_ids), EVENT_BATCH_SIZE):
+        rows = (
+            Inventory.objects.filter(product_id__in=product_ids[start:start + EVENT_BATCH_SIZE])
+            .order_by('product_id')
+            .values_list('product_id', 'product__sku', 'quantity', 'reserved')
+        )
+        events += [
+            OutboxEvent(topic=OutboxEvent.TOPIC_STOCK, kind='stock.changed', key=pid, payload={
+                'product': pid, 'sku': sku, 'available': quantity, 'reserved': reserved, 'on_hand': quantity + reserved,
+            })
+            for pid, sku, quantity, reserved in rows
+        ]
+    publish(events)
+
+
+def parse_cursor(value):
+    """
+    Reads a feed cursor: an event id, or 'latest' to start from now.
+    Raises ValueError on anything else.
+    """
+    if value in (None, ''):
+        return 0
+    if value == 'latest':
+        return OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    cursor = int(value)
+    if cursor < 0:
+        raise ValueError('since must not be negative')
+    return cursor
+
+
+def parse_topics(value):
+    topics = [topic for topic in (value or '').split(',') if topic]
+    valid = {code for code, _label in OutboxEvent.TOPIC_CHOICES}
+    if not set(topics) <= valid:
+        raise ValueError(f"topic must be one of: {', '.join(sorted(valid))}")
+    return topics
+
+
+def events_after(since, topics=None, limit=FEED_LIMIT):
+    """
+    Events with an id above `since`, oldest first: a primary key range scan.
+    """
+    qs = OutboxEvent.objects.filter(id__gt=since).order_by('id')
+    if topics:
+        qs = qs.filter(topic__in=topics)
+    return qs.values('id', 'topic', 'kind', 'key', 'payload', 'created_at')[:limit]
+
+
+def prune(days):
+    """
+    Deletes events older than `days` days; consumers further behind than
+    that must resynchronise from the list endpoints.
+    """
+    deleted, _ = OutboxEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
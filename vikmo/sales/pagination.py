@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SalesCursorPagination(CursorPagination):
+    """
+    Keyset pagination: each page is a range scan from the cursor position,
+    so latency and memory stay flat however deep the client pages.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('id',)
+
+
+class OrderCursorPagination(SalesCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class ProductCursorPagination(SalesCursorPagination):
+    ordering = ('name', 'sku')
+
+
+class DealerCursorPagination(SalesCursorPagination):
+    ordering = ('name', 'code')
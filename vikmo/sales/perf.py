@@ -0,0 +1,222 @@
+import contextvars
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+# most recent request records, newest last
+_buffer = deque(maxlen=getattr(settings, 'SALES_PERF_BUFFER_SIZE', 1000))
+_buffer_lock = threading.Lock()
+
+# the timings of the request being handled, set only while the middleware runs
+_current = contextvars.ContextVar('sales_perf_request', default=None)
+
+
+def signature(sql):
+    # parameter lists of any length count as the same statement
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts and times every statement of one
+    request and remembers how often each statement shape ran.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.signatures[signature(sql)] += 1
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.signatures.most_common() if count > 1]
+
+
+class RequestTimings:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.render = 0.0
+        self.serialize = 0.0
+        self.depth = 0
+
+
+@contextmanager
+def serializing():
+    """
+    Counts the block as serialization time of the current request, less the
+    SQL it ran (lazy relations), which is already counted as db. Nested
+    blocks count once. Does nothing outside an instrumented request.
+    """
+    timings = _current.get()
+    if timings is None or timings.depth:
+        if timings is not None:
+            timings.depth += 1
+        try:
+            yield
+        finally:
+            if timings is not None:
+                timings.depth -= 1
+        return
+    timings.depth = 1
+    db_before = timings.recorder.duration
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (timings.recorder.duration - db_before)
+        timings.serialize += max(elapsed, 0)
+        timings.depth = 0
+
+
+def _instrument_serializers():
+    # to_representation runs inside the view, before rendering, when a
+    # serializer's `.data` is first read; time that read once per serializer
+    data = BaseSerializer.data
+    if getattr(data.fget, '_sales_perf', False):
+        return
+
+    def timed_data(self):
+        with serializing():
+            return data.fget(self)
+
+    timed_data._sales_perf = True
+    BaseSerializer.data = property(timed_data)
+
+
+class PerfMiddleware:
+    """
+    Opt-in request instrumentation (settings.SALES_PERF_ENABLED). Records
+    wall time, SQL count and time, repeated (N+1) statements, serializer
+    time (to_representation, inside the view) and response render time
+    (JSON encoding, after the view), adds them as a Server-Timing header and keeps the last
+    SALES_PERF_BUFFER_SIZE records for the /api/_perf/ report. When
+    disabled Django drops the middleware at startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SALES_PERF_ENABLED', False):
+            raise MiddlewareNotUsed
+        _instrument_serializers()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        timings = request._perf_timings = RequestTimings(recorder)
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with _wrap_all_connections(recorder):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        render, serialize = timings.render, timings.serialize
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': _endpoint(request),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'db_ms': round(recorder.duration * 1000, 3),
+            'queries': recorder.count,
+            'serialize_ms': round(serialize * 1000, 3),
+            'render_ms': round(render * 1000, 3),
+            'duplicates': recorder.duplicates()[:10],
+        }
+        with _buffer_lock:
+            _buffer.append(record)
+        app = max(total - recorder.duration - serialize - render, 0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"',
+            f'serialize;dur={serialize * 1000:.2f}',
+            f'render;dur={render * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        started = time.perf_counter()
+
+        def finished(rendered):
+            request._perf_timings.render += time.perf_counter() - started
+
+        response.add_post_render_callback(finished)
+        return response
+
+
+class _wrap_all_connections:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.wrappers = []
+
+    def __enter__(self):
+        for alias in connections:
+            wrapper = connections[alias].execute_wrapper(self.recorder)
+            wrapper.__enter__()
+            self.wrappers.append(wrapper)
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self.wrappers):
+            wrapper.__exit__(*exc_info)
+
+
+def _endpoint(request):
+    # group by URL name (e.g. "order-confirm") rather than the concrete path
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.view_name:
+        return f'{request.method} {match.view_name}'
+    return f'{request.method} {request.path}'
+
+
+def records():
+    with _buffer_lock:
+        return list(_buffer)
+
+
+def clear():
+    with _buffer_lock:
+        _buffer.clear()
+
+
+def report(limit=10):
+    """
+    Summarises the ring buffer: the slowest endpoints by worst and average
+    wall time, and the statements repeated most within a single request.
+    """
+    endpoints = {}
+    offenders = {}
+    for record in records():
+        stats = endpoints.setdefault(record['endpoint'], {'endpoint': record['endpoint'], 'requests': 0,
+                                                          'total_ms': 0.0, 'max_ms': 0.0, 'max_queries': 0})
+        stats['requests'] += 1
+        stats['total_ms'] += record['total_ms']
+        stats['max_ms'] = max(stats['max_ms'], record['total_ms'])
+        stats['max_queries'] = max(stats['max_queries'], record['queries'])
+        for sql, count in record['duplicates']:
+            key = (record['endpoint'], sql)
+            if count > offenders.get(key, {}).get('repeats', 0):
+                offenders[key] = {'endpoint': record['endpoint'], 'sql': sql, 'repeats': count}
+    for stats in endpoints.values():
+        stats['avg_ms'] = round(stats.pop('total_ms') / stats['requests'], 3)
+    slowest = sorted(endpoints.values(), key=lambda s: s['max_ms'], reverse=True)[:limit]
+    worst = sorted(offenders.values(), key=lambda o: o['repeats'], reverse=True)[:limit]
+    return {'slowest_endpoints': slowest, 'n_plus_one': worst}
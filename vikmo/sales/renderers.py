@@ -0,0 +1,58 @@
+import math
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: without it every response takes the stdlib path
+    orjson = None
+
+# orjson writes floats below 1e-4 or from 1e16 up differently from the stdlib
+# (1e16 vs 1e+16, 0.00001 vs 1e-05); output containing an exponent or
+# '0.0000' is rendered again by the stdlib. A match inside a string only
+# costs speed. The pattern starts with a literal so re can skip ahead fast.
+_EXPONENT = re.compile(rb'e(?<=[0-9]e)')
+
+
+def _has_non_finite(data):
+    """
+    True when data holds a NaN or infinite float, which orjson writes as
+    null and the stdlib refuses to encode.
+    """
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed, producing
+    the same bytes as the stdlib encoder: compact separators, UTF-8 text
+    with \\u2028/\\u2029 escaped, and every type orjson would write its own
+    way (datetimes, Decimals, lazy strings...) handed to DRF's encoder.
+    Pretty printing, non-default JSON settings, integers beyond 64 bits
+    and the rare float formats above go through the stdlib, as do NaN
+    and infinite floats so that they raise just as they would there.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'0.0000' in ret or _EXPONENT.search(ret) or (b'null' in ret and _has_non_finite(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
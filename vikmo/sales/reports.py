@@ -0,0 +1,293 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, DecimalField, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import DealerDailySales, Order, OrderItem, ProductDailySales
+
+ROLLUP_BATCH_SIZE = 500
+
+# counter fields shared by both rollups and the SQL type of their deltas
+COUNTERS = {
+    'order_count': IntegerField(),
+    'quantity': IntegerField(),
+    'revenue': DecimalField(max_digits=14, decimal_places=2),
+    'delivered_count': IntegerField(),
+    'lead_time_seconds': BigIntegerField(),
+    'cancelled_count': IntegerField(),
+}
+
+
+def _day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _bump(model, key, day, deltas):
+    """
+    Adds `deltas` ({key_id: {counter: change}}) to the `day` rows of a
+    rollup: missing rows are created empty, then every counter is moved
+    with one CASE UPDATE per ROLLUP_BATCH_SIZE keys.
+    """
+    deltas = {key_id: changes for key_id, changes in deltas.items() if any(changes.values())}
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(day=day, **{f'{key}_id': key_id}) for key_id in deltas],
+        ignore_conflicts=True,
+        batch_size=ROLLUP_BATCH_SIZE,
+    )
+    items = list(deltas.items())
+    for start in range(0, len(items), ROLLUP_BATCH_SIZE):
+        batch = dict(items[start:start + ROLLUP_BATCH_SIZE])
+        fields = {name for changes in batch.values() for name in changes}
+        updates = {
+            name: F(name) + Case(
+                *[When(**{f'{key}_id': key_id}, then=Value(changes.get(name, 0))) for key_id, changes in batch.items()],
+                default=Value(0),
+                output_field=COUNTERS[name],
+            )
+            for name in fields
+        }
+        model.objects.filter(day=day, **{f'{key}_id__in': batch.keys()}).update(**updates)
+
+
+def _add(totals, day, key_id, changes):
+    row = totals.setdefault((day, key_id), {})
+    for name, change in changes.items():
+        row[name] = row.get(name, 0) + change
+
+
+def _products_by_order(order_ids):
+    # per-order, per-product quantity and revenue in a single aggregate
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids, product_id__isnull=False)
+        .values('order_id', 'product_id').annotate(quantity=Sum('quantity'), revenue=Sum('line_total'))
+        .values_list('order_id', 'product_id', 'quantity', 'revenue')
+    )
+    totals = {}
+    for order_id, pid, quantity, revenue in rows:
+        totals.setdefault(order_id, {})[pid] = (quantity, revenue)
+    return totals
+
+
+def _bump_days(model, key, totals):
+    # totals is {(day, key_id): changes}; one _bump per day
+    by_day = {}
+    for (day, key_id), changes in totals.items():
+        by_day.setdefault(day, {})[key_id] = changes
+    for day, deltas in sorted(by_day.items()):
+        _bump(model, key, day, deltas)
+
+
+def record_confirmations(orders, sign=1):
+    """
+    Counts confirmed orders on their confirmation day. Call inside the
+    transaction that confirms them; sign=-1 takes them back out.
+    """
+    products = _products_by_order([order.pk for order in orders])
+    dealer_totals = {}
+    product_totals = {}
+    for order in orders:
+        day = _day(order.confirmed_at)
+        lines = products.get(order.pk, {})
+        _add(dealer_totals, day, order.dealer_id, {
+            'order_count': sign,
+            'quantity': sign * sum(q for q, _r in lines.values()),
+            'revenue': sign * order.total_amount,
+        })
+        for pid, (quantity, revenue) in lines.items():
+            _add(product_totals, day, pid, {'order_count': sign, 'quantity': sign * quantity, 'revenue': sign * revenue})
+    _bump_days(DealerDailySales, 'dealer', dealer_totals)
+    _bump_days(ProductDailySales, 'product', product_totals)
+
+
+def record_confirmation(order, sign=1):
+    record_confirmations([order], sign)
+
+
+def record_deliveries(orders, sign=1):
+    """
+    Counts deliveries and their lead times on the delivery day.
+    """
+    products = _products_by_order([order.pk for order in orders])
+    dealer_totals = {}
+    product_totals = {}
+    for order in orders:
+        day = _day(order.delivered_at)
+        lead = int((order.delivered_at - order.confirmed_at).total_seconds()) if order.confirmed_at else 0
+        changes = {'delivered_count': sign, 'lead_time_seconds': sign * lead}
+        _add(dealer_totals, day, order.dealer_id, changes)
+        for pid in products.get(order.pk, {}):
+            _add(product_totals, day, pid, changes)
+    _bump_days(DealerDailySales, 'dealer', dealer_totals)
+    _bump_days(ProductDailySales, 'product', product_totals)
+
+
+def record_delivery(order, sign=1):
+    record_deliveries([order], sign)
+
+
+def record_cancellations(orders, sign=1):
+    totals = {}
+    for order in orders:
+        _add(totals, _day(order.canceled_at), order.dealer_id, {'cancelled_count': sign})
+    _bump_days(DealerDailySales, 'dealer', totals)
+
+
+def record_cancellation(order, sign=1):
+    record_cancellations([order], sign)
+
+
+def forget_order(order):
+    """
+    Removes everything `order` contributed, e.g. before it is deleted, so
+    the rollups always match a backfill of the orders that still exist.
+    """
+    if order.status in (Order.STATUS_CONFIRMED, Order.STATUS_DELIVERED) and order.confirmed_at:
+        record_confirmation(order, sign=-1)
+    if order.status == Order.STATUS_DELIVERED and order.delivered_at:
+        record_delivery(order, sign=-1)
+    if order.status == Order.STATUS_CANCELLED and order.canceled_at:
+        record_cancellation(order, sign=-1)
+
+
+def backfill(batch_size=2000, progress=None):
+    """
+    Rebuilds both rollups from the order history. Orders are read in
+    keyset batches of `batch_size` with their lines aggregated per batch,
+    totals are accumulated in memory and the tables are replaced in one
+    transaction. Returns the number of orders read.
+    """
+    dealer_totals = {}
+    product_totals = {}
+    last_id = 0
+    processed = 0
+    while True:
+        orders = list(
+            Order.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'dealer_id', 'status', 'total_amount', 'confirmed_at', 'delivered_at', 'canceled_at')[:batch_size]
+        )
+        if not orders:
+            break
+        last_id = orders[-1][0]
+        lines = {}
+        rows = (
+            OrderItem.objects.filter(order_id__in=[o[0] for o in orders], product_id__isnull=False)
+            .values('order_id', 'product_id').annotate(quantity=Sum('quantity'), revenue=Sum('line_total'))
+            .values_list('order_id', 'product_id', 'quantity', 'revenue')
+        )
+        for order_id, pid, quantity, revenue in rows:
+            lines.setdefault(order_id, []).append((pid, quantity, revenue))
+        for pk, dealer_id, status, total, confirmed_at, delivered_at, canceled_at in orders:
+            products = lines.get(pk, [])
+            if status in (Order.STATUS_CONFIRMED, Order.STATUS_DELIVERED) and confirmed_at:
+                day = _day(confirmed_at)
+                _add(dealer_totals, day, dealer_id, {
+                    'order_count': 1, 'quantity': sum(q for _p, q, _r in products), 'revenue': total,
+                })
+                for pid, quantity, revenue in products:
+                    _add(product_totals, day, pid, {'order_count': 1, 'quantity': quantity, 'revenue': revenue})
+            if status == Order.STATUS_DELIVERED and delivered_at:
+                day = _day(delivered_at)
+                lead = int((delivered_at - confirmed_at).total_seconds()) if confirmed_at else 0
+                changes = {'delivered_count': 1, 'lead_time_seconds': lead}
+                _add(dealer_totals, day, dealer_id, changes)
+                for pid, _q, _r in products:
+                    _add(product_totals, day, pid, changes)
+            if status == Order.STATUS_CANCELLED and canceled_at:
+                _add(dealer_totals, _day(canceled_at), dealer_id, {'cancelled_count': 1})
+        processed += len(orders)
+        if progress:
+            progress(processed)
+    with transaction.atomic():
+        DealerDailySales.objects.all().delete()
+        ProductDailySales.objects.all().delete()
+        DealerDailySales.objects.bulk_create(
+            [DealerDailySales(day=day, dealer_id=key_id, **changes) for (day, key_id), changes in dealer_totals.items()],
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+        ProductDailySales.objects.bulk_create(
+            [ProductDailySales(day=day, product_id=key_id, **changes) for (day, key_id), changes in product_totals.items()],
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+    return processed
+
+
+def date_range(params, default_days=30):
+    """
+    Reads `from`/`to` (inclusive ISO dates) from query params, defaulting
+    to the last `default_days` days. Raises ValueError on bad input.
+    """
+    today = timezone.localdate()
+    try:
+        end = datetime.date.fromisoformat(params['to']) if params.get('to') else today
+        start = datetime.date.fromisoformat(params['from']) if params.get('from') else end - datetime.timedelta(days=default_days - 1)
+    except ValueError:
+        raise ValueError('from and to must be dates (YYYY-MM-DD)')
+    if start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+
+def average_lead_hours(seconds, deliveries):
+    if not deliveries:
+        return None
+    return round(seconds / deliveries / 3600, 2)
+
+
+def dealer_daily(start, end, dealer_id=None):
+    qs = DealerDailySales.objects.filter(day__range=(start, end)).order_by('day', 'dealer_id')
+    if dealer_id is not None:
+        qs = qs.filter(dealer_id=dealer_id)
+    return [
+        {
+            'day': row.day,
+            'dealer': row.dealer_id,
+            'orders': row.order_count,
+            'quantity': row.quantity,
+            'revenue': row.revenue,
+            'delivered': row.delivered_count,
+            'avg_lead_time_hours': average_lead_hours(row.lead_time_seconds, row.delivered_count),
+            'cancelled': row.cancelled_count,
+        }
+        for row in qs
+    ]
+
+
+def top_products(start, end, by='revenue', limit=10):
+    rows = (
+        ProductDailySales.objects.filter(day__range=(start, end))
+        .values('product_id', 'product__sku', 'product__name')
+        .annotate(
+            total_quantity=Sum('quantity'), total_revenue=Sum('revenue'), orders=Sum('order_count'),
+            delivered=Sum('delivered_count'), lead_time=Sum('lead_time_seconds'),
+        )
+        .order_by(f'-total_{by}', 'product_id')[:limit]
+    )
+    return [
+        {
+            'product': row['product_id'],
+            'sku': row['product__sku'],
+            'name': row['product__name'],
+            'orders': row['orders'],
+            'quantity': row['total_quantity'],
+            'revenue': row['total_revenue'],
+            'avg_lead_time_hours': average_lead_hours(row['lead_time'], row['delivered']),
+        }
+        for row in rows
+    ]
+
+
+def lead_time(start, end, dealer_id=None):
+    qs = DealerDailySales.objects.filter(day__range=(start, end), delivered_count__gt=0)
+    if dealer_id is not None:
+        qs = qs.filter(dealer_id=dealer_id)
+    rows = list(qs.values('day').annotate(delivered=Sum('delivered_count'), seconds=Sum('lead_time_seconds')).order_by('day'))
+    days = [
+        {'day': row['day'], 'delivered': row['delivered'], 'avg_lead_time_hours': average_lead_hours(row['seconds'], row['delivered'])}
+        for row in rows
+    ]
+    delivered = sum(row['delivered'] for row in rows)
+    seconds = sum(row['seconds'] for row in rows)
+    return {'days': days, 'delivered': delivered, 'avg_lead_time_hours': average_lead_hours(seconds, delivered)}
@@ -0,0 +1,316 @@
+import bisect
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+SKU_INDEX_VERSION_KEY = 'sales:sku-index:version'
+# seconds after which a process rebuilds its SKU index even if the version
+# did not move: with a per-process cache other workers' bumps are invisible
+SKU_INDEX_MAX_AGE = 60
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_INDEX = (
+    # external content table: the text lives in sales_product, FTS5 keeps only the index
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sales_product_fts USING fts5("
+    "name, sku, description, content='sales_product', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS sales_product_fts_ai AFTER INSERT ON sales_product BEGIN "
+    "INSERT INTO sales_product_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS sales_product_fts_ad AFTER DELETE ON sales_product BEGIN "
+    "INSERT INTO sales_product_fts(sales_product_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS sales_product_fts_au AFTER UPDATE OF name, sku, description ON sales_product BEGIN "
+    "INSERT INTO sales_product_fts(sales_product_fts, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); "
+    "INSERT INTO sales_product_fts(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description); END",
+)
+SQLITE_OBJECTS = ('sales_product_fts', 'sales_product_fts_ai', 'sales_product_fts_ad', 'sales_product_fts_au')
+
+POSTGRES_INDEX = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS sales_prod_name_trgm_idx ON sales_product USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS sales_prod_sku_trgm_idx ON sales_product USING gin (sku gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS sales_prod_search_tsv_idx ON sales_product "
+    "USING gin (to_tsvector('simple', name || ' ' || sku || ' ' || description))",
+)
+
+
+def install_index(conn=connection):
+    """
+    Creates the backend's full-text index for products if any part of it is
+    missing and returns True when it did. On SQLite that is an FTS5 table
+    kept in sync by triggers (rebuilt from sales_product whenever it is
+    recreated, e.g. after a migration rebuilt the table and dropped the
+    triggers); on PostgreSQL trigram and tsvector GIN indexes.
+    """
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(SQLITE_OBJECTS))
+            cursor.execute(f'SELECT COUNT(*) FROM sqlite_master WHERE name IN ({placeholders})', SQLITE_OBJECTS)
+            if cursor.fetchone()[0] == len(SQLITE_OBJECTS):
+                return False
+            for statement in SQLITE_INDEX:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO sales_product_fts(sales_product_fts) VALUES ('rebuild')")
+            return True
+        if conn.vendor == 'postgresql':
+            for statement in POSTGRES_INDEX:
+                cursor.execute(statement)
+            return True
+    return False
+
+
+def drop_index(conn=connection):
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            for name in SQLITE_OBJECTS[1:]:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute('DROP TABLE IF EXISTS sales_product_fts')
+        elif conn.vendor == 'postgresql':
+            for name in ('sales_prod_name_trgm_idx', 'sales_prod_sku_trgm_idx', 'sales_prod_search_tsv_idx'):
+                cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def _fts_query(text):
+    # every word must match, each as a prefix: 'brak pa' -> "brak"* "pa"*
+    return ' '.join(f'"{token}"*' for token in _TOKEN.findall(text))
+
+
+def _match_sql(text, active_only):
+    """
+    (sql, params) selecting the ids of the products matching `text` in the
+    backend's index, most relevant first. None when there is nothing to
+    match; raises NotImplementedError on backends without an index.
+    """
+    active = ' AND p.active' if active_only else ''
+    if connection.vendor == 'sqlite':
+        query = _fts_query(text)
+        if not query:
+            return None
+        # bm25 weights: name counts most, then sku, then description (lower is better)
+        sql = (
+            'SELECT p.id FROM sales_product_fts JOIN sales_product p ON p.id = sales_product_fts.rowid '
+            f'WHERE sales_product_fts MATCH %s{active} '
+            'ORDER BY bm25(sales_product_fts, 10.0, 5.0, 1.0), p.id'
+        )
+        return sql, [query]
+    if connection.vendor == 'postgresql':
+        sql = (
+            'SELECT p.id FROM sales_product p '
+            "WHERE (p.name %% %s OR p.sku ILIKE %s OR to_tsvector('simple', p.name || ' ' || p.sku || ' ' || p.description) "
+            f"@@ plainto_tsquery('simple', %s)){active} "
+            'ORDER BY GREATEST(similarity(p.name, %s), similarity(p.sku, %s)) DESC, p.id'
+        )
+        prefix = text.replace('\\', '\\\\').replace('%', r'\%').replace('_', r'\_') + '%'
+        return sql, [text, prefix, text, text, text]
+    raise NotImplementedError
+
+
+def _icontains(text):
+    return Product.objects.filter(name__icontains=text) | Product.objects.filter(sku__icontains=text)
+
+
+def _ranked_ids(text, limit, active_only):
+    """
+    Ids of the best matches for `text`, most relevant first, from the
+    backend's index (plain icontains on other backends).
+    """
+    try:
+        match = _match_sql(text, active_only)
+    except NotImplementedError:
+        qs = _icontains(text)
+        if active_only:
+            qs = qs.filter(active=True)
+        return list(qs.order_by('name', 'id').values_list('id', flat=True)[:limit])
+    if match is None:
+        return []
+    sql, params = match
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} LIMIT %s', params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class SkuPrefixIndex:
+    """
+    In-process sorted list of (upper-cased SKU, product id) answering exact
+    and prefix SKU lookups with a binary search. It is built on first use,
+    patched in place when this process saves or deletes a product (after
+    commit), and rebuilt when another process bumped the shared version,
+    which needs a cache shared between processes (REDIS_URL). Whatever the
+    cache, a build older than SKU_INDEX_MAX_AGE seconds is rebuilt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ids = []
+        self._version = None
+        self._built_at = 0
+
+    def _current_version(self):
+        version = cache.get(SKU_INDEX_VERSION_KEY)
+        if version is None:
+            # start from the clock so a lost key never matches an old build
+            cache.add(SKU_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(SKU_INDEX_VERSION_KEY)
+        return version
+
+    def reset(self):
+        with self._lock:
+            self._keys = None
+
+    def _load(self):
+        version = self._current_version()
+        fresh = time.monotonic() - self._built_at < SKU_INDEX_MAX_AGE
+        if self._keys is not None and version == self._version and fresh:
+            return
+        rows = sorted(
+            (sku.upper(), pk) for pk, sku in Product.objects.values_list('id', 'sku').iterator(chunk_size=10000)
+        )
+        self._keys = [sku for sku, _pk in rows]
+        self._ids = [pk for _sku, pk in rows]
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def lookup(self, prefix, limit=SEARCH_LIMIT, offset=0):
+        """
+        Product ids whose SKU starts with `prefix` (case-insensitive), the
+        exact match first, then in SKU order, skipping the first `offset`.
+        """
+        prefix = prefix.strip().upper()
+        if not prefix:
+            return []
+        with self._lock:
+            self._load()
+            start = bisect.bisect_left(self._keys, prefix) + offset
+            ids = []
+            for position in range(start, min(start + limit, len(self._keys))):
+                if not self._keys[position].startswith(prefix):
+                    break
+                ids.append(self._ids[position])
+            return ids
+
+    def changed(self, old_sku=None, new_sku=None, pk=None):
+        """
+        Records that `pk` moved from `old_sku` to `new_sku` (either may be
+        None). Without arguments the whole index is marked stale.
+        """
+        with self._lock:
+            try:
+                version = cache.incr(SKU_INDEX_VERSION_KEY)
+            except ValueError:
+                cache.add(SKU_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+                self._keys = None
+                return
+            # patch locally only if nothing else changed since our build
+            if self._keys is None or self._version != version - 1 or (old_sku is None and new_sku is None):
+                self._keys = None
+                return
+            if old_sku is not None:
+                position = bisect.bisect_left(self._keys, old_sku.upper())
+                if position < len(self._keys) and self._keys[position] == old_sku.upper() and self._ids[position] == pk:
+                    del self._keys[position]
+                    del self._ids[position]
+            if new_sku is not None:
+                position = bisect.bisect_left(self._keys, new_sku.upper())
+                self._keys.insert(position, new_sku.upper())
+                self._ids.insert(position, pk)
+            self._version = version
+
+
+sku_index = SkuPrefixIndex()
+
+
+def product_saved(product, old_sku=None, created=False):
+    if created or old_sku != product.sku:
+        old, new, pk = (None if created else old_sku), product.sku, product.pk
+        transaction.on_commit(lambda: sku_index.changed(old, new, pk))
+
+
+def product_deleted(product):
+    sku, pk = product.sku, product.pk
+    transaction.on_commit(lambda: sku_index.changed(sku, None, pk))
+
+
+def invalidate_sku_index():
+    # for bulk writes that bypass the model signals
+    transaction.on_commit(lambda: sku_index.changed())
+
+
+def _sku_matches(text, limit, active_only):
+    # the index holds every product, so inactive ones are dropped batch by
+    # batch before the limit applies
+    if not active_only:
+        return sku_index.lookup(text, limit)
+    ids = []
+    offset = 0
+    while len(ids) < limit:
+        batch = sku_index.lookup(text, limit, offset)
+        active = set(Product.objects.filter(id__in=batch, active=True).values_list('id', flat=True))
+        ids += [pk for pk in batch if pk in active]
+        if len(batch) < limit:
+            break
+        offset += len(batch)
+    return ids[:limit]
+
+
+def search(text, limit=SEARCH_LIMIT, active_only=False):
+    """
+    Typeahead search: SKU prefix matches (exact SKU first) followed by the
+    full-text matches on name, SKU and description in relevance order,
+    without duplicates, at most `limit` results. Returns product dicts.
+    """
+    text = (text or '').strip()
+    if not text:
+        return []
+    ids = _sku_matches(text, limit, active_only) if not any(c.isspace() for c in text) else []
+    if len(ids) < limit:
+        ids += [pk for pk in _ranked_ids(text, limit, active_only) if pk not in ids]
+    ids = ids[:limit]
+    rows = Product.objects.filter(id__in=ids)
+    if active_only:
+        rows = rows.filter(active=True)
+    by_id = {
+        row['id']: row
+        for row in rows.values('id', 'name', 'sku', 'price', 'active', 'inventory__quantity')
+    }
+    return [
+        {
+            'id': pk,
+            'name': by_id[pk]['name'],
+            'sku': by_id[pk]['sku'],
+            'price': by_id[pk]['price'],
+            'active': by_id[pk]['active'],
+            'stock': by_id[pk]['inventory__quantity'],
+        }
+        for pk in ids if pk in by_id
+    ]
+
+
+def filter_matches(queryset, text):
+    """
+    Narrows a Product queryset to every product `search` could return for
+    `text`, without its limit: SKU prefix matches and everything the
+    full-text index matches (as a subquery, so no id list is built).
+    """
+    text = (text or '').strip()
+    if not text:
+        return queryset
+    condition = Q(sku__istartswith=text)
+    try:
+        match = _match_sql(text, active_only=False)
+    except NotImplementedError:
+        condition |= Q(pk__in=_icontains(text).values('id'))
+    else:
+        if match is not None:
+            condition |= Q(pk__in=RawSQL(*match))
+    return queryset.filter(condition)
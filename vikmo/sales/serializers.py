@@ -1,10 +1,39 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from . import models
+from . import models, stock, transitions
 from django.db import transaction
-from django.utils import timezone
+from django.db.models import Q
+
+
+def requested_fields(request):
+    """
+    Returns the set of field names asked for with `?fields=a,b` on a read
+    request, or None when the client wants every field.
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
 
+class SparseFieldsetMixin:
+    """
+    Drops every field not listed in `?fields=` so list screens can skip
+    expensive columns such as nested order items.
+    """
 
-class ProductSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     stock = serializers.IntegerField(source='inventory.quantity', read_only=True)
 
     class Meta:
@@ -13,7 +42,7 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at')
 
 
-class DealerSerializer(serializers.ModelSerializer):
+class DealerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Dealer
         fields = ['id', 'name', 'code', 'contact_name', 'email', 'phone', 'address', 'created_at', 'updated_at']
@@ -22,6 +51,8 @@ class DealerSerializer(serializers.ModelSerializer):
 
 class OrderItemSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(required=False)
+    # resolved in bulk by OrderSerializer.validate_items instead of one lookup per line
+    product = serializers.IntegerField(source='product_id', allow_null=True)
 
     class Meta:
         model = models.OrderItem
@@ -29,14 +60,67 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('product_sku', 'product_name', 'unit_price', 'line_total')
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderLineSerializer(serializers.Serializer):
+    # payload of the line-level edit endpoints; `product` is only used when adding
+    product = serializers.PrimaryKeyRelatedField(queryset=models.Product.objects.all(), required=False)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=transitions.MAX_BULK_ORDERS,
+    )
+    mode = serializers.ChoiceField(choices=transitions.MODES, default=transitions.MODE_PARTIAL)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    # the stored error is a traceback; the API shows only its final line
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Job
+        fields = ['id', 'kind', 'status', 'attempts', 'max_attempts', 'payload', 'result', 'error',
+                  'run_after', 'created_at', 'updated_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_error(self, job):
+        lines = job.error.strip().splitlines()
+        return lines[-1] if lines else ''
+
+
+def build_order_items(order, items_data):
+    """
+    Builds unsaved OrderItem rows for `order` from validated item data,
+    snapshotting product sku, name and price. Returns (items, total).
+    """
+    items = []
+    total = Decimal('0.00')
+    for item in items_data:
+        product = item['product']
+        quantity = item['quantity']
+        unit_price = product.price
+        line_total = unit_price * quantity
+        items.append(models.OrderItem(
+            order=order,
+            product=product,
+            product_sku=product.sku,
+            product_name=product.name,
+            quantity=quantity,
+            unit_price=unit_price,
+            line_total=line_total,
+        ))
+        total += line_total
+    return items, total
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     dealer = serializers.PrimaryKeyRelatedField(queryset=models.Dealer.objects.all())
 
     class Meta:
         model = models.Order
-        fields = ['id', 'order_number', 'dealer', 'status', 'total_amount', 'items', 'created_at', 'updated_at']
-        read_only_fields = ('order_number', 'status', 'total_amount', 'created_at', 'updated_at')
+        fields = ['id', 'order_number', 'dealer', 'status', 'total_amount', 'item_count', 'items', 'created_at', 'updated_at']
+        read_only_fields = ('order_number', 'status', 'total_amount', 'item_count', 'created_at', 'updated_at')
 
     def validate(self, data):
         # if updating, ensure order is draft
@@ -45,29 +129,33 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Only Draft orders can be edited')
         return data
 
+    def validate_items(self, items):
+        # fetch every referenced product in one query
+        product_ids = {item.get('product_id') for item in items}
+        products = models.Product.objects.in_bulk([pk for pk in product_ids if pk is not None])
+        errors = []
+        for item in items:
+            pk = item.pop('product_id', None)
+            if pk is None:
+                errors.append({'product': ['This field may not be null.']})
+            elif pk not in products:
+                errors.append({'product': [f'Invalid pk "{pk}" - object does not exist.']})
+            else:
+                item['product'] = products[pk]
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        order = models.Order.objects.create(**validated_data)
-        # generate order_number using pk and date
-        order.order_number = f"ORD-{timezone.now().strftime('%Y%m%d')}-{order.pk:04d}"
-        order.save()
-        total = 0
-        for item in items_data:
-            product = item.get('product')
-            quantity = item.get('quantity')
-            unit_price = product.price
-            oi = models.OrderItem.objects.create(
-                order=order,
-                product=product,
-                product_sku=product.sku,
-                product_name=product.name,
-                quantity=quantity,
-                unit_price=unit_price,
-                line_total=unit_price * quantity,
-            )
-            total += oi.line_total
-        order.total_amount = total
-        order.save()
+        order = models.Order(**validated_data)
+        items, order.total_amount = build_order_items(order, items_data)
+        order.item_count = len(items)
+        with transaction.atomic():
+            # order_number is allocated by Order.save before the INSERT
+            order.save()
+            models.OrderItem.objects.bulk_create(items)
         return order
 
     def update(self, instance, validated_data):
@@ -75,26 +163,13 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Only Draft orders can be edited')
         items_data = validated_data.pop('items', None)
         # update fields (dealer can't be changed for simplicity)
-        instance.save()
-        if items_data is not None:
-            # replace items
-            instance.items.all().delete()
-            total = 0
-            for item in items_data:
-                product = item.get('product')
-                quantity = item.get('quantity')
-                unit_price = product.price
-                oi = models.OrderItem.objects.create(
-                    order=instance,
-                    product=product,
-                    product_sku=product.sku,
-                    product_name=product.name,
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    line_total=unit_price * quantity,
-                )
-                total += oi.line_total
-            instance.total_amount = total
+        with transaction.atomic():
+            if items_data is not None:
+                # replace items
+                items, instance.total_amount = build_order_items(instance, items_data)
+                instance.item_count = len(items)
+                instance.items.all().delete()
+                models.OrderItem.objects.bulk_create(items)
             instance.save()
         return instance
 
@@ -109,10 +184,133 @@ class InventoryAdjustmentSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context['request'].user
-        adj = models.InventoryAdjustment.objects.create(changed_by=user, **validated_data)
-        inv, _ = models.Inventory.objects.get_or_create(product=adj.product)
-        inv.quantity = models.F('quantity') + adj.change
-        inv.save()
-        # refresh
-        inv.refresh_from_db()
-        return adj
\ No newline at end of file
+        product = validated_data['product']
+        adj, = stock.adjust([(product.pk, validated_data['change'], validated_data.get('note', ''))], user=user)
+        return adj
+
+
+def _whole_number(value):
+    # int() would silently truncate 2.5 (or True) instead of rejecting it
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError
+    return int(value)
+
+
+def parse_bulk_adjustments(rows):
+    """
+    Validates bulk adjustment rows ({sku | product_id, change, note}, as
+    parsed from JSON or CSV) and resolves every SKU and product id with one
+    query each. Returns (adjustments, errors) where adjustments are
+    (product_id, change, note) tuples ready for stock.adjust and errors
+    are per-row messages keyed by the row's position.
+    """
+    parsed = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        row_errors = {}
+        sku = str(row.get('sku') or '').strip()
+        product_id = row.get('product_id')
+        if product_id in (None, ''):
+            product_id = None
+        else:
+            try:
+                product_id = _whole_number(product_id)
+            except (TypeError, ValueError):
+                row_errors['product_id'] = ['A valid integer is required.']
+        if not sku and product_id is None and 'product_id' not in row_errors:
+            row_errors['sku'] = ['Either sku or product_id is required.']
+        try:
+            change = _whole_number(row.get('change'))
+        except (TypeError, ValueError):
+            row_errors['change'] = ['A valid integer is required.']
+        note = row.get('note')
+        if note is not None and not isinstance(note, str):
+            row_errors['note'] = ['Not a valid string.']
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+        parsed.append((index, sku, product_id, change, note or ''))
+
+    skus = {sku for _i, sku, pid, _c, _n in parsed if pid is None}
+    ids = {pid for _i, _s, pid, _c, _n in parsed if pid is not None}
+    sku_map = dict(models.Product.objects.filter(sku__in=skus).values_list('sku', 'id')) if skus else {}
+    known_ids = set(models.Product.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+
+    adjustments = []
+    for index, sku, product_id, change, note in parsed:
+        if product_id is None:
+            product_id = sku_map.get(sku)
+            if product_id is None:
+                errors.append({'row': index, 'errors': {'sku': [f'Unknown sku "{sku}".']}})
+                continue
+        elif product_id not in known_ids:
+            errors.append({'row': index, 'errors': {'product_id': [f'Invalid pk "{product_id}" - object does not exist.']}})
+            continue
+        adjustments.append((product_id, change, note))
+    errors.sort(key=lambda e: e['row'])
+    return adjustments, errors
+
+
+def parse_availability_items(rows):
+    """
+    Validates cart rows ({sku | product, quantity}) and resolves them in a
+    single query that also reads the available stock, without locking.
+    Returns (lines, available, errors): (product_id, sku, name, quantity)
+    tuples as used by the stock module, {product_id: quantity} and per-row
+    error messages keyed by the row's position.
+    """
+    parsed = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        row_errors = {}
+        sku = str(row.get('sku') or '').strip()
+        product_id = row.get('product')
+        if product_id in (None, ''):
+            product_id = None
+        else:
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                row_errors['product'] = ['A valid integer is required.']
+        if not sku and product_id is None and 'product' not in row_errors:
+            row_errors['sku'] = ['Either sku or product is required.']
+        try:
+            quantity = int(row.get('quantity'))
+        except (TypeError, ValueError):
+            quantity = None
+        if quantity is None or quantity <= 0:
+            row_errors['quantity'] = ['A positive integer is required.']
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+        parsed.append((index, sku, product_id, quantity))
+
+    skus = {sku for _i, sku, pid, _q in parsed if pid is None}
+    ids = {pid for _i, _s, pid, _q in parsed if pid is not None}
+    products = {}
+    if parsed:
+        rows = models.Product.objects.filter(Q(sku__in=skus) | Q(id__in=ids)).values_list('id', 'sku', 'name', 'inventory__quantity')
+        products = {pk: (pk, sku, name, quantity or 0) for pk, sku, name, quantity in rows}
+    by_sku = {product[1]: product for product in products.values()}
+
+    lines = []
+    available = {}
+    for index, sku, product_id, quantity in parsed:
+        product = products.get(product_id) if product_id is not None else by_sku.get(sku)
+        if product is None:
+            if product_id is None:
+                errors.append({'row': index, 'errors': {'sku': [f'Unknown sku "{sku}".']}})
+            else:
+                errors.append({'row': index, 'errors': {'product': [f'Invalid pk "{product_id}" - object does not exist.']}})
+            continue
+        pk, product_sku, name, on_hand = product
+        lines.append((pk, product_sku, name, quantity))
+        available[pk] = on_hand
+    errors.sort(key=lambda e: e['row'])
+    return lines, available, errors
@@ -1,21 +1,66 @@
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
 from django.dispatch import receiver
-from django.db import transaction
-from django.db.models import F
 
-from .models import Order, Inventory
+from . import cache, outbox, reports, search, stock, sync
+from .models import Dealer, Inventory, Order, Product
 
 
 @receiver(pre_delete, sender=Order)
 def restore_stock_on_order_delete(sender, instance, **kwargs):
     """
-    Restores stock for confirmed orders that are deleted.
+    Releases the reserved stock of confirmed orders that are deleted, takes
+    the order back out of the reporting rollups and publishes the deletion.
     """
+    # first statement of the deletion's transaction
+    outbox.lock_writers()
     if instance.status == Order.STATUS_CONFIRMED:
-        with transaction.atomic():
-            for item in instance.items.select_related('product').all():
-                if item.product is None:
-                    continue
-                inv, _ = Inventory.objects.select_for_update().get_or_create(product=item.product)
-                inv.quantity = F('quantity') + item.quantity
-                inv.save()
+        stock.release(stock.order_lines(instance), reference=instance.order_number or '')
+    reports.forget_order(instance)
+    outbox.order_changed('order.deleted', [instance])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Drops cached product list/detail responses when a product or its stock changes.
+    """
+    cache.invalidate_catalog()
+
+
+@receiver(post_save, sender=Inventory)
+def publish_stock_change(sender, instance, **kwargs):
+    # Inventory.save runs in a transaction, so the event commits with the edit
+    outbox.stock_changed([instance.product_id])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Dealer)
+@receiver(post_delete, sender=Inventory)
+def record_tombstone(sender, instance, **kwargs):
+    # model names double as the Tombstone.model codes: product, dealer, inventory
+    sync.record_deletion(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_sku_index_on_save(sender, instance, created, **kwargs):
+    search.product_saved(instance, getattr(instance, '_loaded_sku', None), created)
+    instance._loaded_sku = instance.sku
+
+
+@receiver(post_delete, sender=Product)
+def update_sku_index_on_delete(sender, instance, **kwargs):
+    search.product_deleted(instance)
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using, **kwargs):
+    """
+    Recreates the full-text index if a migration rebuilt sales_product
+    (SQLite drops a table's triggers along with it).
+    """
+    if sender.name == 'sales':
+        from django.db import connections
+        search.install_index(connections[using])
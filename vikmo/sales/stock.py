@@ -0,0 +1,523 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import outbox, reports
+from .cache import invalidate_catalog
+from .models import Inventory, InventoryAdjustment, Order, OrderItem, StockMovement
+
+# keeps the CASE expression of one UPDATE well under SQLite's parameter limit
+DELTA_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when the locked inventory cannot cover an order's demand.
+    `items` holds one entry per failing product in the API error format.
+    """
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.items = items
+
+    @property
+    def detail(self):
+        # if only one failing item, return a clear detail message
+        if len(self.items) == 1:
+            return self.items[0]['message']
+        return 'Insufficient stock for one or more items'
+
+
+def order_lines(order):
+    """
+    Returns the stock-relevant fields of every line of `order` in one query.
+    """
+    return list(
+        order.items.values_list('product_id', 'product__sku', 'product__name', 'quantity')
+    )
+
+
+def lines_by_order(order_ids):
+    """
+    order_lines for many orders in one query: {order_id: lines}.
+    """
+    rows = OrderItem.objects.filter(order_id__in=order_ids).order_by('order_id', 'id').values_list(
+        'order_id', 'product_id', 'product__sku', 'product__name', 'quantity',
+    )
+    result = {order_id: [] for order_id in order_ids}
+    for order_id, *line in rows:
+        result[order_id].append(tuple(line))
+    return result
+
+
+def lock_inventories(product_ids):
+    """
+    Locks the inventory rows of `product_ids` in one query and returns
+    {product_id: quantity}. Rows are locked in product id order so that
+    concurrent confirms touching the same products cannot deadlock.
+    Products without an inventory row are simply absent from the result.
+    """
+    rows = (
+        Inventory.objects.select_for_update()
+        .filter(product_id__in=sorted(product_ids))
+        .order_by('product_id')
+        .values_list('product_id', 'quantity')
+    )
+    return dict(rows)
+
+
+def _delta_case(deltas):
+    return Case(
+        *[When(product_id=pid, then=Value(qty)) for pid, qty in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _snapshot_changes(batch, available, reserved):
+    # column updates for one batch; `available`/`reserved` scale each delta
+    changes = {}
+    if available:
+        changes['quantity'] = F('quantity') + _delta_case({pid: qty * available for pid, qty in batch.items()})
+    if reserved:
+        changes['reserved'] = F('reserved') + _delta_case({pid: qty * reserved for pid, qty in batch.items()})
+    return changes
+
+
+def apply_deltas(deltas, available=1, reserved=0):
+    """
+    Adds deltas ({product_id: change}) to the inventory snapshot with one
+    UPDATE per DELTA_BATCH_SIZE products and returns the number of rows
+    changed. Each change is multiplied by `available` for the available
+    quantity and by `reserved` for the reserved column, so a reservation
+    is apply_deltas(demand, available=-1, reserved=1).
+    """
+    deltas = [(pid, qty) for pid, qty in deltas.items() if qty]
+    if not deltas:
+        return 0
+    now = timezone.now()
+    updated = 0
+    for start in range(0, len(deltas), DELTA_BATCH_SIZE):
+        batch = dict(deltas[start:start + DELTA_BATCH_SIZE])
+        updated += Inventory.objects.filter(product_id__in=batch.keys()).update(
+            **_snapshot_changes(batch, available, reserved),
+            updated_at=now,
+        )
+    # bulk updates skip post_save, so drop cached stock figures and publish the change here
+    invalidate_catalog()
+    outbox.stock_changed(pid for pid, _qty in deltas)
+    return updated
+
+
+def record_movements(kind, deltas, available=1, reserved=0, reference=''):
+    """
+    Appends one ledger entry per product of `deltas`, scaled the same way
+    as apply_deltas.
+    """
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=pid, kind=kind, available_change=qty * available,
+                          reserved_change=qty * reserved, reference=reference)
+            for pid, qty in deltas.items() if qty
+        ],
+        batch_size=DELTA_BATCH_SIZE,
+    )
+
+
+def record_order_movements(kind, order_lines, available=1, reserved=0):
+    """
+    Ledger entries for several orders at once: `order_lines` is a list of
+    (reference, lines) pairs and every order gets one entry per product.
+    """
+    movements = []
+    for reference, lines in order_lines:
+        demand, _info, _problems = aggregate_demand(lines)
+        movements += [
+            StockMovement(product_id=pid, kind=kind, available_change=qty * available,
+                          reserved_change=qty * reserved, reference=reference)
+            for pid, qty in demand.items() if qty
+        ]
+    StockMovement.objects.bulk_create(movements, batch_size=DELTA_BATCH_SIZE)
+
+
+def move(kind, deltas, available=1, reserved=0, reference=''):
+    """
+    Applies `deltas` to the snapshot and writes the matching ledger
+    entries. Must be called inside a transaction.
+    """
+    apply_deltas(deltas, available=available, reserved=reserved)
+    record_movements(kind, deltas, available=available, reserved=reserved, reference=reference)
+
+
+def ensure_inventories(product_ids):
+    """
+    Creates zero-stock inventory rows for any of `product_ids` that lack one.
+    """
+    Inventory.objects.bulk_create(
+        [Inventory(product_id=pid, quantity=0) for pid in sorted(product_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def aggregate_demand(lines):
+    """
+    Sums `lines` ((product_id, sku, name, quantity) tuples) per product.
+    Returns (demand, info, problems): {product_id: quantity},
+    {product_id: (sku, name)} and error entries for deleted products.
+    """
+    demand = {}
+    info = {}
+    problems = []
+    for product_id, sku, name, quantity in lines:
+        if product_id is None:
+            problems.append({'product': None, 'message': 'Product no longer exists'})
+            continue
+        demand[product_id] = demand.get(product_id, 0) + quantity
+        info[product_id] = (sku, name)
+    return demand, info, problems
+
+
+def shortfalls(demand, info, available):
+    """
+    Error entries for every product whose demand exceeds `available`.
+    """
+    insufficient = []
+    for product_id, requested in demand.items():
+        on_hand = available.get(product_id, 0)
+        if requested > on_hand:
+            sku, name = info[product_id]
+            insufficient.append({
+                'product': sku,
+                'product_name': name,
+                'available': on_hand,
+                'requested': requested,
+                'message': f"Insufficient stock for {name}. Available: {on_hand}, Requested: {requested}"
+            })
+    return insufficient
+
+
+def check_availability(lines, available):
+    """
+    Aggregates `lines` into per-product demand and compares it with
+    `available` ({product_id: qty}). Returns (demand, insufficient).
+    """
+    demand, info, insufficient = aggregate_demand(lines)
+    return demand, insufficient + shortfalls(demand, info, available)
+
+
+def availability_report(lines, available):
+    """
+    Read-only counterpart of reserve: returns (rows, insufficient) where
+    rows hold requested/available/shortfall per product and insufficient
+    is exactly the list a confirm of `lines` would fail with.
+    """
+    demand, info, problems = aggregate_demand(lines)
+    rows = []
+    for product_id, requested in demand.items():
+        sku, name = info[product_id]
+        on_hand = available.get(product_id, 0)
+        rows.append({
+            'product': product_id,
+            'sku': sku,
+            'product_name': name,
+            'requested': requested,
+            'available': on_hand,
+            'shortfall': max(requested - on_hand, 0),
+        })
+    return rows, problems + shortfalls(demand, info, available)
+
+
+def stock_mode():
+    """
+    'locking' locks the inventory rows before deducting; 'conditional'
+    deducts with guarded UPDATEs and needs no row locks. 'auto' (the
+    default) picks conditional on backends without SELECT ... FOR UPDATE,
+    such as SQLite, where the locking mode would not actually lock.
+    """
+    mode = getattr(settings, 'SALES_STOCK_MODE', 'auto')
+    if mode == 'auto':
+        return 'locking' if connection.features.has_select_for_update else 'conditional'
+    return mode
+
+
+def reserve(lines, reference='', record=True):
+    """
+    Moves the demand of `lines` from available to reserved stock, or raises
+    InsufficientStock without touching stock when any product falls short.
+    With record=False the caller writes the ledger entries itself. Must be
+    called inside a transaction.
+    """
+    if stock_mode() == 'conditional':
+        return reserve_conditional(lines, reference, record)
+    return reserve_locked(lines, reference, record)
+
+
+def reserve_locked(lines, reference='', record=True):
+    """
+    Locks every involved row once, checks availability in memory and
+    reserves with a single UPDATE.
+    """
+    product_ids = {line[0] for line in lines if line[0] is not None}
+    available = lock_inventories(product_ids)
+    demand, insufficient = check_availability(lines, available)
+    if insufficient:
+        raise InsufficientStock(insufficient)
+    apply_deltas(demand, available=-1, reserved=1)
+    if record:
+        record_movements(StockMovement.KIND_RESERVATION, demand, available=-1, reserved=1, reference=reference)
+    return demand
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def reserve_conditional(lines, reference='', record=True):
+    """
+    Reserves with UPDATE ... SET quantity = quantity - n WHERE quantity >= n
+    (one statement per DELTA_BATCH_SIZE products). If fewer rows change than
+    products demanded, the savepoint is rolled back and the shortfall is
+    reported from a plain read.
+    """
+    demand, info, problems = aggregate_demand(lines)
+    if problems:
+        raise InsufficientStock(problems + shortfalls(demand, info, current_stock(demand)))
+    deltas = [(pid, qty) for pid, qty in demand.items() if qty]
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            updated = 0
+            for start in range(0, len(deltas), DELTA_BATCH_SIZE):
+                batch = dict(deltas[start:start + DELTA_BATCH_SIZE])
+                needed = _delta_case(batch)
+                updated += Inventory.objects.filter(product_id__in=batch.keys(), quantity__gte=needed).update(
+                    quantity=F('quantity') - needed,
+                    reserved=F('reserved') + needed,
+                    updated_at=now,
+                )
+            if updated != len(deltas):
+                raise _Shortfall
+            if record:
+                record_movements(StockMovement.KIND_RESERVATION, demand, available=-1, reserved=1, reference=reference)
+            outbox.stock_changed(pid for pid, _qty in deltas)
+    except _Shortfall:
+        raise InsufficientStock(shortfalls(demand, info, current_stock(demand)))
+    if deltas:
+        invalidate_catalog()
+    return demand
+
+
+def reserve_orders(order_lines):
+    """
+    Reserves the combined demand of several orders ((reference, lines)
+    pairs) in one pass: each inventory row is locked or guarded once and
+    moved by its summed demand, while the ledger still gets one entry per
+    order and product. Raises InsufficientStock if the total does not fit.
+    """
+    demand = reserve([line for _reference, lines in order_lines for line in lines], record=False)
+    record_order_movements(StockMovement.KIND_RESERVATION, order_lines, available=-1, reserved=1)
+    return demand
+
+
+def ship_orders(order_lines):
+    """
+    Ships the reserved stock of several orders ((reference, lines) pairs)
+    with one UPDATE per DELTA_BATCH_SIZE products. Must be called inside
+    the transaction that marks them delivered.
+    """
+    demand, _info, _problems = aggregate_demand([line for _reference, lines in order_lines for line in lines])
+    lock_inventories(demand.keys())
+    apply_deltas(demand, available=0, reserved=-1)
+    record_order_movements(StockMovement.KIND_SHIPMENT, order_lines, available=0, reserved=-1)
+
+
+def current_stock(product_ids):
+    # plain read of the available quantity, no locks
+    return dict(Inventory.objects.filter(product_id__in=list(product_ids)).values_list('product_id', 'quantity'))
+
+
+def _claimed_order_state(order):
+    # lines and totals are read after the claim: a line edit that committed
+    # before it is included, and later edits are refused (no longer a draft)
+    order.total_amount, order.item_count = Order.objects.filter(pk=order.pk).values_list(
+        'total_amount', 'item_count').get()
+    return order_lines(order)
+
+
+def confirm_order(order):
+    """
+    Moves `order` from Draft to Confirmed and reserves the stock of its
+    lines in one transaction. The status change is a guarded UPDATE, so two
+    concurrent confirms of the same order cannot both deduct, and the
+    lines are read after it. Returns False if the order was no longer a
+    draft; raises InsufficientStock on shortfall.
+    """
+    with transaction.atomic():
+        outbox.lock_writers()
+        now = timezone.now()
+        claimed = Order.objects.filter(pk=order.pk, status=Order.STATUS_DRAFT).update(
+            status=Order.STATUS_CONFIRMED, confirmed_at=now, updated_at=now,
+        )
+        if not claimed:
+            return False
+        reserve(_claimed_order_state(order), reference=order.order_number or '')
+        order.status = Order.STATUS_CONFIRMED
+        order.confirmed_at = now
+        order.updated_at = now
+        reports.record_confirmation(order)
+        outbox.order_changed('order.confirmed', [order])
+    return True
+
+
+def deliver_order(order):
+    """
+    Moves `order` from Confirmed to Delivered and ships the reserved stock
+    of its lines, read after the guarded status change, in one
+    transaction. Returns False if the order was no longer confirmed.
+    """
+    with transaction.atomic():
+        outbox.lock_writers()
+        now = timezone.now()
+        claimed = Order.objects.filter(pk=order.pk, status=Order.STATUS_CONFIRMED).update(
+            status=Order.STATUS_DELIVERED, delivered_at=now, updated_at=now,
+        )
+        if not claimed:
+            return False
+        ship_orders([(order.order_number or '', _claimed_order_state(order))])
+        order.status = Order.STATUS_DELIVERED
+        order.delivered_at = now
+        order.updated_at = now
+        reports.record_delivery(order)
+        outbox.order_changed('order.delivered', [order])
+    return True
+
+
+RETRYABLE_ERRORS = (
+    'database is locked',
+    'database table is locked',
+    'deadlock detected',
+    'could not serialize access',
+)
+
+
+def run_with_retries(func, attempts=8, base_delay=0.01, max_delay=0.5):
+    """
+    Calls `func` and retries it with exponential backoff and full jitter
+    when the database reports lock contention. `func` must own its
+    transaction; inside an enclosing atomic block errors are re-raised
+    immediately because the outer transaction is already broken.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except OperationalError as exc:
+            retryable = any(message in str(exc).lower() for message in RETRYABLE_ERRORS)
+            if not retryable or attempt == attempts or connection.in_atomic_block:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+def release(lines, reference=''):
+    """
+    Returns the reserved demand of `lines` to available stock, creating
+    missing inventory rows as needed.
+    """
+    deltas = {}
+    for product_id, _sku, _name, quantity in lines:
+        if product_id is None:
+            continue
+        deltas[product_id] = deltas.get(product_id, 0) + quantity
+    if not deltas:
+        return
+    with transaction.atomic():
+        outbox.lock_writers()
+        available = lock_inventories(deltas.keys())
+        ensure_inventories(pid for pid in deltas if pid not in available)
+        move(StockMovement.KIND_RELEASE, deltas, available=1, reserved=-1, reference=reference)
+
+
+def adjust(adjustments, user=None):
+    """
+    Applies manual stock adjustments in one transaction: writes the
+    InventoryAdjustment audit rows and ledger entries with bulk_create and
+    the summed change per product with set-based UPDATEs. `adjustments` is a list of
+    (product_id, change, note) tuples. Returns the created audit rows.
+    """
+    deltas = {}
+    for product_id, change, _note in adjustments:
+        deltas[product_id] = deltas.get(product_id, 0) + change
+    records = [
+        InventoryAdjustment(product_id=product_id, change=change, note=note, changed_by=user)
+        for product_id, change, note in adjustments
+    ]
+    movements = [
+        StockMovement(product_id=product_id, kind=StockMovement.KIND_ADJUSTMENT, available_change=change, reference=note[:255])
+        for product_id, change, note in adjustments if change
+    ]
+    with transaction.atomic():
+        outbox.lock_writers()
+        ensure_inventories(deltas.keys())
+        lock_inventories(deltas.keys())
+        apply_deltas(deltas)
+        InventoryAdjustment.objects.bulk_create(records, batch_size=DELTA_BATCH_SIZE)
+        StockMovement.objects.bulk_create(movements, batch_size=DELTA_BATCH_SIZE)
+    return records
+
+
+def ledger_totals(product_ids):
+    """
+    Returns {product_id: (available, reserved)} summed from the ledger.
+    """
+    rows = (
+        StockMovement.objects.filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(available=Sum('available_change'), reserved=Sum('reserved_change'))
+        .values_list('product_id', 'available', 'reserved')
+    )
+    return {pid: (available, reserved) for pid, available, reserved in rows}
+
+
+def audit(batch_size=1000, fix=False):
+    """
+    Compares every Inventory snapshot with the sum of its ledger entries,
+    `batch_size` products at a time (keyset over product id, one aggregate
+    query per batch). Returns the drifted rows; with fix=True each drifted
+    batch is locked and rewritten from the ledger.
+    """
+    drift = []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            qs = Inventory.objects.filter(product_id__gt=last_id).order_by('product_id')
+            if fix:
+                outbox.lock_writers()
+                qs = qs.select_for_update()
+            batch = list(qs[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].product_id
+            totals = ledger_totals([inv.product_id for inv in batch])
+            changed = []
+            for inv in batch:
+                available, reserved = totals.get(inv.product_id, (0, 0))
+                if (inv.quantity, inv.reserved) != (available, reserved):
+                    drift.append({
+                        'product_id': inv.product_id,
+                        'quantity': inv.quantity,
+                        'reserved': inv.reserved,
+                        'ledger_quantity': available,
+                        'ledger_reserved': reserved,
+                    })
+                    inv.quantity, inv.reserved = available, reserved
+                    inv.updated_at = timezone.now()
+                    changed.append(inv)
+            if fix and changed:
+                Inventory.objects.bulk_update(changed, ['quantity', 'reserved', 'updated_at'], batch_size=DELTA_BATCH_SIZE)
+                outbox.stock_changed(inv.product_id for inv in changed)
+    if fix and drift:
+        invalidate_catalog()
+    return drift
@@ -0,0 +1,162 @@
+"""
+Delta sync for the product, dealer and inventory lists: with
+`?updated_since=<watermark>` their list endpoints return only the rows
+changed since then plus the ids deleted since then (tombstones), so a
+client's sync costs what changed rather than the size of the table. The
+rows come from an (updated_at, id) index range scan in pages of `limit`.
+"""
+import base64
+import binascii
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Dealer, Inventory, Product, Tombstone
+
+SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+# how far a change's updated_at may precede its transaction's start or,
+# on SQLite, its taking the write lock: clock skew between app servers and
+# the database (SQLite adds its busy timeout, see _stamp_margin)
+SYNC_CLOCK_SKEW = timedelta(seconds=2)
+# tombstones are kept this long; older watermarks get a full resync
+TOMBSTONE_DAYS = 30
+
+FEEDS = {
+    Tombstone.MODEL_PRODUCT: (Product, ('id', 'name', 'sku', 'description', 'price', 'active', 'updated_at')),
+    Tombstone.MODEL_DEALER: (Dealer, ('id', 'name', 'code', 'contact_name', 'email', 'phone', 'address', 'updated_at')),
+    Tombstone.MODEL_INVENTORY: (Inventory, ('id', 'product', 'quantity', 'reserved', 'updated_at')),
+}
+
+
+def requested(request):
+    return 'updated_since' in request.query_params
+
+
+def _parse_time(value, name):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'{name} must be an ISO 8601 datetime')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_current_timezone())
+    return moment
+
+
+def encode_cursor(horizon, updated_at, pk):
+    raw = f'{horizon.isoformat()}|{updated_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        horizon, updated_at, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        return _parse_time(horizon, 'after'), _parse_time(updated_at, 'after'), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('after is not a valid sync cursor')
+
+
+def parse_params(params):
+    """
+    Reads `updated_since` (empty for a full sync), `after` (the cursor of
+    the next page) and `limit` from query params. Raises ValueError.
+    """
+    since = params.get('updated_since', '').strip()
+    after = params.get('after')
+    try:
+        limit = int(params.get('limit', SYNC_LIMIT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return {
+        'since': _parse_time(since, 'updated_since') if since else None,
+        'after': decode_cursor(after) if after else None,
+        'limit': max(1, min(limit, MAX_SYNC_LIMIT)),
+    }
+
+
+def _stamp_margin():
+    margin = SYNC_CLOCK_SKEW
+    if connection.vendor == 'sqlite':
+        # a writer may stamp its rows, then wait this long for the write lock
+        margin += timedelta(seconds=connection.settings_dict['OPTIONS'].get('timeout', 5))
+    return margin
+
+
+def _horizon():
+    """
+    The earliest updated_at a change not yet committed can carry: now, or
+    the start of the oldest transaction still open. Call it in the
+    transaction that reads the first page. On SQLite, where open
+    transactions cannot be listed, it takes the write lock instead, so
+    none is open while the page is read.
+    """
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT min(xact_start) FROM pg_stat_activity '
+                'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+            )
+            oldest = cursor.fetchone()[0]
+            return min(now, oldest) if oldest else now
+        if connection.vendor == 'sqlite':
+            # a write statement, even one matching nothing, takes the lock
+            cursor.execute('UPDATE sales_tombstone SET id = id WHERE 0')
+    return now
+
+
+def changes(kind, since=None, after=None, limit=SYNC_LIMIT):
+    """
+    One page of the `kind` rows changed at or after `since`, oldest change
+    first. `reset` is True when the client must replace its copy with the
+    rows sent (no `since`, or one older than the tombstone retention).
+    Until the last page `after` holds the next page's cursor; the last
+    page carries the `deleted` ids and the `watermark` to store for the
+    next sync. The watermark is derived from the first page's horizon (see
+    _horizon), so a transaction that commits after the read is still
+    picked up by the next sync however long it ran.
+    """
+    with transaction.atomic():
+        return _changes(kind, since, after, limit)
+
+
+def _changes(kind, since, after, limit):
+    model, fields = FEEDS[kind]
+    horizon = after[0] if after else _horizon()
+    reset = since is None or since < horizon - timedelta(days=TOMBSTONE_DAYS)
+    qs = model.objects.all()
+    if not reset:
+        qs = qs.filter(updated_at__gte=since)
+    if after:
+        _first, updated_at, pk = after
+        qs = qs.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    rows = list(qs.order_by('updated_at', 'id').values(*fields)[:limit + 1])
+    result = {'reset': reset, 'changed': rows[:limit], 'deleted': [], 'watermark': None, 'after': None}
+    if kind == Tombstone.MODEL_PRODUCT:
+        for row in result['changed']:
+            row['price'] = f"{row['price']:.2f}"
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        result['after'] = encode_cursor(horizon, last['updated_at'], last['id'])
+        return result
+    if not reset:
+        result['deleted'] = list(
+            Tombstone.objects.filter(model=kind, deleted_at__gte=since)
+            .order_by('object_id').values_list('object_id', flat=True).distinct()
+        )
+    result['watermark'] = horizon - _stamp_margin()
+    return result
+
+
+def record_deletion(kind, pk):
+    Tombstone.objects.create(model=kind, object_id=pk)
+
+
+def prune(days=TOMBSTONE_DAYS):
+    """
+    Deletes tombstones older than `days` days; returns how many.
+    """
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -1,7 +1,30 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from . import models
+from . import (
+    benchmarks, fast_serializers, jobs, lines, models, outbox, pagination, perf, renderers, reports, search, stock,
+    sync, views,
+)
 
 
 class OrderFlowTest(TestCase):
@@ -125,6 +148,18 @@ class OrderFlowTest(TestCase):
         self.assertEqual(resp.status_code, 400)
         self.assertEqual(resp.data.get('detail'), 'Only Draft orders can be cancelled')
 
+    def test_cancel_does_not_overwrite_concurrent_confirm(self):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': 2}]}
+        order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        stale = models.Order.objects.get(pk=order_id)
+        self.client.post(f'/api/orders/{order_id}/confirm/')
+        # the view's status check passed on a stale instance; only the guarded UPDATE stands in the way
+        with mock.patch('sales.views.OrderViewSet.get_object', return_value=stale):
+            resp = self.client.post(f'/api/orders/{order_id}/cancel/')
+        self.assertEqual(resp.status_code, 400)
+        order = models.Order.objects.get(pk=order_id)
+        self.assertEqual((order.status, order.total_amount, order.item_count), ('CONFIRMED', Decimal('1000.00'), 1))
+
     def test_invalid_status_transition(self):
         payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': 5}]}
         resp = self.client.post('/api/orders/', payload, format='json')
@@ -160,3 +195,1330 @@ class OrderFlowTest(TestCase):
         self.assertIsNotNone(adj)
         self.assertEqual(adj.change, -10)
         self.assertEqual(adj.changed_by.username, 'admin')
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = []
+        for i in range(5):
+            prod = models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='10.00')
+            models.Inventory.objects.create(product=prod, quantity=50)
+            self.products.append(prod)
+
+    def _create_order(self, lines):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': q} for p, q in lines]}
+        resp = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(resp.status_code, 201)
+        return resp.data['id']
+
+    def test_confirm_query_count_is_flat(self):
+        small = self._create_order([(self.products[0], 1)])
+        large = self._create_order([(p, 1) for p in self.products])
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.client.post(f'/api/orders/{small}/confirm/')
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.client.post(f'/api/orders/{large}/confirm/')
+        self.assertEqual(len(small_ctx), len(large_ctx))
+        quantities = models.Inventory.objects.order_by('product_id').values_list('quantity', flat=True)
+        self.assertEqual(list(quantities), [48, 49, 49, 49, 49])
+
+    def test_repeated_product_lines_are_checked_together(self):
+        order_id = self._create_order([(self.products[0], 30), (self.products[0], 30)])
+        resp = self.client.post(f'/api/orders/{order_id}/confirm/')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['items'][0]['requested'], 60)
+        inv = models.Inventory.objects.get(product=self.products[0])
+        self.assertEqual(inv.quantity, 50)
+
+
+@override_settings(SALES_STOCK_MODE='locking')
+class LockingStockReservationTest(StockReservationTest):
+    pass
+
+
+class StockLedgerTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.prod = models.Product.objects.create(name='Brake Pad', sku='BP-001', price='10.00')
+        self.inv = models.Inventory.objects.create(product=self.prod, quantity=100)
+
+    def _confirmed_order(self, quantity):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': quantity}]}
+        order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        self.assertEqual(self.client.post(f'/api/orders/{order_id}/confirm/').status_code, 200)
+        return order_id
+
+    def test_confirm_reserves_and_deliver_ships(self):
+        order_id = self._confirmed_order(10)
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.available, self.inv.reserved, self.inv.on_hand), (90, 10, 100))
+        self.assertEqual(self.client.post(f'/api/orders/{order_id}/deliver/').status_code, 200)
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.available, self.inv.reserved, self.inv.on_hand), (90, 0, 90))
+        kinds = list(models.StockMovement.objects.order_by('id').values_list('kind', 'available_change', 'reserved_change'))
+        self.assertEqual(kinds, [('RECEIPT', 100, 0), ('RESERVATION', -10, 10), ('SHIPMENT', 0, -10)])
+        self.assertEqual(stock.audit(), [])
+
+    def test_confirm_reads_lines_after_claim(self):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': 5}]}
+        order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        order = models.Order.objects.get(pk=order_id)
+        # an edit committed after the order was loaded but before the claim
+        self.client.patch(f'/api/orders/{order_id}/', {'items': [{'product': self.prod.id, 'quantity': 8}]}, format='json')
+        self.assertTrue(stock.confirm_order(order))
+        self.inv.refresh_from_db()
+        self.assertEqual(self.inv.reserved, 8)
+        self.assertEqual(order.total_amount, Decimal('80.00'))
+        self.assertTrue(stock.deliver_order(order))
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.quantity, self.inv.reserved), (92, 0))
+        self.assertEqual(stock.audit(), [])
+
+    def test_deleting_confirmed_order_releases_reservation(self):
+        order_id = self._confirmed_order(10)
+        self.client.delete(f'/api/orders/{order_id}/')
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.quantity, self.inv.reserved), (100, 0))
+        self.assertTrue(models.StockMovement.objects.filter(kind='RELEASE', available_change=10, reserved_change=-10).exists())
+        self.assertEqual(stock.audit(), [])
+
+    def test_manual_edits_are_recorded(self):
+        self._confirmed_order(10)
+        # a stale instance must neither clobber the reservation nor misreport the change
+        self.inv.quantity = 50
+        self.inv.save()
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.quantity, self.inv.reserved), (50, 10))
+        self.assertEqual(models.StockMovement.objects.filter(kind='ADJUSTMENT').get().available_change, -40)
+        self.assertEqual(stock.audit(), [])
+
+    def test_audit_detects_and_rebuilds_drift(self):
+        self._confirmed_order(10)
+        models.Inventory.objects.filter(pk=self.inv.pk).update(quantity=7, reserved=0)
+        drift = stock.audit(batch_size=1)
+        self.assertEqual(drift, [{'product_id': self.prod.id, 'quantity': 7, 'reserved': 0,
+                                  'ledger_quantity': 90, 'ledger_reserved': 10}])
+        with self.assertRaises(CommandError):
+            call_command('audit_stock', stdout=io.StringIO())
+        call_command('audit_stock', '--fix', stdout=io.StringIO())
+        self.inv.refresh_from_db()
+        self.assertEqual((self.inv.quantity, self.inv.reserved), (90, 10))
+        self.assertEqual(stock.audit(), [])
+
+
+class OrderWriteTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = [
+            models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='12.50')
+            for i in range(6)
+        ]
+
+    def _payload(self, products, quantity=2):
+        return {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': quantity} for p in products]}
+
+    def test_create_query_count_independent_of_lines(self):
+        # the first order of the day also creates the number counter
+        self.client.post('/api/orders/', self._payload(self.products[:1]), format='json')
+        with CaptureQueriesContext(connection) as one:
+            resp = self.client.post('/api/orders/', self._payload(self.products[:1]), format='json')
+        self.assertEqual(resp.status_code, 201)
+        with CaptureQueriesContext(connection) as many:
+            resp = self.client.post('/api/orders/', self._payload(self.products), format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(resp.data['total_amount'], '150.00')
+        self.assertEqual(len(resp.data['items']), 6)
+
+    def test_update_replaces_lines_and_total(self):
+        resp = self.client.post('/api/orders/', self._payload(self.products), format='json')
+        order_id = resp.data['id']
+        resp = self.client.put(f'/api/orders/{order_id}/', self._payload(self.products[:2], quantity=4), format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['total_amount'], '100.00')
+        self.assertEqual(models.OrderItem.objects.filter(order_id=order_id).count(), 2)
+
+    def test_unknown_product_rejected(self):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.products[0].id, 'quantity': 1}, {'product': 9999, 'quantity': 1}]}
+        resp = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('product', resp.data['items'][1])
+        self.assertEqual(models.Order.objects.count(), 0)
+
+
+class OrderLineEditTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = [
+            models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price=Decimal('2.50')) for i in range(40)
+        ]
+        payload = {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': 2} for p in self.products]}
+        self.order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        self.items = list(models.OrderItem.objects.filter(order_id=self.order_id).order_by('id'))
+
+    def _totals(self):
+        return models.Order.objects.filter(pk=self.order_id).values_list('total_amount', 'item_count').get()
+
+    def test_change_touches_one_line(self):
+        self.assertEqual(self._totals(), (Decimal('200.00'), 40))
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.patch(f'/api/orders/{self.order_id}/items/{self.items[5].id}/', {'quantity': 6}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data['total_amount'], resp.data['item_count']), ('210.00', 40))
+        self.assertEqual(resp.data['item']['line_total'], '15.00')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertIn('"sales_orderitem"', writes[0])
+        self.assertIn('"sales_order"', writes[1])
+
+    def test_add_and_remove(self):
+        resp = self.client.post(f'/api/orders/{self.order_id}/items/', {'product': self.products[0].id, 'quantity': 4}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((resp.data['total_amount'], resp.data['item_count']), ('210.00', 41))
+        resp = self.client.delete(f'/api/orders/{self.order_id}/items/{self.items[0].id}/')
+        self.assertEqual((resp.data['total_amount'], resp.data['item_count']), ('205.00', 40))
+        self.assertEqual(lines.audit_totals(), [])
+
+    def test_rejects_non_drafts_and_unknown_lines(self):
+        resp = self.client.patch(f'/api/orders/{self.order_id}/items/999999/', {'quantity': 1}, format='json')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.patch(f'/api/orders/{self.order_id}/items/{self.items[0].id}/', {'quantity': 0}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        models.Order.objects.filter(pk=self.order_id).update(status=models.Order.STATUS_CONFIRMED)
+        resp = self.client.patch(f'/api/orders/{self.order_id}/items/{self.items[0].id}/', {'quantity': 3}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(models.OrderItem.objects.get(pk=self.items[0].id).quantity, 2)
+        self.assertEqual(self._totals(), (Decimal('200.00'), 40))
+
+    def test_check_command_detects_and_repairs(self):
+        models.Order.objects.filter(pk=self.order_id).update(total_amount=Decimal('1.00'), item_count=3)
+        with self.assertRaises(CommandError):
+            call_command('check_order_totals', stdout=io.StringIO())
+        call_command('check_order_totals', '--fix', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(self._totals(), (Decimal('200.00'), 40))
+
+
+class OrderNumberTest(TestCase):
+    def setUp(self):
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+
+    def test_numbers_are_sequential_per_day(self):
+        first = models.Order.objects.create(dealer=self.dealer)
+        second = models.Order.objects.create(dealer=self.dealer)
+        day = timezone.localdate().strftime('%Y%m%d')
+        self.assertEqual(first.order_number, f'ORD-{day}-0001')
+        self.assertEqual(second.order_number, f'ORD-{day}-0002')
+
+    def test_rolled_back_order_returns_its_number(self):
+        try:
+            with transaction.atomic():
+                models.Order.objects.create(dealer=self.dealer)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        order = models.Order.objects.create(dealer=self.dealer)
+        self.assertTrue(order.order_number.endswith('-0001'))
+
+    def test_block_allocation(self):
+        day = datetime.date(2025, 1, 31)
+        self.assertEqual(models.OrderNumberSequence.allocate(count=10, day=day), 1)
+        self.assertEqual(models.OrderNumberSequence.allocate(day=day), 11)
+
+
+class ListPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        for i in range(7):
+            prod = models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='10.00')
+            models.Inventory.objects.create(product=prod, quantity=10)
+            order = models.Order.objects.create(dealer=self.dealer)
+            models.OrderItem.objects.create(order=order, product=prod, quantity=1, unit_price=prod.price)
+
+    def test_orders_follow_cursor(self):
+        resp = self.client.get('/api/orders/?page_size=3')
+        self.assertEqual(resp.status_code, 200)
+        seen = [o['id'] for o in resp.data['results']]
+        while resp.data['next']:
+            resp = self.client.get(resp.data['next'])
+            seen += [o['id'] for o in resp.data['results']]
+        expected = list(models.Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_products_sorted_by_name(self):
+        data = self.client.get('/api/products/?page_size=5').json()
+        self.assertEqual([p['sku'] for p in data['results']], [f'P-{i:03d}' for i in range(5)])
+        self.assertIsNotNone(data['next'])
+
+    def test_sparse_fieldset_skips_items(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/orders/?fields=id,order_number,status')
+        self.assertEqual(set(resp.data['results'][0]), {'id', 'order_number', 'status'})
+        self.assertFalse(any('sales_orderitem' in q['sql'] for q in ctx.captured_queries))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans checked against SQLite')
+class QueryIndexTest(TestCase):
+    def setUp(self):
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.orders = models.Order.objects.order_by(*pagination.OrderCursorPagination.ordering)
+
+    def assertUsesIndex(self, qs, index_name):
+        self.assertIn(f'USING INDEX {index_name}', qs[:51].explain())
+
+    def test_order_list_indexes(self):
+        filter_list = views.OrderViewSet.filter_list
+        self.assertUsesIndex(self.orders, 'sales_ord_created_idx')
+        self.assertUsesIndex(filter_list(self.orders, {'status': 'CONFIRMED'}), 'sales_ord_status_created_idx')
+        self.assertUsesIndex(
+            filter_list(self.orders, {'status': 'CONFIRMED', 'dealer': str(self.dealer.id)}),
+            'sales_ord_dealer_status_idx',
+        )
+
+    def test_product_list_indexes(self):
+        products = models.Product.objects.order_by(*pagination.ProductCursorPagination.ordering)
+        self.assertUsesIndex(products, 'sales_prod_name_sku_idx')
+        self.assertUsesIndex(products.filter(active=True), 'sales_prod_active_name_idx')
+
+    def test_adjustment_history_index(self):
+        adjustments = models.InventoryAdjustment.objects.filter(product_id=1).order_by('-created_at', '-id')
+        self.assertUsesIndex(adjustments, 'sales_adj_product_created_idx')
+
+
+class DealerDetailTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        now = timezone.now()
+        for i, order_status in enumerate(['DRAFT', 'DRAFT', 'CONFIRMED', 'DELIVERED', 'CANCELLED']):
+            models.Order.objects.create(
+                dealer=self.dealer, status=order_status, total_amount=f'{(i + 1) * 100}.00',
+                delivered_at=now if order_status == 'DELIVERED' else None,
+            )
+
+    def test_retrieve_pages_history_and_aggregates(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(f'/api/dealers/{self.dealer.id}/?page_size=2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['orders']), 2)
+        self.assertIsNotNone(resp.data['orders_next'])
+        stats = resp.data['order_stats']
+        self.assertEqual(stats['counts'], {'DRAFT': 2, 'CONFIRMED': 1, 'DELIVERED': 1, 'CANCELLED': 1})
+        self.assertEqual(stats['open_value'], Decimal('600.00'))
+        self.assertEqual(stats['delivered_value_this_month'], Decimal('400.00'))
+        self.assertEqual(len(ctx), 3)
+
+
+class AsyncReadTest(TestCase):
+    def setUp(self):
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = []
+        for i in range(5):
+            prod = models.Product.objects.create(name=f'Part {i % 2}', sku=f'P-{i:03d}', price=Decimal('10.00'))
+            models.Inventory.objects.create(product=prod, quantity=10 + i)
+            self.products.append(prod)
+        self.order = benchmarks.seed_order(self.dealer.id, [(p.id, p.sku, p.name, p.price) for p in self.products[:2]])
+
+    async def test_product_pages_match_sync_ordering(self):
+        expected = [p.sku for p in sorted(self.products, key=lambda p: (p.name, p.sku))]
+        seen = []
+        url = '/api/async/products/?page_size=2'
+        while url:
+            resp = await self.async_client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            body = resp.json()
+            seen += [row['sku'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual(body['results'][0]['sku'], expected[4])
+        # and back again through `previous`
+        back = []
+        url = body['previous']
+        while url:
+            body = (await self.async_client.get(url)).json()
+            back = [row['sku'] for row in body['results']] + back
+            url = body['previous']
+        self.assertEqual(back, expected[:4])
+        self.assertEqual(body['next'].count('cursor='), 1)
+
+    async def test_details_match_sync_endpoints(self):
+        prod = self.products[3]
+        for sync_url, async_url in (
+            (f'/api/products/{prod.id}/', f'/api/async/products/{prod.id}/'),
+            (f'/api/orders/{self.order.id}/', f'/api/async/orders/{self.order.id}/'),
+            (f'/api/orders/{self.order.id}/?fields=id,status', f'/api/async/orders/{self.order.id}/?fields=id,status'),
+        ):
+            sync_resp = await self.async_client.get(sync_url)
+            async_resp = await self.async_client.get(async_url)
+            self.assertEqual(async_resp.json(), sync_resp.json())
+        resp = await self.async_client.get('/api/async/orders/999999/')
+        self.assertEqual(resp.status_code, 404)
+
+    async def test_stock_lookup(self):
+        resp = await self.async_client.get('/api/async/stock/?sku=P-001')
+        self.assertEqual(resp.status_code, 401)
+        admin = await sync_to_async(User.objects.create_superuser)('admin', 'admin@example.com', 'pass')
+        await self.async_client.aforce_login(admin)
+        resp = await self.async_client.get(f'/api/async/stock/?sku=P-001&product={self.products[4].id}')
+        self.assertEqual(resp.json()['results'], [
+            {'product_id': self.products[1].id, 'sku': 'P-001', 'available': 11, 'reserved': 0, 'on_hand': 11},
+            {'product_id': self.products[4].id, 'sku': 'P-004', 'available': 14, 'reserved': 0, 'on_hand': 14},
+        ])
+        resp = await self.async_client.get('/api/async/stock/')
+        self.assertEqual(resp.status_code, 400)
+
+
+class ReportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = []
+        for i in range(3):
+            prod = models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price=Decimal(f'{i + 1}0.00'))
+            models.Inventory.objects.create(product=prod, quantity=100)
+            self.products.append(prod)
+
+    def _order(self, quantities):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': q} for p, q in zip(self.products, quantities)]}
+        return self.client.post('/api/orders/', payload, format='json').data['id']
+
+    def _rollups(self):
+        dealers = list(models.DealerDailySales.objects.order_by('day', 'dealer_id').values())
+        products = list(models.ProductDailySales.objects.order_by('day', 'product_id').values())
+        for row in dealers + products:
+            row.pop('id')
+        return dealers, products
+
+    def test_rollups_follow_order_lifecycle_and_match_backfill(self):
+        first = self._order([1, 2, 3])
+        second = self._order([5])
+        cancelled = self._order([1])
+        deleted = self._order([0, 0, 1])
+        for order_id in (first, second, deleted):
+            self.client.post(f'/api/orders/{order_id}/confirm/')
+        models.Order.objects.filter(pk=first).update(confirmed_at=timezone.now() - datetime.timedelta(hours=2))
+        self.client.post(f'/api/orders/{first}/deliver/')
+        self.client.post(f'/api/orders/{cancelled}/cancel/')
+        self.client.delete(f'/api/orders/{deleted}/')
+
+        row = models.DealerDailySales.objects.get()
+        self.assertEqual((row.order_count, row.quantity, row.revenue), (2, 11, Decimal('190.00')))
+        self.assertEqual((row.delivered_count, row.cancelled_count), (1, 1))
+        self.assertAlmostEqual(row.lead_time_seconds, 7200, delta=5)
+        top = models.ProductDailySales.objects.get(product=self.products[0])
+        self.assertEqual((top.order_count, top.quantity, top.revenue), (2, 6, Decimal('60.00')))
+
+        incremental = self._rollups()
+        call_command('backfill_reports', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self._rollups(), incremental)
+
+    def test_endpoints_read_rollups_only(self):
+        order_id = self._order([1, 4, 1])
+        self.client.post(f'/api/orders/{order_id}/confirm/')
+        self.client.force_authenticate(user=self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/reports/products/?by=quantity&limit=2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([row['sku'] for row in resp.data['results']], ['P-001', 'P-000'])
+        self.assertTrue(all('sales_order' not in q['sql'] for q in ctx.captured_queries))
+        resp = self.client.get(f'/api/reports/dealers/?dealer={self.dealer.id}')
+        self.assertEqual(resp.data['results'][0]['revenue'], Decimal('120.00'))
+        resp = self.client.get('/api/reports/lead-time/')
+        self.assertEqual(resp.data['results']['delivered'], 0)
+        resp = self.client.get('/api/reports/dealers/?from=2025-02-01&to=2025-01-01')
+        self.assertEqual(resp.status_code, 400)
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        search.sku_index.reset()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pad = models.Product.objects.create(name='Brake Pad', sku='BP-001', price=Decimal('500.00'), description='Front axle')
+            self.disc = models.Product.objects.create(name='Brake Disc', sku='BP-0011', price=Decimal('900.00'))
+            self.filter = models.Product.objects.create(name='Oil Filter', sku='OF-100', price=Decimal('150.00'),
+                                                        description='Service kit with brake cleaner')
+            self.old = models.Product.objects.create(name='Brake Cable', sku='BC-9', price=Decimal('80.00'), active=False)
+
+    def _ids(self, text, **kwargs):
+        return [row['id'] for row in search.search(text, **kwargs)]
+
+    def test_text_matches_ranked_by_field(self):
+        ids = self._ids('brak')
+        self.assertEqual(set(ids), {self.pad.id, self.disc.id, self.filter.id, self.old.id})
+        # a name match outranks a description match
+        self.assertEqual(ids[-1], self.filter.id)
+        self.assertEqual(self._ids('brake pa'), [self.pad.id])
+        self.assertNotIn(self.old.id, self._ids('brake', active_only=True))
+        self.assertEqual(self._ids('   '), [])
+
+    def test_sku_prefix_puts_exact_match_first(self):
+        self.assertEqual(self._ids('bp-001')[:2], [self.pad.id, self.disc.id])
+        self.assertEqual(self._ids('BP-0011')[0], self.disc.id)
+        # inactive SKU hits are dropped before the limit, not after
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Product.objects.create(name='Throttle Cable', sku='BC-91', price=Decimal('90.00'))
+        self.assertEqual(self._ids('bc-9', limit=1, active_only=True), [models.Product.objects.get(sku='BC-91').id])
+        with self.assertNumQueries(0):
+            self.assertEqual(search.sku_index.lookup('of-1'), [self.filter.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pad.name = 'Clutch Plate'
+            self.pad.sku = 'CP-1'
+            self.pad.save()
+            self.disc.delete()
+        self.assertEqual(self._ids('clutch'), [self.pad.id])
+        self.assertEqual(search.sku_index.lookup('CP'), [self.pad.id])
+        self.assertEqual(search.sku_index.lookup('BP'), [])
+        self.assertEqual(self._ids('brake'), [self.old.id, self.filter.id])
+
+    def test_sku_index_expires_without_a_shared_version(self):
+        self.assertEqual(search.sku_index.lookup('OF'), [self.filter.id])
+        # another worker's change: its version bump never reached this process' cache
+        models.Product.objects.filter(pk=self.filter.pk).update(sku='OX-100')
+        self.assertEqual(search.sku_index.lookup('OF'), [self.filter.id])
+        with mock.patch('sales.search.time.monotonic', return_value=time.monotonic() + search.SKU_INDEX_MAX_AGE):
+            self.assertEqual(search.sku_index.lookup('OF'), [])
+            self.assertEqual(search.sku_index.lookup('OX'), [self.filter.id])
+
+    def test_admin_search_is_not_capped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Product.objects.bulk_create(
+                models.Product(name=f'Brake Shoe {i}', sku=f'BS-{i:03d}', price=Decimal('1.00'))
+                for i in range(search.MAX_SEARCH_LIMIT + 5)
+            )
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin)
+        res = self.client.get('/admin/sales/product/', {'q': 'brake'})
+        self.assertEqual(res.context['cl'].result_count, search.MAX_SEARCH_LIMIT + 5 + 4)
+        # below the cap it finds exactly what the typeahead does
+        res = self.client.get('/admin/sales/product/', {'q': 'bs-1'})
+        self.assertEqual({product.id for product in res.context['cl'].result_list}, set(self._ids('bs-1', limit=100)))
+
+    def test_index_rebuilt_when_missing(self):
+        self.assertFalse(search.install_index())
+        search.drop_index()
+        self.assertTrue(search.install_index())
+        self.assertEqual(self._ids('disc'), [self.disc.id])
+
+    def test_endpoint_limits_results(self):
+        res = self.client.get('/api/products/search/', {'q': 'brake', 'limit': 2})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(set(res.data['results'][0]), {'id', 'name', 'sku', 'price', 'active', 'stock'})
+        res = self.client.get('/api/products/search/', {'q': 'brake', 'active': 'true', 'limit': 1000})
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertEqual(self.client.get('/api/products/search/', {'q': 'x', 'limit': 'many'}).status_code, 400)
+
+
+class BulkTransitionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.a = models.Product.objects.create(name='Part A', sku='A-1', price=Decimal('10.00'))
+        self.b = models.Product.objects.create(name='Part B', sku='B-1', price=Decimal('20.00'))
+        models.Inventory.objects.create(product=self.a, quantity=10)
+        models.Inventory.objects.create(product=self.b, quantity=5)
+
+    def _order(self, *lines):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': q} for p, q in lines]}
+        return self.client.post('/api/orders/', payload, format='json').data['id']
+
+    def _stock(self, product):
+        return models.Inventory.objects.filter(product=product).values_list('quantity', 'reserved').get()
+
+    def _rollups(self):
+        rows = [list(m.objects.order_by('day', 'id').values()) for m in (models.DealerDailySales, models.ProductDailySales)]
+        for row in rows[0] + rows[1]:
+            row.pop('id')
+        return rows
+
+    def test_partial_confirm_allocates_in_request_order(self):
+        first = self._order((self.a, 5))
+        second = self._order((self.a, 4), (self.b, 5))
+        too_big = self._order((self.a, 3))
+        done = self._order((self.a, 1))
+        self.client.post(f'/api/orders/{done}/confirm/')
+        res = self.client.post('/api/orders/bulk-confirm/', {'ids': [first, second, too_big, done, 999999, first]}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['succeeded'], res.data['failed']), (2, 3))
+        results = {row['id']: row for row in res.data['results']}
+        self.assertEqual([row['id'] for row in res.data['results']], [first, second, too_big, done, 999999])
+        self.assertTrue(results[first]['ok'] and results[second]['ok'])
+        self.assertEqual(results[too_big]['items'][0]['available'], 0)
+        self.assertEqual(results[done]['detail'], 'Only Draft orders can be confirmed')
+        self.assertEqual(results[999999]['detail'], 'Not found.')
+        self.assertEqual(self._stock(self.a), (0, 10))
+        self.assertEqual(self._stock(self.b), (0, 5))
+        self.assertEqual(models.StockMovement.objects.filter(kind=models.StockMovement.KIND_RESERVATION).count(), 4)
+        self.assertEqual(models.Order.objects.filter(status='CONFIRMED').count(), 3)
+        self.assertEqual(stock.audit(), [])
+
+    def test_all_or_nothing_writes_nothing_on_failure(self):
+        ok = self._order((self.a, 1))
+        too_big = self._order((self.b, 50))
+        res = self.client.post('/api/orders/bulk-confirm/', {'ids': [ok, too_big], 'mode': 'all_or_nothing'}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['results'][0]['detail'], 'Not applied: another order in the batch failed')
+        self.assertEqual(self._stock(self.a), (10, 0))
+        self.assertFalse(models.Order.objects.filter(status='CONFIRMED').exists())
+        self.assertFalse(models.DealerDailySales.objects.exists())
+
+    def test_query_count_does_not_grow_with_batch(self):
+        counts = []
+        for size in (2, 8):
+            ids = [self._order((self.a, 1)) for _ in range(size)]
+            models.Inventory.objects.filter(product=self.a).update(quantity=100)
+            for path in ('bulk-confirm', 'bulk-deliver'):
+                with CaptureQueriesContext(connection) as ctx:
+                    res = self.client.post(f'/api/orders/{path}/', {'ids': ids}, format='json')
+                self.assertEqual(res.data['succeeded'], size)
+                counts.append(len(ctx))
+        self.assertEqual(counts[:2], counts[2:])
+
+    def test_deliver_and_cancel_match_backfill(self):
+        drafts = [self._order((self.a, 1)) for _ in range(2)]
+        confirmed = [self._order((self.a, 2), (self.b, 1)) for _ in range(2)]
+        self.client.post('/api/orders/bulk-confirm/', {'ids': confirmed}, format='json')
+        res = self.client.post('/api/orders/bulk-deliver/', {'ids': confirmed + drafts[:1]}, format='json')
+        self.assertEqual((res.data['succeeded'], res.data['failed']), (2, 1))
+        self.assertEqual(self._stock(self.a), (6, 0))
+        self.assertEqual(self._stock(self.b), (3, 0))
+        res = self.client.post('/api/orders/bulk-cancel/', {'ids': drafts + confirmed[:1]}, format='json')
+        self.assertEqual((res.data['succeeded'], res.data['failed']), (2, 1))
+        self.assertEqual(res.data['results'][2]['detail'], 'Only Draft orders can be cancelled')
+        self.assertEqual(models.Order.objects.filter(status='CANCELLED').count(), 2)
+        self.assertEqual(models.StockMovement.objects.filter(kind=models.StockMovement.KIND_SHIPMENT).count(), 4)
+        live = self._rollups()
+        reports.backfill()
+        self.assertEqual(self._rollups(), live)
+
+    def test_invalid_payloads(self):
+        for payload in ({'ids': []}, {'ids': ['x']}, {'ids': [1], 'mode': 'sometimes'}, {}):
+            self.assertEqual(self.client.post('/api/orders/bulk-confirm/', payload, format='json').status_code, 400)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.clerk = User.objects.create_user('clerk', password='pass')
+        self.client.force_authenticate(self.clerk)
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.prod = models.Product.objects.create(name='Brake Pad', sku='BP-001', price=Decimal('10.00'))
+        models.Inventory.objects.create(product=self.prod, quantity=5)
+
+    def _order(self, quantity):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': quantity}]}
+        return self.client.post('/api/orders/', payload, format='json').data['id']
+
+    def test_async_confirm_runs_in_worker(self):
+        order_id = self._order(2)
+        res = self.client.post(f'/api/orders/{order_id}/confirm/?async=1')
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res['Location'], res.data['url'])
+        self.assertEqual(models.Order.objects.get(pk=order_id).status, 'DRAFT')
+        self.assertEqual(jobs.work(once=True), 1)
+        job = self.client.get(f"/api/jobs/{res.data['job']}/").data
+        self.assertEqual((job['status'], job['attempts']), ('SUCCEEDED', 1))
+        self.assertEqual(job['result']['detail'], 'Order confirmed')
+        self.assertEqual(models.Order.objects.get(pk=order_id).status, 'CONFIRMED')
+        self.assertIsNone(jobs.claim())
+
+    def test_only_the_creator_and_staff_see_a_job(self):
+        url = self.client.post(f'/api/orders/{self._order(1)}/confirm/?async=1').data['url']
+        other = APIClient()
+        self.assertEqual(other.post(f'/api/orders/{self._order(1)}/confirm/?async=1').status_code, 401)
+        self.assertEqual(other.get(url).status_code, 401)
+        other.force_authenticate(User.objects.create_user('someone', password='pass'))
+        self.assertEqual(other.get(url).status_code, 404)
+        other.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.assertEqual(other.get(url).status_code, 200)
+        self.assertNotIn('locked_by', self.client.get(url).data)
+
+    def test_business_failures_are_not_retried(self):
+        order_id = self._order(50)
+        job_id = self.client.post(f'/api/orders/{order_id}/confirm/?async=1').data['job']
+        jobs.work(once=True)
+        job = models.Job.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.attempts), ('FAILED', 1))
+        self.assertEqual(job.result['items'][0]['requested'], 50)
+
+    def test_errors_are_retried_with_backoff_then_fail(self):
+        calls = []
+
+        @jobs.handler('flaky')
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError('boom')
+
+        self.addCleanup(jobs.HANDLERS.pop, 'flaky')
+        job = jobs.enqueue('flaky', {'n': 1}, max_attempts=2)
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 1))
+        self.assertIn('Traceback', job.error)
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.assertEqual(self.client.get(f'/api/jobs/{job.pk}/').data['error'], 'RuntimeError: boom')
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(jobs.claim())
+        models.Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), ('FAILED', 2, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_claims_are_exclusive_and_stale_jobs_requeued(self):
+        first = jobs.enqueue('backfill_reports')
+        second = jobs.enqueue('backfill_reports')
+        self.assertEqual(jobs.claim('a').pk, first.pk)
+        self.assertEqual(jobs.claim('b').pk, second.pk)
+        self.assertIsNone(jobs.claim('c'))
+        models.Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(stale_after=60), 1)
+        self.assertEqual(jobs.claim('c').pk, first.pk)
+
+    def test_async_bulk_and_job_listing(self):
+        ids = [self._order(1), self._order(1)]
+        res = self.client.post('/api/orders/bulk-confirm/?async=true', {'ids': ids}, format='json')
+        self.assertEqual(res.status_code, 202)
+        call_command('run_workers', '--once', stdout=io.StringIO())
+        job = models.Job.objects.get(pk=res.data['job'])
+        self.assertEqual(job.result['succeeded'], 2)
+        self.assertEqual(self.client.get('/api/jobs/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.assertEqual(self.client.post('/api/reports/backfill/').status_code, 202)
+        res = self.client.get('/api/jobs/?status=queued')
+        self.assertEqual([row['kind'] for row in res.data['results']], ['backfill_reports'])
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.prod = models.Product.objects.create(name='Brake Pad', sku='BP-001', price=Decimal('10.00'))
+        models.Inventory.objects.create(product=self.prod, quantity=10)
+
+    def _order(self, quantity):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': quantity}]}
+        return self.client.post('/api/orders/', payload, format='json').data['id']
+
+    def _events(self, **params):
+        resp = self.client.get('/api/events/', params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_order_and_stock_changes_publish_events(self):
+        start = self._events(since='latest')['next']
+        delivered, deleted, cancelled = self._order(2), self._order(3), self._order(1)
+        self.client.post(f'/api/orders/{delivered}/confirm/')
+        self.client.post(f'/api/orders/{delivered}/deliver/')
+        self.client.post(f'/api/orders/{deleted}/confirm/')
+        self.client.delete(f'/api/orders/{deleted}/')
+        self.client.post(f'/api/orders/{cancelled}/cancel/')
+        feed = self._events(since=start, topic='order')
+        self.assertEqual(
+            [(event['kind'], event['key']) for event in feed['events']],
+            [('order.confirmed', delivered), ('order.delivered', delivered), ('order.confirmed', deleted),
+             ('order.deleted', deleted), ('order.cancelled', cancelled)],
+        )
+        self.assertEqual(feed['events'][1]['payload']['status'], 'DELIVERED')
+        stock_events = self._events(since=start, topic='stock')['events']
+        self.assertEqual(len(stock_events), 4)
+        self.assertEqual(stock_events[-1]['payload'], {'product': self.prod.id, 'sku': 'BP-001', 'available': 8, 'reserved': 0, 'on_hand': 8})
+        self.assertEqual(self._events(since=feed['next'], topic='order'), {'next': feed['next'], 'events': []})
+
+    def test_rolled_back_changes_publish_nothing(self):
+        order_id = self._order(50)
+        start = self._events(since='latest')['next']
+        self.assertEqual(self.client.post(f'/api/orders/{order_id}/confirm/').status_code, 400)
+        self.assertEqual(self._events(since=start)['events'], [])
+
+    def test_cursor_paging_and_bad_params(self):
+        ids = [self._order(1) for _ in range(3)]
+        self.client.post('/api/orders/bulk-cancel/', {'ids': ids}, format='json')
+        first = self._events(topic='order', limit=2)
+        self.assertEqual([event['key'] for event in first['events']], ids[:2])
+        second = self._events(topic='order', since=first['next'])
+        self.assertEqual([event['key'] for event in second['events']], ids[2:])
+        for params in ({'since': 'x'}, {'topic': 'dealers'}, {'wait': 'long'}):
+            self.assertEqual(self.client.get('/api/events/', params).status_code, 400)
+
+    def test_writer_lock_is_taken_before_any_row_lock(self):
+        confirmed, cancelled = self._order(1), self._order(1)
+        inventory = models.Inventory.objects.get(product=self.prod)
+        steps = [
+            lambda: self.client.post(f'/api/orders/{confirmed}/confirm/'),
+            lambda: self.client.post(f'/api/orders/{confirmed}/deliver/'),
+            lambda: self.client.post(f'/api/orders/{cancelled}/cancel/'),
+            lambda: stock.adjust([(self.prod.id, 5, 'count')]),
+            lambda: inventory.save(),
+            lambda: self.client.delete(f'/api/orders/{confirmed}/'),
+        ]
+        for step in steps:
+            locked_after = []
+            with CaptureQueriesContext(connection) as ctx, \
+                    mock.patch('sales.outbox.lock_writers', side_effect=lambda: locked_after.append(len(ctx.captured_queries))):
+                step()
+            self.assertTrue(locked_after)
+            earlier = [query['sql'].split()[0].upper() for query in ctx.captured_queries[:locked_after[0]]]
+            self.assertFalse({'UPDATE', 'INSERT', 'DELETE'} & set(earlier), earlier)
+            self.assertFalse(any('FOR UPDATE' in query['sql'] for query in ctx.captured_queries[:locked_after[0]]))
+
+    def test_prune_outbox_keeps_recent_events(self):
+        outbox.stock_changed([self.prod.id])
+        models.OutboxEvent.objects.update(created_at=timezone.now() - datetime.timedelta(days=8))
+        outbox.stock_changed([self.prod.id])
+        call_command('prune_outbox', '--days', '7', stdout=io.StringIO())
+        self.assertEqual(models.OutboxEvent.objects.count(), 1)
+
+    def test_feeds_require_admin(self):
+        anonymous = APIClient()
+        staffless = APIClient()
+        staffless.force_authenticate(User.objects.create_user('clerk', password='pass'))
+        for url in ('/api/events/', '/api/events/stream/?timeout=0'):
+            self.assertEqual(anonymous.get(url).status_code, 401)
+            self.assertEqual(staffless.get(url).status_code, 403)
+
+    def test_sse_stream_under_wsgi_is_not_buffered(self):
+        outbox.stock_changed([self.prod.id])
+        resp = self.client.get('/api/events/stream/?timeout=0')
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        # a plain iterator: the WSGI server sends each chunk as it is produced
+        self.assertFalse(resp.is_async)
+        body = b''.join(resp.streaming_content).decode()
+        self.assertEqual(body.count('event: stock.changed'), 2)
+
+    async def test_sse_stream_resumes_from_last_event_id(self):
+        await self.async_client.aforce_login(self.admin)
+        await sync_to_async(models.OutboxEvent.objects.all().delete)()
+        await sync_to_async(models.Inventory.objects.filter(product=self.prod).update)(quantity=10)
+        await sync_to_async(outbox.stock_changed)([self.prod.id])
+        await sync_to_async(outbox.stock_changed)([self.prod.id])
+        first_id = await models.OutboxEvent.objects.order_by('id').values_list('id', flat=True).afirst()
+        resp = await self.async_client.get('/api/events/stream/?timeout=0', headers={'Last-Event-ID': str(first_id)})
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in resp.streaming_content]).decode()
+        self.assertEqual(body.count('event: stock.changed'), 1)
+        self.assertIn(f'id: {first_id + 1}\n', body)
+
+
+class DeltaSyncTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = [models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='10.00') for i in range(5)]
+        for product in self.products:
+            models.Inventory.objects.create(product=product, quantity=10)
+        # everything so far happened an hour ago
+        self.hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        for model in (models.Product, models.Dealer, models.Inventory):
+            model.objects.update(updated_at=self.hour_ago)
+        self.since = (timezone.now() - datetime.timedelta(minutes=30)).isoformat()
+
+    def _sync(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_full_sync_pages_to_a_watermark(self):
+        seen, url, params = [], '/api/products/', {'updated_since': '', 'limit': 2}
+        while True:
+            page = self._sync(url, **params)
+            self.assertTrue(page['reset'])
+            seen += [row['id'] for row in page['changed']]
+            if not page['next']:
+                break
+            self.assertIsNone(page['watermark'])
+            url, params = page['next'], {}
+        self.assertEqual(seen, [product.id for product in self.products])
+        self.assertEqual(page['changed'][-1]['price'], '10.00')
+        self.assertIsNotNone(page['watermark'])
+
+    def test_delta_returns_changes_and_tombstones_only(self):
+        changed, deleted = self.products[1], self.products[3]
+        changed.price = Decimal('12.50')
+        changed.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        page = self._sync('/api/products/', updated_since=self.since)
+        self.assertFalse(page['reset'])
+        self.assertEqual([(row['id'], row['price']) for row in page['changed']], [(changed.id, '12.50')])
+        self.assertEqual(page['deleted'], [deleted_id])
+        self.assertEqual(self._sync('/api/dealers/', updated_since=self.since)['changed'], [])
+
+    def test_stock_changes_reach_the_inventory_delta(self):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': self.products[2].id, 'quantity': 4}]}
+        order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        self.client.post(f'/api/orders/{order_id}/confirm/')
+        page = self._sync('/api/inventory/', updated_since=self.since)
+        self.assertEqual(
+            [(row['product'], row['quantity'], row['reserved']) for row in page['changed']],
+            [(self.products[2].id, 6, 4)],
+        )
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/inventory/', {'updated_since': self.since}).status_code, 401)
+
+    def test_watermark_covers_a_writer_committing_late(self):
+        before = timezone.now()
+        watermark = self._sync('/api/products/', updated_since=self.since)['watermark']
+        # a writer that stamped its row just before the sync but committed
+        # after it, having waited out the busy timeout for the write lock
+        busy = datetime.timedelta(seconds=connection.settings_dict['OPTIONS'].get('timeout', 5))
+        models.Product.objects.filter(pk=self.products[0].pk).update(updated_at=before - busy)
+        page = self._sync('/api/products/', updated_since=watermark)
+        self.assertEqual([row['id'] for row in page['changed']], [self.products[0].id])
+
+    def test_bad_or_expired_watermarks(self):
+        self.assertEqual(self.client.get('/api/products/', {'updated_since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/', {'updated_since': '', 'after': 'junk'}).status_code, 400)
+        expired = (timezone.now() - datetime.timedelta(days=sync.TOMBSTONE_DAYS + 1)).isoformat()
+        page = self._sync('/api/dealers/', updated_since=expired)
+        self.assertTrue(page['reset'])
+        self.assertEqual([row['id'] for row in page['changed']], [self.dealer.id])
+
+    def test_prune_tombstones(self):
+        self.products[0].delete()
+        models.Tombstone.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=sync.TOMBSTONE_DAYS + 1))
+        kept = (self.products[1].inventory.id, self.products[1].id)
+        self.products[1].delete()
+        call_command('prune_tombstones', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(models.Tombstone.objects.values_list('model', 'object_id')),
+            [('inventory', kept[0]), ('product', kept[1])],
+        )
+
+
+class FastListTest(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        dealer = models.Dealer.objects.create(name='Śrī Motors \u2028', code='SRI', email='a@example.com')
+        models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = [
+            models.Product.objects.create(name=f'Pad {i} ü', sku=f'P-{i:03d}', price=Decimal('1234567.5') / (i + 1))
+            for i in range(4)
+        ]
+        for product in self.products[:3]:
+            models.Inventory.objects.create(product=product, quantity=10)
+        for count in (1, 3, 0):
+            payload = {'dealer': dealer.id, 'items': [{'product': p.id, 'quantity': 2} for p in self.products[:count]]}
+            self.client.post('/api/orders/', payload, format='json')
+        models.Order.objects.create(dealer=dealer, total_amount=Decimal('0'), order_number=None)
+
+    def _both(self, url):
+        django_cache.clear()
+        fast = self.client.get(url)
+        django_cache.clear()
+        with mock.patch.object(fast_serializers, 'compile_serializer', return_value=None), \
+                mock.patch.object(renderers, 'orjson', None):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        return fast.content, slow.content
+
+    def test_list_pages_match_the_serializer_byte_for_byte(self):
+        for url in ('/api/products/?page_size=2', '/api/products/?fields=id,price,stock', '/api/dealers/',
+                    '/api/orders/', '/api/orders/?page_size=2', '/api/orders/?fields=id,total_amount,status'):
+            fast, slow = self._both(url)
+            self.assertEqual(fast, slow, url)
+        self.assertIn(b'"next":"http', self._both('/api/orders/?page_size=2')[0])
+
+    def test_fast_path_skips_per_row_queries(self):
+        django_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/orders/')
+        # the page of orders plus one query for all their items
+        self.assertEqual(len(ctx), 2)
+
+    def test_renderer_matches_stdlib(self):
+        data = {
+            'text': 'a\u2028b\u2029c "q" \\ \x01 é', 'when': timezone.now(), 'price': Decimal('12.50'),
+            'floats': [0.1, 2.5, 1e16, 1e-05], 'big': 2 ** 70, 'none': None, 'items': ('x', True),
+        }
+        stdlib = JSONRenderer().render(data)
+        self.assertEqual(renderers.FastJSONRenderer().render(data), stdlib)
+        del data['floats'], data['big']
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_renderer_refuses_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), -float('inf')):
+            with self.assertRaises(ValueError):
+                renderers.FastJSONRenderer().render({'x': [None, value]})
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.client = APIClient()
+        self.prod = models.Product.objects.create(name='Brake Pad', sku='BP-001', price='500.00')
+        self.inv = models.Inventory.objects.create(product=self.prod, quantity=100)
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+
+    def test_list_served_from_cache_with_etag(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/products/')
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual(first.content, second.content)
+        resp = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_stock_changes_invalidate(self):
+        resp = self.client.get(f'/api/products/{self.prod.id}/')
+        self.assertEqual(resp.json()['stock'], 100)
+        order = self.client.post('/api/orders/', {'dealer': self.dealer.id, 'items': [{'product': self.prod.id, 'quantity': 10}]}, format='json')
+        self.client.post(f"/api/orders/{order.data['id']}/confirm/")
+        resp = self.client.get(f'/api/products/{self.prod.id}/')
+        self.assertEqual(resp.json()['stock'], 90)
+        self.inv.quantity = 5
+        self.inv.save()
+        resp = self.client.get('/api/products/')
+        self.assertEqual(resp.json()['results'][0]['stock'], 5)
+
+
+class BulkAdjustTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.products = [models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='10.00') for i in range(3)]
+        models.Inventory.objects.create(product=self.products[0], quantity=10)
+
+    def test_json_rows_applied_with_row_errors(self):
+        rows = [
+            {'sku': 'P-000', 'change': 5, 'note': 'count'},
+            {'product_id': self.products[1].id, 'change': 7},
+            {'sku': 'P-000', 'change': -2},
+            {'sku': 'NOPE', 'change': 1},
+            {'sku': 'P-002', 'change': 'x'},
+        ]
+        resp = self.client.post('/api/inventory/bulk-adjust/', rows, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['applied'], 3)
+        self.assertEqual([e['row'] for e in resp.data['errors']], [3, 4])
+        stock_levels = dict(models.Inventory.objects.values_list('product__sku', 'quantity'))
+        self.assertEqual(stock_levels, {'P-000': 13, 'P-001': 7})
+        self.assertEqual(models.InventoryAdjustment.objects.count(), 3)
+        self.assertEqual(models.InventoryAdjustment.objects.filter(changed_by__username='admin').count(), 3)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('stock.csv', b'sku,change,note\nP-001,4,take\nP-002,6,take\n', content_type='text/csv')
+        resp = self.client.post('/api/inventory/bulk-adjust/', {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, {'applied': 2, 'errors': []})
+        self.assertEqual(models.Inventory.objects.get(product=self.products[2]).quantity, 6)
+
+    def test_malformed_rows_rejected(self):
+        rows = [{'sku': 123, 'change': 1}, {'sku': 'P-000', 'change': 2.5}, {'sku': 'P-000', 'change': '1.5'},
+                {'sku': 'P-000', 'change': 3.0}]
+        resp = self.client.post('/api/inventory/bulk-adjust/', rows, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['applied'], 1)
+        self.assertEqual(resp.data['errors'][0]['errors'], {'sku': ['Unknown sku "123".']})
+        self.assertEqual([e['row'] for e in resp.data['errors']], [0, 1, 2])
+        upload = SimpleUploadedFile('stock.csv', b'sku,change\n\xff\xfe,1\n', content_type='text/csv')
+        resp = self.client.post('/api/inventory/bulk-adjust/', {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_non_integer_product_ids_rejected(self):
+        pid = self.products[0].id
+        rows = [{'product_id': pid + 0.5, 'change': 1}, {'product_id': True, 'change': 1},
+                {'product_id': f'{pid}.5', 'change': 1}, {'product_id': str(pid), 'change': 1}]
+        resp = self.client.post('/api/inventory/bulk-adjust/', rows, format='json')
+        self.assertEqual(resp.data['applied'], 1)
+        self.assertEqual([e['row'] for e in resp.data['errors']], [0, 1, 2])
+        self.assertEqual(resp.data['errors'][1]['errors'], {'product_id': ['A valid integer is required.']})
+        self.assertEqual(models.Inventory.objects.get(product=self.products[0]).quantity, 11)
+
+    def test_non_string_notes_rejected(self):
+        rows = [{'sku': 'P-000', 'change': 1, 'note': ['a']}, {'sku': 'P-000', 'change': 1, 'note': 5},
+                {'sku': 'P-000', 'change': 1, 'note': None}]
+        resp = self.client.post('/api/inventory/bulk-adjust/', rows, format='json')
+        self.assertEqual(resp.data['applied'], 1)
+        self.assertEqual(resp.data['errors'][0]['errors'], {'note': ['Not a valid string.']})
+        self.assertEqual([e['row'] for e in resp.data['errors']], [0, 1])
+
+    def test_scalar_body_rejected(self):
+        for body in (5, 'rows', {'rows': 5}):
+            resp = self.client.post('/api/inventory/bulk-adjust/', body, format='json')
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.data['detail'], 'Provide a list of rows or a CSV file')
+
+
+class AvailabilityTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        self.products = []
+        for i in range(3):
+            prod = models.Product.objects.create(name=f'Part {i}', sku=f'P-{i:03d}', price='10.00')
+            models.Inventory.objects.create(product=prod, quantity=5)
+            self.products.append(prod)
+
+    def test_cart_checked_in_one_query(self):
+        rows = [
+            {'sku': 'P-000', 'quantity': 2},
+            {'product': self.products[1].id, 'quantity': 9},
+            {'sku': 'P-000', 'quantity': 2},
+            {'sku': 'NOPE', 'quantity': 1},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post('/api/inventory/availability/', rows, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(ctx), 1)
+        self.assertFalse(resp.data['confirmable'])
+        by_sku = {item['sku']: item for item in resp.data['items']}
+        self.assertEqual((by_sku['P-000']['requested'], by_sku['P-000']['shortfall']), (4, 0))
+        self.assertEqual(by_sku['P-001']['shortfall'], 4)
+        self.assertEqual(resp.data['insufficient'][0]['message'], 'Insufficient stock for Part 1. Available: 5, Requested: 9')
+        self.assertEqual(resp.data['errors'], [{'row': 3, 'errors': {'sku': ['Unknown sku "NOPE".']}}])
+
+    def test_draft_dry_run_matches_confirm(self):
+        payload = {'dealer': self.dealer.id, 'items': [{'product': p.id, 'quantity': q} for p, q in zip(self.products, (1, 6, 8))]}
+        order_id = self.client.post('/api/orders/', payload, format='json').data['id']
+        anonymous = self.client.post('/api/inventory/availability/', {'order': order_id}, format='json')
+        self.assertIn(anonymous.status_code, (401, 403))
+        self.client.force_authenticate(user=User.objects.create_user('dealer', 'dealer@example.com', 'pass'))
+        dry_run = self.client.post('/api/inventory/availability/', {'order': order_id}, format='json')
+        confirm = self.client.post(f'/api/orders/{order_id}/confirm/')
+        self.assertEqual(confirm.status_code, 400)
+        self.assertEqual(dry_run.data['insufficient'], confirm.data['items'])
+        self.assertEqual(dry_run.data['detail'], confirm.data['detail'])
+        self.assertEqual(list(models.Inventory.objects.values_list('quantity', flat=True)), [5, 5, 5])
+
+    def test_invalid_input(self):
+        resp = self.client.post('/api/inventory/availability/', {'items': [{'sku': 'P-000', 'quantity': 0}]}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['errors'][0]['errors'], {'quantity': ['A positive integer is required.']})
+        for body in (5, 'P-000', {'items': 5}):
+            resp = self.client.post('/api/inventory/availability/', body, format='json')
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.data['detail'], 'Provide a list of items or an order')
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.prod = models.Product.objects.create(name='Brake Pad', sku='BP-001', price='500.00')
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        other = models.Dealer.objects.create(name='XYZ Motors', code='XYZ')
+        for dealer, order_status in [(self.dealer, 'CONFIRMED'), (self.dealer, 'DRAFT'), (other, 'CONFIRMED')]:
+            order = models.Order.objects.create(dealer=dealer, status=order_status, total_amount='1000.00')
+            models.OrderItem.objects.create(order=order, product=self.prod, quantity=2, unit_price=self.prod.price)
+
+    def test_csv_export_filters_in_sql(self):
+        resp = self.client.get(f'/api/orders/export/?status=CONFIRMED&dealer={self.dealer.id}')
+        self.assertEqual(resp.status_code, 200)
+        rows = list(csv.reader(io.StringIO(b''.join(resp.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'order_number', 'dealer_id'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][5], '1000.00')
+
+    def test_ndjson_line_export(self):
+        today = timezone.localdate().isoformat()
+        resp = self.client.get(f'/api/orders/export-lines/?output=ndjson&created_from={today}&created_to={today}')
+        lines = [json.loads(line) for line in b''.join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0]['product_sku'], 'BP-001')
+        self.assertEqual(lines[0]['line_total'], '1000.00')
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_orders', '--lines', '--status', 'draft', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class OrderImportTest(TestCase):
+    CSV = (
+        'order_ref,dealer_code,sku,quantity\n'
+        'A1,ABC,BP-001,2\n'
+        'A1,ABC,BP-002,3\n'
+        'A2,ABC,BP-001,1\n'
+        'A3,NOPE,BP-001,1\n'
+        'A4,ABC,BP-999,1\n'
+        'A5,ABC,BP-002,4\n'
+    )
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+        models.Product.objects.create(name='Brake Pad', sku='BP-001', price='500.00')
+        models.Product.objects.create(name='Oil Filter', sku='BP-002', price='100.00')
+
+    def test_upload_imports_valid_orders_in_batches(self):
+        upload = SimpleUploadedFile('orders.csv', self.CSV.encode(), content_type='text/csv')
+        resp = self.client.post('/api/orders/import/?batch_size=2', {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((resp.data['orders'], resp.data['lines']), (3, 4))
+        self.assertEqual([e['row'] for e in resp.data['errors']], [5, 6])
+        order = models.Order.objects.get(items__product_sku='BP-002', total_amount='1300.00')
+        self.assertEqual(order.items.count(), 2)
+        numbers = sorted(models.Order.objects.values_list('order_number', flat=True))
+        self.assertEqual([n[-4:] for n in numbers], ['0001', '0002', '0003'])
+
+    def test_upload_not_utf8_rejected(self):
+        for name in ('orders.csv', 'orders.ndjson'):
+            upload = SimpleUploadedFile(name, b'\xff\xfe\x00A1\n', content_type='text/csv')
+            resp = self.client.post('/api/orders/import/', {'file': upload}, format='multipart')
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.data['detail'], 'The file must be a UTF-8 encoded CSV or NDJSON file')
+        self.assertFalse(models.Order.objects.exists())
+
+    def test_command_writes_error_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'orders.ndjson')
+            errors = os.path.join(tmp, 'errors.csv')
+            with open(source, 'w') as out:
+                for line in self.CSV.splitlines()[1:]:
+                    ref, dealer, sku, quantity = line.split(',')
+                    out.write(json.dumps({'order_ref': ref, 'dealer_code': dealer, 'sku': sku, 'quantity': quantity}) + '\n')
+                out.write('not json\n')
+            call_command('import_orders', source, '--errors', errors, stdout=io.StringIO())
+            with open(errors) as fh:
+                rejected = list(csv.DictReader(fh))
+        self.assertEqual(models.Order.objects.count(), 3)
+        self.assertEqual([r['order_ref'] for r in rejected], ['A3', 'A4', ''])
+
+    def test_command_rejects_non_utf8_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'orders.csv')
+            with open(source, 'wb') as out:
+                out.write(b'\xff\xfe\x00A1\n')
+            with self.assertRaises(CommandError):
+                call_command('import_orders', source, stdout=io.StringIO())
+
+
+class QueryCountRegressionTest(TestCase):
+    """
+    Guards against endpoints slipping back into per-line queries: the
+    query count of every benchmarked endpoint must not depend on order size.
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        benchmarks.seed_catalog(products=60, dealers=3, orders=4, max_lines=10)
+
+    def test_query_counts_do_not_grow_with_input(self):
+        results = benchmarks.run_benchmarks(lines=(1, 40), iterations=2)
+        self.assertEqual(benchmarks.query_growth(results), {})
+        self.assertEqual(results['product_list']['page']['queries'], 1)
+
+
+@override_settings(SALES_PERF_ENABLED=True)
+class PerfMiddlewareTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        perf.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.dealer = models.Dealer.objects.create(name='ABC Motors', code='ABC')
+
+    def test_server_timing_and_report(self):
+        resp = self.client.get(f'/api/dealers/{self.dealer.id}/')
+        self.assertIn('db;dur=', resp['Server-Timing'])
+        self.assertIn('render;dur=', resp['Server-Timing'])
+        self.assertIn('serialize;dur=', resp['Server-Timing'])
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.get('/api/_perf/')
+        self.assertEqual(resp.status_code, 200)
+        endpoints = [e['endpoint'] for e in resp.data['slowest_endpoints']]
+        self.assertIn('GET dealer-detail', endpoints)
+
+    def test_serializer_time_measured_apart_from_rendering(self):
+        # the dealer detail serializes through DRF, the list through compiled rows
+        for url in (f'/api/dealers/{self.dealer.id}/', '/api/dealers/'):
+            self.client.get(url)
+        self.assertEqual(len(perf.records()), 2)
+        for record in perf.records():
+            self.assertGreater(record['serialize_ms'], 0)
+            self.assertGreater(record['render_ms'], 0)
+
+    def test_recorder_flags_repeated_statements(self):
+        recorder = perf.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for dealer_id in (1, 2, 3):
+                list(models.Dealer.objects.filter(id__in=[dealer_id] * dealer_id))
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.duplicates()[0][1], 3)
+
+    def test_report_requires_staff(self):
+        self.assertIn(self.client.get('/api/_perf/').status_code, (401, 403))
+
+
+class DatabaseProfileTest(TestCase):
+    @skipUnless(connection.vendor == 'sqlite' and connection.settings_dict['OPTIONS'].get('init_command'),
+                'SQLite tuning is disabled')
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = connections['default'].__class__({**connection.settings_dict, 'NAME': os.path.join(tmp, 'profile.sqlite3')}, alias='profile')
+            try:
+                with db.cursor() as cursor:
+                    pragmas = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        pragmas[pragma] = cursor.fetchone()[0]
+            finally:
+                db.close()
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertGreater(pragmas['busy_timeout'], 5000)
+        self.assertGreater(pragmas['mmap_size'], 0)
+
+    @skipUnless(connection.vendor == 'sqlite', 'checks the SQLite profile')
+    def test_connections_are_reused_with_health_checks(self):
+        self.assertGreater(settings.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertTrue(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    def test_long_job_is_not_requeued_while_running(self):
+        results = []
+
+        @jobs.handler('slow')
+        def slow(payload):
+            time.sleep(0.5)
+            # the heartbeat kept this job fresh, so a sweep leaves it alone
+            results.append(jobs.requeue_stale(stale_after=0.3))
+            return 'done'
+
+        self.addCleanup(jobs.HANDLERS.pop, 'slow')
+        job = jobs.enqueue('slow')
+        jobs.run(jobs.claim('w'), heartbeat_interval=0.05)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, results), ('SUCCEEDED', 'done', [0]))
+
+
+class ConcurrentConfirmTest(TransactionTestCase):
+    def test_hot_sku_is_never_oversold(self):
+        result = benchmarks.stress_confirm(threads=6, orders_per_thread=5, quantity=2, stock=20)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['confirmed'], 10)
+        self.assertEqual(result['final_stock'], 0)
+        self.assertEqual(models.Order.objects.filter(status='CONFIRMED').count(), 10)
+
+    def test_order_load_creates_and_confirms_without_errors(self):
+        benchmarks.seed_catalog(products=30, dealers=3, stock=1000)
+        # one thread: the in-memory test database is shared-cache, where
+        # concurrent writers get table locks instead of waiting on the busy
+        # timeout (bench_sales --order-load runs on a database file)
+        result = benchmarks.load_orders(concurrency=1, orders=12, lines=3)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['requests'], 12)
+        self.assertEqual(result['profile']['vendor'], connection.vendor)
+        self.assertEqual(models.Order.objects.filter(status='CONFIRMED').count(), 12)
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox, reports, stock
+from .models import Order
+
+MAX_BULK_ORDERS = 1000
+
+MODE_PARTIAL = 'partial'
+MODE_ALL_OR_NOTHING = 'all_or_nothing'
+MODES = (MODE_PARTIAL, MODE_ALL_OR_NOTHING)
+
+
+class TransitionConflict(Exception):
+    """
+    Raised when an order or its stock changed between the checks and the
+    writes of a bulk transition, which only happens without row locks
+    (e.g. the conditional stock mode on PostgreSQL). Nothing is written.
+    """
+
+
+def _failed(pk, detail, **extra):
+    return {'id': pk, 'ok': False, 'detail': detail, **extra}
+
+
+def _claim(orders, from_status, to_status, timestamp_field):
+    # one guarded UPDATE for the whole batch; the rows are locked, so all must match
+    now = timezone.now()
+    updated = Order.objects.filter(pk__in=[order.pk for order in orders], status=from_status).update(
+        status=to_status, updated_at=now, **{timestamp_field: now},
+    )
+    if updated != len(orders):
+        raise TransitionConflict
+    for order in orders:
+        order.status = to_status
+        order.updated_at = now
+        setattr(order, timestamp_field, now)
+
+
+def _run(order_ids, from_status, wrong_status, mode, check, write):
+    """
+    Shared driver of the bulk transitions. Locks the orders in id order,
+    fails the missing ones and those not in `from_status`, lets `check`
+    reject more (it returns the accepted orders and adds failures to the
+    results), then calls `write` once for everything accepted. In
+    all-or-nothing mode a single failure means nothing is written.
+    Returns one result per distinct id, in request order.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    results = {}
+    with transaction.atomic():
+        outbox.lock_writers()
+        orders = {
+            order.pk: order
+            for order in Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk')
+        }
+        eligible = []
+        for pk in order_ids:
+            order = orders.get(pk)
+            if order is None:
+                results[pk] = _failed(pk, 'Not found.')
+            elif order.status != from_status:
+                results[pk] = _failed(pk, wrong_status)
+            else:
+                eligible.append(order)
+        accepted = check(eligible, results) if eligible else []
+        if mode == MODE_ALL_OR_NOTHING and len(accepted) < len(order_ids):
+            for order in accepted:
+                results[order.pk] = _failed(order.pk, 'Not applied: another order in the batch failed')
+            accepted = []
+        if accepted:
+            write(accepted)
+        for order in accepted:
+            results[order.pk] = {'id': order.pk, 'ok': True, 'status': order.status}
+    return [results[pk] for pk in order_ids]
+
+
+def confirm_orders(order_ids, mode=MODE_PARTIAL):
+    """
+    Confirms many draft orders at once. The inventory of every involved
+    product is locked once, in product id order, and orders are accepted
+    in request order while their demand still fits what is left; the
+    summed demand of the accepted orders is then reserved in one pass.
+    """
+    order_lines = {}
+
+    def check(orders, results):
+        order_lines.update(stock.lines_by_order([order.pk for order in orders]))
+        product_ids = {line[0] for lines in order_lines.values() for line in lines if line[0] is not None}
+        if stock.stock_mode() == 'locking':
+            remaining = stock.lock_inventories(product_ids)
+        else:
+            # checked again by the guarded UPDATEs of reserve_conditional
+            remaining = stock.current_stock(product_ids)
+        accepted = []
+        for order in orders:
+            demand, insufficient = stock.check_availability(order_lines[order.pk], remaining)
+            if insufficient:
+                error = stock.InsufficientStock(insufficient)
+                results[order.pk] = _failed(order.pk, error.detail, items=error.items)
+                continue
+            for pid, quantity in demand.items():
+                remaining[pid] -= quantity
+            accepted.append(order)
+        return accepted
+
+    def write(orders):
+        _claim(orders, Order.STATUS_DRAFT, Order.STATUS_CONFIRMED, 'confirmed_at')
+        try:
+            stock.reserve_orders([(order.order_number or '', order_lines[order.pk]) for order in orders])
+        except stock.InsufficientStock:
+            raise TransitionConflict
+        reports.record_confirmations(orders)
+        outbox.order_changed('order.confirmed', orders)
+
+    return _run(order_ids, Order.STATUS_DRAFT, 'Only Draft orders can be confirmed', mode, check, write)
+
+
+def deliver_orders(order_ids, mode=MODE_PARTIAL):
+    """
+    Marks many confirmed orders delivered with one guarded UPDATE and
+    ships their reserved stock in one pass.
+    """
+    def write(orders):
+        _claim(orders, Order.STATUS_CONFIRMED, Order.STATUS_DELIVERED, 'delivered_at')
+        order_lines = stock.lines_by_order([order.pk for order in orders])
+        stock.ship_orders([(order.order_number or '', order_lines[order.pk]) for order in orders])
+        reports.record_deliveries(orders)
+        outbox.order_changed('order.delivered', orders)
+
+    return _run(order_ids, Order.STATUS_CONFIRMED, 'Only Confirmed orders can be delivered', mode,
+                lambda orders, _results: orders, write)
+
+
+def cancel_orders(order_ids, mode=MODE_PARTIAL):
+    """
+    Cancels many draft orders with one guarded UPDATE. Drafts hold no
+    stock, so nothing else changes.
+    """
+    def write(orders):
+        _claim(orders, Order.STATUS_DRAFT, Order.STATUS_CANCELLED, 'canceled_at')
+        reports.record_cancellations(orders)
+        outbox.order_changed('order.cancelled', orders)
+
+    return _run(order_ids, Order.STATUS_DRAFT, 'Only Draft orders can be cancelled', mode,
+                lambda orders, _results: orders, write)
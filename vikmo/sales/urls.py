@@ -1,5 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from . import views
+from . import async_views
 from . import auth_views
 from django.urls import path
 
@@ -8,10 +9,19 @@ router.register(r'products', views.ProductViewSet, basename='product')
 router.register(r'dealers', views.DealerViewSet, basename='dealer')
 router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'inventory', views.InventoryViewSet, basename='inventory')
+router.register(r'reports', views.ReportViewSet, basename='report')
+router.register(r'jobs', views.JobViewSet, basename='job')
 
 urlpatterns = router.urls + [
     path('auth/login/', auth_views.LoginView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', auth_views.RefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', auth_views.logout_view, name='token_logout'),
     path('auth/me/', auth_views.me_view, name='token_me'),
+    path('_perf/', views.perf_report, name='perf_report'),
+    path('async/products/', async_views.product_list, name='async_product_list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async_product_detail'),
+    path('async/orders/<int:pk>/', async_views.order_detail, name='async_order_detail'),
+    path('async/stock/', async_views.stock_lookup, name='async_stock_lookup'),
+    path('events/', async_views.events_feed, name='events_feed'),
+    path('events/stream/', async_views.events_stream, name='events_stream'),
 ]
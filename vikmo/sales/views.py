@@ -1,35 +1,185 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAdminUser, IsAuthenticatedOrReadOnly
+import csv
+import io
+from decimal import Decimal
+
+from rest_framework import exceptions, viewsets, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from django.db import transaction
-from django.db.models import F
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from . import models, serializers
+from . import cache, exports, fast_serializers, imports, jobs, lines, models, pagination, perf, reports, search, serializers, stock, sync, transitions
+
+
+def wants_async(request):
+    # `?async=1` asks for 202 + job id instead of doing the work in the request
+    return request.query_params.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def job_accepted(request, kind, payload):
+    # only the job's creator (or staff) can poll it, so it needs a user
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated('Log in to queue a background job')
+    job = jobs.enqueue(kind, payload, user=request.user)
+    url = reverse('job-detail', args=[job.pk], request=request)
+    return Response({'job': job.pk, 'status': job.status, 'url': url},
+                    status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+
+def delta_response(request, kind):
+    """
+    Answers a list request carrying `?updated_since=` with the changed
+    rows and tombstones of `kind` (see sales.sync) instead of a page of
+    the whole list.
+    """
+    try:
+        params = sync.parse_params(request.query_params)
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    # the first page waits for the SQLite write lock (see sync._horizon)
+    page = stock.run_with_retries(lambda: sync.changes(kind, **params))
+    after = page.pop('after')
+    page['next'] = replace_query_param(request.build_absolute_uri(), 'after', after) if after else None
+    return Response(page)
+
 
+class FastListMixin:
+    """
+    Builds list pages from `.values()` rows with the compiled form of the
+    view's serializer (sales.fast_serializers): the same JSON without a
+    model instance and a field-by-field to_representation per row. Views
+    whose serializer does not compile keep DRF's list.
+    """
 
-class ProductViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        rows = fast_serializers.compile_serializer(self.get_serializer())
+        if rows is None or self.paginator is None:
+            return super().list(request, *args, **kwargs)
+        # the cursor paginator reads its position from the ordering columns
+        ordering = [name.lstrip('-') for name in getattr(self.paginator, 'ordering', ())]
+        columns = dict.fromkeys([*rows.lookups, 'pk', *ordering])
+        qs = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(qs)
+        return self.get_paginated_response(rows.to_dicts(page))
+
+
+class ProductViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = models.Product.objects.all().select_related('inventory')
     serializer_class = serializers.ProductSerializer
+    pagination_class = pagination.ProductCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        active = self.request.query_params.get('active')
+        if self.action == 'list' and active is not None:
+            qs = qs.filter(active=active.lower() in ('1', 'true', 'yes'))
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        if sync.requested(request):
+            return delta_response(request, models.Tombstone.MODEL_PRODUCT)
+        return cache.cached_catalog_response(request, 'list', lambda: super(ProductViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        scope = f"product:{kwargs.get('pk')}"
+        return cache.cached_catalog_response(request, scope, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Typeahead search over name, SKU and description: `?q=` text,
+        `?limit=` (default 20, at most 100) and `?active=true` to skip
+        inactive products. SKU prefix matches come first, exact SKU on top.
+        """
+        try:
+            limit = int(request.query_params.get('limit', search.SEARCH_LIMIT))
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, search.MAX_SEARCH_LIMIT))
+        active = request.query_params.get('active', '').lower() in ('1', 'true', 'yes')
+        return Response({'results': search.search(request.query_params.get('q', ''), limit, active_only=active)})
 
 
-class DealerViewSet(viewsets.ModelViewSet):
+class DealerViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = models.Dealer.objects.all()
     serializer_class = serializers.DealerSerializer
+    pagination_class = pagination.DealerCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        if sync.requested(request):
+            return delta_response(request, models.Tombstone.MODEL_DEALER)
+        return super().list(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         data = serializer.data
-        # include orders
-        orders = instance.orders.all()
-        data['orders'] = [{'id': o.id, 'order_number': o.order_number, 'status': o.status, 'total_amount': o.total_amount} for o in orders]
+        # include one page of order history, newest first; follow `orders_next` for more
+        orders = instance.orders.values('id', 'order_number', 'status', 'total_amount', 'created_at')
+        paginator = pagination.OrderCursorPagination()
+        data['orders'] = paginator.paginate_queryset(orders, request, view=self)
+        data['orders_next'] = paginator.get_next_link()
+        data['orders_previous'] = paginator.get_previous_link()
+        data['order_stats'] = self.order_stats(instance)
         return Response(data)
 
+    @staticmethod
+    def order_stats(dealer):
+        """
+        Per-status order counts and headline values for `dealer`, computed
+        by the database in a single aggregate query.
+        """
+        month_start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        aggregates = {
+            f'count_{code}': Count('id', filter=Q(status=code))
+            for code, _label in models.Order.STATUS_CHOICES
+        }
+        aggregates['open_value'] = Sum('total_amount', filter=Q(status__in=models.Order.OPEN_STATUSES))
+        aggregates['delivered_value_this_month'] = Sum(
+            'total_amount',
+            filter=Q(status=models.Order.STATUS_DELIVERED, delivered_at__gte=month_start),
+        )
+        result = dealer.orders.order_by().aggregate(**aggregates)
+        zero = Decimal('0.00')
+        return {
+            'counts': {code: result[f'count_{code}'] for code, _label in models.Order.STATUS_CHOICES},
+            'open_value': result['open_value'] or zero,
+            'delivered_value_this_month': result['delivered_value_this_month'] or zero,
+        }
 
-class OrderViewSet(viewsets.ModelViewSet):
+
+class OrderViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = models.Order.objects.all().prefetch_related('items')
     serializer_class = serializers.OrderSerializer
+    pagination_class = pagination.OrderCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == 'list':
+            qs = self.filter_list(qs, self.request.query_params)
+        fields = serializers.requested_fields(self.request)
+        if fields is not None and 'items' not in fields:
+            # sparse list screens don't need the nested items at all
+            qs = qs.prefetch_related(None)
+        return qs
+
+    @staticmethod
+    def filter_list(qs, params):
+        # ?status=DRAFT,CONFIRMED or ?status=open, ?dealer=<id>
+        order_status = params.get('status', '').upper()
+        if order_status == 'OPEN':
+            qs = qs.filter(status__in=models.Order.OPEN_STATUSES)
+        elif order_status:
+            qs = qs.filter(status__in=order_status.split(','))
+        dealer = params.get('dealer')
+        if dealer and dealer.isdigit():
+            qs = qs.filter(dealer_id=dealer)
+        return qs
 
     def update(self, request, *args, **kwargs):
         # disallow changing order status via update and only allow editing Draft orders
@@ -41,52 +191,137 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Only Draft orders can be edited'}, status=status.HTTP_400_BAD_REQUEST)
         return super().update(request, *args, **kwargs)
 
+    @action(detail=True, methods=['post'], url_path='items')
+    def add_item(self, request, pk=None):
+        serializer = serializers.OrderLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data.get('product')
+        if product is None:
+            return Response({'product': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        quantity = serializer.validated_data['quantity']
+        return self.edit_line(pk, lambda: lines.add_line(int(pk), product, quantity), status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['patch', 'delete'], url_path=r'items/(?P<item_id>[0-9]+)')
+    def item(self, request, pk=None, item_id=None):
+        """
+        PATCH {"quantity": n} changes one line, DELETE removes it. Only that
+        line and the order's totals are written.
+        """
+        if request.method == 'DELETE':
+            return self.edit_line(pk, lambda: lines.remove_line(int(pk), int(item_id)))
+        serializer = serializers.OrderLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        return self.edit_line(pk, lambda: lines.change_line(int(pk), int(item_id), quantity))
+
+    def edit_line(self, pk, edit, success_status=status.HTTP_200_OK):
+        # runs one line edit and answers with the line and the order's new totals
+        if not str(pk).isdigit():
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            item = stock.run_with_retries(edit)
+        except models.OrderItem.DoesNotExist:
+            return Response({'detail': 'Order line not found.'}, status=status.HTTP_404_NOT_FOUND)
+        except lines.OrderNotEditable:
+            if not models.Order.objects.filter(pk=pk).exists():
+                return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'detail': 'Only Draft orders can be edited'}, status=status.HTTP_400_BAD_REQUEST)
+        except lines.LineConflict:
+            return Response({'detail': 'Order line was changed concurrently; retry'}, status=status.HTTP_409_CONFLICT)
+        totals = lines.order_totals(pk)
+        data = {'total_amount': f"{totals['total_amount']:.2f}", 'item_count': totals['item_count']}
+        if item is not None:
+            data['item'] = serializers.OrderItemSerializer(item).data
+        return Response(data, status=success_status)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Streams orders as CSV (default) or NDJSON (`?output=ndjson`).
+        Filters: created_from, created_to, status, dealer.
+        """
+        return self.stream_export(request, lines=False)
+
+    @action(detail=False, methods=['get'], url_path='export-lines', permission_classes=[IsAdminUser])
+    def export_lines(self, request):
+        """
+        Streams order lines with the same output options and filters as `export`.
+        """
+        return self.stream_export(request, lines=True)
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser],
+            parser_classes=[MultiPartParser, FormParser])
+    def import_orders(self, request):
+        """
+        Imports draft orders from an uploaded CSV or NDJSON file (`file`) of
+        order lines. `?batch_size=` sets the lines written per transaction.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Upload a CSV or NDJSON file in the `file` field'}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.data.get('input_format') or (
+            'ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+        )
+        if import_format not in imports.IMPORT_FORMATS:
+            return Response({'detail': f"input_format must be one of: {', '.join(imports.IMPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = int(request.query_params.get('batch_size', imports.DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return Response({'detail': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        importer = imports.OrderImporter(batch_size=max(batch_size, 1))
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            summary = importer.run(imports.read_rows(stream, import_format))
+        except (UnicodeDecodeError, csv.Error):
+            return Response({'detail': 'The file must be a UTF-8 encoded CSV or NDJSON file'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_201_CREATED if summary['orders'] else status.HTTP_400_BAD_REQUEST)
+
+    def stream_export(self, request, lines):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in exports.EXPORT_FORMATS:
+            return Response({'detail': f"output must be one of: {', '.join(exports.EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            header, rows = exports.export_rows(request.query_params, lines=lines)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+        response = StreamingHttpResponse(exports.iter_export(header, rows, export_format), content_type=content_type)
+        filename = f"{'order_lines' if lines else 'orders'}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
+        if wants_async(request):
+            order = self.get_object()
+            if order.status != models.Order.STATUS_DRAFT:
+                return Response({'detail': 'Only Draft orders can be confirmed'}, status=status.HTTP_400_BAD_REQUEST)
+            return job_accepted(request, 'confirm_order', {'order_id': order.pk})
+        # the whole handler is retried on lock contention, not just the writes
+        return stock.run_with_retries(self.confirm_draft)
+
+    def confirm_draft(self):
         order = self.get_object()
         if order.status != models.Order.STATUS_DRAFT:
             return Response({'detail': 'Only Draft orders can be confirmed'}, status=status.HTTP_400_BAD_REQUEST)
-        # validate stock
-        insufficient = []
-        # Use select_for_update on involved inventory rows to avoid race
-        with transaction.atomic():
-            # lock inventories
-            for item in order.items.select_related('product').all():
-                prod = item.product
-                if prod is None:
-                    insufficient.append({'product': None, 'message': 'Product no longer exists'})
-                    continue
-                inv, _ = models.Inventory.objects.select_for_update().get_or_create(product=prod)
-                if item.quantity > inv.quantity:
-                    insufficient.append({
-                        'product': prod.sku,
-                        'product_name': prod.name,
-                        'available': inv.quantity,
-                        'requested': item.quantity,
-                        'message': f"Insufficient stock for {prod.name}. Available: {inv.quantity}, Requested: {item.quantity}"
-                    })
-            if insufficient:
-                # if only one failing item, return a clear detail message
-                detail_msg = insufficient[0]['message'] if len(insufficient) == 1 else 'Insufficient stock for one or more items'
-                return Response({'detail': detail_msg, 'items': insufficient}, status=status.HTTP_400_BAD_REQUEST)
-            # deduct
-            for item in order.items.select_related('product').all():
-                inv = models.Inventory.objects.select_for_update().get(product=item.product)
-                inv.quantity = F('quantity') - item.quantity
-                inv.save()
-            order.status = models.Order.STATUS_CONFIRMED
-            order.confirmed_at = timezone.now()
-            order.save()
+        try:
+            confirmed = stock.confirm_order(order)
+        except stock.InsufficientStock as exc:
+            return Response({'detail': exc.detail, 'items': exc.items}, status=status.HTTP_400_BAD_REQUEST)
+        if not confirmed:
+            return Response({'detail': 'Only Draft orders can be confirmed'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Order confirmed'})
 
     @action(detail=True, methods=['post'])
     def deliver(self, request, pk=None):
+        return stock.run_with_retries(self.deliver_confirmed)
+
+    def deliver_confirmed(self):
         order = self.get_object()
         if order.status != models.Order.STATUS_CONFIRMED:
             return Response({'detail': 'Only Confirmed orders can be delivered'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = models.Order.STATUS_DELIVERED
-        order.delivered_at = timezone.now()
-        order.save()
+        if not stock.deliver_order(order):
+            return Response({'detail': 'Only Confirmed orders can be delivered'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Order marked as delivered'})
 
     @action(detail=True, methods=['post'])
@@ -94,25 +329,67 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
         if order.status != models.Order.STATUS_DRAFT:
             return Response({'detail': 'Only Draft orders can be cancelled'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = models.Order.STATUS_CANCELLED
-        order.canceled_at = timezone.now()
-        order.save()
+        # a guarded UPDATE of the status only, so a concurrent confirm wins cleanly
+        try:
+            [result] = stock.run_with_retries(lambda: transitions.cancel_orders([order.pk]))
+        except transitions.TransitionConflict:
+            result = {'ok': False}
+        if not result['ok']:
+            return Response({'detail': 'Only Draft orders can be cancelled'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Order cancelled'})
 
+    @action(detail=False, methods=['post'], url_path='bulk-confirm')
+    def bulk_confirm(self, request):
+        return self.bulk_transition(request, transitions.confirm_orders, 'bulk_confirm')
+
+    @action(detail=False, methods=['post'], url_path='bulk-deliver')
+    def bulk_deliver(self, request):
+        return self.bulk_transition(request, transitions.deliver_orders, 'bulk_deliver')
+
+    @action(detail=False, methods=['post'], url_path='bulk-cancel')
+    def bulk_cancel(self, request):
+        return self.bulk_transition(request, transitions.cancel_orders, 'bulk_cancel')
+
+    def bulk_transition(self, request, transition, job_kind):
+        """
+        Body: {"ids": [...], "mode": "partial" | "all_or_nothing"}. Answers
+        with one result per order; 400 when nothing was applied. With
+        `?async=1` the batch is queued and the job's result has the same shape.
+        """
+        serializer = serializers.BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids, mode = serializer.validated_data['ids'], serializer.validated_data['mode']
+        if wants_async(request):
+            return job_accepted(request, job_kind, {'ids': ids, 'mode': mode})
+        try:
+            results = stock.run_with_retries(lambda: transition(ids, mode))
+        except transitions.TransitionConflict:
+            return Response({'detail': 'Orders or stock changed concurrently; retry'}, status=status.HTTP_409_CONFLICT)
+        succeeded = sum(result['ok'] for result in results)
+        data = {'mode': mode, 'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
+        return Response(data, status=status.HTTP_200_OK if succeeded else status.HTTP_400_BAD_REQUEST)
+
 
 class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = models.Inventory.objects.all().select_related('product')
     serializer_class = serializers.InventoryAdjustmentSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = pagination.SalesCursorPagination
 
     def list(self, request, *args, **kwargs):
-        qs = self.get_queryset()
+        if sync.requested(request):
+            return delta_response(request, models.Tombstone.MODEL_INVENTORY)
+        qs = self.paginate_queryset(self.get_queryset())
         # include the Inventory `id` so frontend can call detail endpoints like /inventory/{id}/adjust/
         data = [
-            {'id': inv.id, 'product_id': inv.product.id, 'sku': inv.product.sku, 'quantity': inv.quantity}
+            {'id': inv.id, 'product_id': inv.product.id, 'sku': inv.product.sku, 'quantity': inv.quantity,
+             'reserved': inv.reserved, 'on_hand': inv.on_hand}
             for inv in qs
         ]
-        return Response(data)
+        fields = serializers.requested_fields(request)
+        if fields is not None:
+            data = [{k: v for k, v in row.items() if k in fields} for row in data]
+        return self.get_paginated_response(data)
 
     @action(detail=True, methods=['put'], permission_classes=[IsAdminUser])
     def adjust(self, request, pk=None):
@@ -121,4 +398,174 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
         serializer.is_valid(raise_exception=True)
         # ensure product matches
         serializer.save(product=inv.product)
-        return Response({'detail': 'Inventory adjusted'})
\ No newline at end of file
+        return Response({'detail': 'Inventory adjusted'})
+
+    @action(detail=False, methods=['post'], url_path='bulk-adjust', permission_classes=[IsAdminUser],
+            parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def bulk_adjust(self, request):
+        """
+        Applies many adjustments in one transaction. Accepts a JSON list of
+        {sku | product_id, change, note} objects (or {"rows": [...]}), or a
+        CSV file upload in the `file` field with the same column names.
+        Invalid rows are skipped and reported; valid rows are applied.
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                rows = list(csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig')))
+            except (UnicodeDecodeError, csv.Error):
+                return Response({'detail': 'The file must be a UTF-8 encoded CSV'}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
+        elif isinstance(request.data, dict):
+            rows = request.data.get('rows')
+        else:
+            rows = None
+        if not isinstance(rows, list):
+            return Response({'detail': 'Provide a list of rows or a CSV file'}, status=status.HTTP_400_BAD_REQUEST)
+        adjustments, errors = serializers.parse_bulk_adjustments(rows)
+        if adjustments:
+            stock.adjust(adjustments, user=request.user)
+        code = status.HTTP_400_BAD_REQUEST if errors and not adjustments else status.HTTP_200_OK
+        return Response({'applied': len(adjustments), 'errors': errors}, status=code)
+
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def availability(self, request):
+        """
+        Checks stock for a whole cart in one call: a JSON list of
+        {sku | product, quantity} rows (or {"items": [...]}), or
+        {"order": <id>} to dry-run the confirm of a draft order. Uses the
+        same shortfall logic as confirm but a plain read, so nothing is
+        locked or changed. Cart checks are open to anyone, like product
+        detail; the order dry-run reveals an order's lines, so it needs a
+        signed-in user.
+        """
+        data = request.data
+        if isinstance(data, dict) and data.get('order') is not None:
+            if not request.user.is_authenticated:
+                self.permission_denied(request, message='Sign in to check an order.')
+            order = models.Order.objects.filter(pk=data['order']).first() if str(data['order']).isdigit() else None
+            if order is None:
+                return Response({'detail': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+            if order.status != models.Order.STATUS_DRAFT:
+                return Response({'detail': 'Only Draft orders can be confirmed'}, status=status.HTTP_400_BAD_REQUEST)
+            lines = stock.order_lines(order)
+            available = stock.current_stock({line[0] for line in lines if line[0] is not None})
+            errors = []
+        else:
+            rows = data.get('items') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return Response({'detail': 'Provide a list of items or an order'}, status=status.HTTP_400_BAD_REQUEST)
+            lines, available, errors = serializers.parse_availability_items(rows)
+            if errors and not lines:
+                return Response({'detail': 'No valid items', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        items, insufficient = stock.availability_report(lines, available)
+        detail = stock.InsufficientStock(insufficient).detail if insufficient else 'All items available'
+        return Response({
+            'detail': detail,
+            'confirmable': not insufficient and not errors,
+            'items': items,
+            'insufficient': insufficient,
+            'errors': errors,
+        })
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """
+    Sales reports served from the daily rollup tables, so they cost the
+    same whatever the size of the order history. Every report takes
+    `from` and `to` (inclusive dates, default the last 30 days).
+    """
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({
+            'dealers': reverse('report-dealers', request=request),
+            'products': reverse('report-products', request=request),
+            'lead_time': reverse('report-lead-time', request=request),
+        })
+
+    def report(self, request, build):
+        try:
+            start, end = reports.date_range(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        dealer = request.query_params.get('dealer')
+        if dealer is not None and not dealer.isdigit():
+            return Response({'detail': 'dealer must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'from': start, 'to': end, 'results': build(start, end, int(dealer) if dealer else None)})
+
+    @action(detail=False, methods=['get'])
+    def dealers(self, request):
+        """
+        Daily revenue, quantity, order counts and lead time per dealer
+        (`?dealer=` for one dealer).
+        """
+        return self.report(request, reports.dealer_daily)
+
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        """
+        Top products over the range by `?by=revenue` (default) or
+        `?by=quantity`, `?limit=` rows (default 10, max 100).
+        """
+        by = request.query_params.get('by', 'revenue')
+        if by not in ('revenue', 'quantity'):
+            return Response({'detail': 'by must be revenue or quantity'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = request.query_params.get('limit', '10')
+        limit = min(int(limit), 100) if limit.isdigit() and int(limit) > 0 else 10
+        return self.report(request, lambda start, end, _dealer: reports.top_products(start, end, by=by, limit=limit))
+
+    @action(detail=False, methods=['get'], url_path='lead-time')
+    def lead_time(self, request):
+        """
+        Average hours from confirmation to delivery per delivery day and
+        over the whole range (`?dealer=` for one dealer).
+        """
+        return self.report(request, reports.lead_time)
+
+    @action(detail=False, methods=['post'])
+    def backfill(self, request):
+        # rebuilding the rollups reads every order, so it always runs as a job
+        return job_accepted(request, 'backfill_reports', {})
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status and result of background jobs. A job can be polled by the user
+    who queued it and by staff; listing them is staff only.
+    """
+    queryset = models.Job.objects.all()
+    serializer_class = serializers.JobSerializer
+    pagination_class = pagination.SalesCursorPagination
+
+    def get_permissions(self):
+        if self.action == 'list':
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if not self.request.user.is_staff:
+            # someone else's job answers 404, like a missing one
+            qs = qs.filter(created_by=self.request.user)
+        job_status = self.request.query_params.get('status', '').upper()
+        if self.action == 'list' and job_status:
+            qs = qs.filter(status__in=job_status.split(','))
+        return qs
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def perf_report(request):
+    """
+    Slowest endpoints and worst repeated-query offenders seen by the perf
+    middleware (staff only). `?limit=` caps each list (default 10).
+    """
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        limit = 10
+    data = perf.report(limit=limit)
+    data['enabled'] = getattr(settings, 'SALES_PERF_ENABLED', False)
+    return Response(data)
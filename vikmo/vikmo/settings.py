@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,9 +51,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    # orjson-backed when installed, byte-identical to DRF's JSONRenderer otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'sales.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'sales.pagination.SalesCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 MIDDLEWARE = [
+    'sales.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +71,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Stock deduction on confirm: 'locking' (SELECT ... FOR UPDATE, then one
+# UPDATE), 'conditional' (UPDATE ... WHERE quantity >= n, no row locks) or
+# 'auto', which uses conditional on SQLite where FOR UPDATE is a no-op.
+SALES_STOCK_MODE = os.environ.get('VIKMO_STOCK_MODE', 'auto')
+
+# Per-request SQL/timing instrumentation (Server-Timing header + /api/_perf/).
+# Off unless VIKMO_PERF=1; when off the middleware is removed at startup.
+SALES_PERF_ENABLED = os.environ.get('VIKMO_PERF') == '1'
+SALES_PERF_BUFFER_SIZE = 1000
+
 ROOT_URLCONF = 'vikmo.urls'
 
 TEMPLATES = [
@@ -85,12 +104,93 @@ WSGI_APPLICATION = 'vikmo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite unless VIKMO_DB_ENGINE=postgresql, which reads VIKMO_DB_NAME,
+# VIKMO_DB_USER, VIKMO_DB_PASSWORD, VIKMO_DB_HOST and VIKMO_DB_PORT.
+
+DB_ENGINE = os.environ.get('VIKMO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('VIKMO_DB_NAME', 'vikmo'),
+            'USER': os.environ.get('VIKMO_DB_USER', 'vikmo'),
+            'PASSWORD': os.environ.get('VIKMO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('VIKMO_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('VIKMO_DB_PORT', '5432'),
+            # keep connections open between requests, but ping them before
+            # reuse so a restarted server or a dropped socket is not an error
+            'CONN_MAX_AGE': int(os.environ.get('VIKMO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+    # VIKMO_DB_POOL: 'off' (persistent connection per worker thread),
+    # 'django' (psycopg 3 pool per process, needs psycopg[pool]) or
+    # 'pgbouncer' (transaction-pooling PgBouncer in front of the server,
+    # which cannot keep server-side cursors open across transactions).
+    DB_POOL = os.environ.get('VIKMO_DB_POOL', 'off')
+    if DB_POOL == 'django':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('VIKMO_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('VIKMO_DB_POOL_MAX', '10')),
+            'timeout': 10,
+        }
+    elif DB_POOL == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('VIKMO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # reuse connections too, so the pragmas below are not re-run on
+            # every request; a health check still precedes each reuse
+            'CONN_MAX_AGE': int(os.environ.get('VIKMO_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # VIKMO_SQLITE_TUNING=0 keeps SQLite's defaults (rollback journal,
+    # synchronous=FULL, 5 s busy timeout, deferred transactions).
+    if os.environ.get('VIKMO_SQLITE_TUNING', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # run on every new connection: WAL lets readers carry on while a
+            # writer commits, and NORMAL only fsyncs at checkpoints in WAL mode
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+            # busy timeout in seconds; IMMEDIATE takes the write lock at BEGIN
+            # so writers queue on it instead of failing to upgrade mid-transaction
+            'timeout': int(os.environ.get('VIKMO_SQLITE_BUSY_TIMEOUT', '20')),
+            'transaction_mode': 'IMMEDIATE',
+        }
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The product catalog is cached here. Local memory is per process, so
+# deployments with several workers should set REDIS_URL to share one cache
+# (and its invalidation version) between them.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'vikmo-catalog',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
-}
 
 
 # Password validation